@@ -0,0 +1,191 @@
+import json
+import time
+import logging
+from pathlib import Path
+from postman_generation_agent import (
+    MODEL, MAX_TOKENS, CACHE_MODE, load_prompt_spec, build_system_blocks, build_user_prompt,
+    collection_cache_key, cached_result, finalise_collection, finalise_truncated_collection,
+    endpoint_requirement_sections
+)
+from telemetry import start_endpoint_telemetry, finish_endpoint_telemetry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Where the in-progress batch is recorded, so an interrupted run can pick it up again
+BATCH_STATE_FILE = "./output_data/batch_state.json"
+POLL_INTERVAL_SECONDS = 30
+
+
+def build_batch_request(custom_id, data, requirement_sections=None):
+    """One Message Batches request for an endpoint's mini-spec, using the same prompt as streaming"""
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": MODEL,
+            "max_tokens": MAX_TOKENS,
+            "system": build_system_blocks(),
+            "messages": [
+                {"role": "user", "content": build_user_prompt(data, requirement_sections)}
+            ]
+        }
+    }
+
+
+def save_batch_state(state, state_file=BATCH_STATE_FILE):
+    """Persist the submitted batch ID and its custom_id -> spec file mapping"""
+    Path(state_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+
+def load_batch_state(state_file=BATCH_STATE_FILE):
+    """Load the state of a batch submitted by an earlier run, if any"""
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def submit_batch(client, endpoint_files, cache_mode=CACHE_MODE, state_file=BATCH_STATE_FILE):
+    """
+    Submits every endpoint spec that isn't already cached as a single message batch and
+    persists the batch ID together with the custom_id -> spec file mapping.
+
+    Returns:
+        tuple: (the persisted batch state or None if nothing needed submitting,
+                results for endpoints served from the cache)
+    """
+    requests = []
+    endpoints = {}
+    cached = {}
+    for i, file in enumerate(endpoint_files):
+        telemetry = start_endpoint_telemetry(file, "batch")
+        data = load_prompt_spec(file)
+        requirement_sections = endpoint_requirement_sections(file)
+        key = collection_cache_key(data, requirement_sections)
+        result = cached_result(key, file, cache_mode)
+        if result is not None:
+            cached[file] = finish_endpoint_telemetry(telemetry, result, MODEL)
+            continue
+        # Spec file names can exceed the 64 character custom_id limit, so use an index
+        custom_id = f"endpoint-{i}"
+        endpoints[custom_id] = {"file": file, "cache_key": key}
+        requests.append(build_batch_request(custom_id, data, requirement_sections))
+
+    if not requests:
+        return None, cached
+
+    batch = client.messages.batches.create(requests=requests)
+    state = {
+        "batch_id": batch.id,
+        "submitted_at": time.time(),
+        "files": sorted(endpoint_files),
+        "endpoints": endpoints
+    }
+    save_batch_state(state, state_file)
+    logger.info(f"Submitted batch {batch.id} with {len(requests)} endpoints")
+    return state, cached
+
+
+def wait_for_batch(client, batch_id, poll_interval=POLL_INTERVAL_SECONDS, timeout=None):
+    """Polls the batch until processing has ended, returning the final batch object"""
+    started = time.monotonic()
+    while True:
+        batch = client.messages.batches.retrieve(batch_id)
+        if batch.processing_status == "ended":
+            return batch
+        counts = batch.request_counts
+        logger.info(f"Batch {batch_id} {batch.processing_status}: {counts.processing} processing, "
+                    f"{counts.succeeded} succeeded, {counts.errored} errored")
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish within {timeout}s")
+        time.sleep(poll_interval)
+
+
+def collect_batch_results(client, state, cache_mode=CACHE_MODE):
+    """
+    Streams the results of an ended batch through validate_and_clean_json into output_data.
+    A response that stopped at max_tokens is saved up to its last complete item and not
+    cached. Each endpoint's telemetry is timed from when the batch was submitted.
+
+    Returns:
+        dict: Maps each endpoint spec file to its status dict
+    """
+    results = {}
+    for entry in client.messages.batches.results(state["batch_id"]):
+        endpoint = state["endpoints"].get(entry.custom_id)
+        if endpoint is None:
+            logger.warning(f"Ignoring unknown custom_id {entry.custom_id} in batch {state['batch_id']}")
+            continue
+        file = endpoint["file"]
+        telemetry = start_endpoint_telemetry(file, "batch", time.time() - state["submitted_at"])
+        telemetry["requests"] = 1
+        if entry.result.type != "succeeded":
+            error = getattr(entry.result, "error", None)
+            result = {"status": "error", "message": f"Batch request {entry.result.type}: {error}"}
+        else:
+            message = entry.result.message
+            response_text = "".join(block.text for block in message.content if block.type == "text")
+            if message.stop_reason == "max_tokens":
+                result = finalise_truncated_collection(response_text, file, cache_mode, message.usage, telemetry)
+            else:
+                result = finalise_collection(response_text, file, endpoint["cache_key"], cache_mode,
+                                             message.usage, telemetry)
+        results[file] = finish_endpoint_telemetry(telemetry, result, MODEL)
+
+    for endpoint in state["endpoints"].values():
+        if endpoint["file"] not in results:
+            telemetry = start_endpoint_telemetry(endpoint["file"], "batch", time.time() - state["submitted_at"])
+            results[endpoint["file"]] = finish_endpoint_telemetry(
+                telemetry, {"status": "error", "message": "No result returned by batch"}, MODEL
+            )
+    return results
+
+
+def generate_postman_collections_batch(client, endpoint_files, cache_mode=CACHE_MODE,
+                                       state_file=BATCH_STATE_FILE, poll_interval=POLL_INTERVAL_SECONDS):
+    """
+    Generates collections for all endpoint specs through the Message Batches API.
+
+    If a previous run left a batch in the state file for the same set of spec files, that batch
+    is resumed instead of submitting a new one. Endpoints that were served from the cache when
+    it was submitted, but can't be under the current cache_mode (or were evicted since), are
+    submitted in a new batch after it. The state file is removed once results have been
+    collected.
+
+    Returns:
+        dict: Maps each endpoint spec file to its status dict
+    """
+    state = load_batch_state(state_file)
+    cached = {}
+    uncached = []
+    if state and state.get("files") == sorted(endpoint_files):
+        logger.info(f"Resuming batch {state['batch_id']}")
+        submitted = {e["file"] for e in state["endpoints"].values()}
+        for file in endpoint_files:
+            if file not in submitted:
+                telemetry = start_endpoint_telemetry(file, "batch")
+                data = load_prompt_spec(file)
+                key = collection_cache_key(data, endpoint_requirement_sections(file))
+                result = cached_result(key, file, cache_mode)
+                if result is None:
+                    uncached.append(file)
+                else:
+                    cached[file] = finish_endpoint_telemetry(telemetry, result, MODEL)
+    else:
+        state, cached = submit_batch(client, endpoint_files, cache_mode, state_file)
+        if state is None:
+            return cached
+
+    wait_for_batch(client, state["batch_id"], poll_interval)
+    results = collect_batch_results(client, state, cache_mode)
+    Path(state_file).unlink(missing_ok=True)
+    results.update(cached)
+    if uncached:
+        logger.info(f"{len(uncached)} endpoints left out of batch {state['batch_id']} aren't cached for "
+                    f"cache mode {cache_mode}, submitting them")
+        results.update(generate_postman_collections_batch(client, uncached, cache_mode, state_file, poll_interval))
+    return results
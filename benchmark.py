@@ -0,0 +1,129 @@
+"""
+Offline end-to-end benchmark of the generation pipeline. Each spec is run through the same
+stages as main.py (spec parsing, reference resolution, concurrent generation and merging)
+against fake_llm_server, which streams the collections in example_output/ with configurable
+latency, chunk size, errors and truncation. Nothing is sent to the real API and the LLM cache
+is bypassed, so results are repeatable.
+
+Run it with `python benchmark.py`. Every run happens in a temporary working directory, so
+endpoint_specs/ and output_data/ are left untouched; the report is written to
+output_data/benchmark_report.json.
+"""
+import io
+import os
+import json
+import time
+import asyncio
+import tempfile
+import contextlib
+import anthropic
+from pathlib import Path
+from fake_llm_server import start_fake_llm_server
+from spec_loader import parse_spec_file
+from reference_resolver import process_all_endpoints, endpoint_filename
+from collection_merger import merge_postman_collections
+from incremental import collection_filename
+from telemetry import summarise_telemetry
+from main import generate_all_collections, MAX_CONCURRENCY
+
+BENCHMARK_SPECS = os.environ.get(
+    "BENCHMARK_SPECS",
+    "./input_data/tfl_openapi_spec_multiple_api_old.yaml,./input_data/tfl_original.yaml"
+).split(",")
+BENCHMARK_REPORT_FILE = "./output_data/benchmark_report.json"
+
+# Behaviour of the fake LLM server, see FakeLLMServer
+FIRST_TOKEN_LATENCY = float(os.environ.get("BENCHMARK_FIRST_TOKEN_LATENCY", "0.5"))
+CHUNK_SIZE = int(os.environ.get("BENCHMARK_CHUNK_SIZE", "64"))
+CHUNK_DELAY = float(os.environ.get("BENCHMARK_CHUNK_DELAY", "0.002"))
+ERROR_RATE = float(os.environ.get("BENCHMARK_ERROR_RATE", "0"))
+TRUNCATE_RATE = float(os.environ.get("BENCHMARK_TRUNCATE_RATE", "0"))
+
+
+def timed(timings, stage, function, *args, **kwargs):
+    """Call function, recording its wall time in timings[stage]"""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    timings[stage] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def run_pipeline(spec_file, client, max_concurrency=MAX_CONCURRENCY):
+    """
+    Runs the full pipeline for one spec in the current directory.
+
+    Returns:
+        dict: Per-stage timings, throughput and the telemetry summary of the generation stage
+    """
+    timings = {}
+    spec = timed(timings, "load_spec", parse_spec_file, spec_file)
+    # The resolver and merger print progress for every endpoint, keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        endpoints = timed(timings, "resolve_refs", process_all_endpoints, spec, Path(spec_file).parent,
+                          spec_file=spec_file)
+    endpoint_files = [str(Path("endpoint_specs") / endpoint_filename(e['path'], e['method'])) for e in endpoints]
+
+    results = timed(timings, "generate", asyncio.run,
+                    generate_all_collections(client, endpoint_files, max_concurrency, cache_mode="bypass"))
+
+    collection_files = [collection_filename(Path(file).stem) for file, result in results.items()
+                        if result["status"] == "success"]
+    with contextlib.redirect_stdout(io.StringIO()):
+        timed(timings, "merge", merge_postman_collections, collection_files,
+              "./output_data/merged_regression_collection.json")
+
+    total = sum(timings.values())
+    summary = summarise_telemetry([result["telemetry"] for result in results.values() if "telemetry" in result])
+    return {
+        "spec": Path(spec_file).name,
+        "spec_bytes": Path(spec_file).stat().st_size,
+        "endpoints": len(endpoint_files),
+        "timings": timings,
+        "total_seconds": round(total, 4),
+        "endpoints_per_second": round(len(endpoint_files) / total, 2) if total else None,
+        "generation": summary
+    }
+
+
+def run_benchmark(spec_files=BENCHMARK_SPECS, max_concurrency=MAX_CONCURRENCY, **server_options):
+    """Benchmarks every spec against one fake LLM server, returning a report per spec"""
+    server = start_fake_llm_server(**server_options)
+    client = anthropic.AsyncAnthropic(api_key="benchmark", base_url=server.base_url)
+    cwd = os.getcwd()
+    reports = []
+    try:
+        for spec_file in spec_files:
+            spec_file = str(Path(spec_file).resolve())
+            with tempfile.TemporaryDirectory() as work_dir:
+                os.chdir(work_dir)
+                try:
+                    reports.append(run_pipeline(spec_file, client, max_concurrency))
+                finally:
+                    os.chdir(cwd)
+    finally:
+        server.shutdown()
+    return reports
+
+
+def print_benchmark_report(reports):
+    stages = ["load_spec", "resolve_refs", "generate", "merge"]
+    print(f"{'spec':<45}{'endpoints':>10}" + "".join(f"{stage:>14}" for stage in stages)
+          + f"{'total':>10}{'endpoints/s':>13}{'p50':>8}{'p95':>8}{'failed':>8}")
+    for report in reports:
+        generation = report["generation"]
+        print(f"{report['spec']:<45}{report['endpoints']:>10}"
+              + "".join(f"{report['timings'][stage]:>13.2f}s" for stage in stages)
+              + f"{report['total_seconds']:>9.2f}s{report['endpoints_per_second']:>13}"
+              + f"{generation['latency_p50'] or 0:>7.2f}s{generation['latency_p95'] or 0:>7.2f}s"
+              + f"{generation['failed']:>8}")
+
+
+if __name__ == "__main__":
+    reports = run_benchmark(
+        first_token_latency=FIRST_TOKEN_LATENCY, chunk_size=CHUNK_SIZE, chunk_delay=CHUNK_DELAY,
+        error_rate=ERROR_RATE, truncate_rate=TRUNCATE_RATE
+    )
+    print_benchmark_report(reports)
+    Path(BENCHMARK_REPORT_FILE).parent.mkdir(parents=True, exist_ok=True)
+    with open(BENCHMARK_REPORT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(reports, f, indent=2)
@@ -0,0 +1,291 @@
+"""
+Spreads generation requests over several LLM backends: any number of Anthropic API keys,
+optionally OpenAI keys as well. Each backend has a RateLimiter tracking its requests, input
+tokens and output tokens per minute, corrected from the rate limit headers of its responses.
+Each request goes to the backend with the most spare capacity, and a backend that answers
+with a rate limit, overload or connection error is cooled down while the request fails over
+to the next one.
+
+A ClientPool has the same messages.stream(...) interface as anthropic.AsyncAnthropic, so
+it can be passed to generate_postman_collection_async in place of a client. The stream
+it returns names the backend that served it in backend_name.
+"""
+import os
+import time
+import asyncio
+import logging
+from types import SimpleNamespace
+import anthropic
+import openai
+from spec_compactor import estimate_tokens
+from rate_limiter import (
+    RateLimiter, is_retryable_error, retry_after_seconds, error_headers, stream_headers, RETRY_BASE_SECONDS
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Providers to spread requests over, in order of preference ("anthropic", "openai")
+LLM_PROVIDERS = [p.strip() for p in os.environ.get("LLM_PROVIDERS", "anthropic").split(",") if p.strip()]
+# Comma-separated API keys per provider, falling back to the provider's single key variable
+ANTHROPIC_API_KEYS = os.environ.get("ANTHROPIC_API_KEYS") or os.environ.get("ANTHROPIC_API_KEY", "")
+OPENAI_API_KEYS = os.environ.get("OPENAI_API_KEYS") or os.environ.get("OPENAI_API_KEY", "")
+# Limits per key to start from. Unset, a limit isn't enforced until the rate limit headers of
+# the first response report it, rather than throttling to a guess that may be far too low.
+ANTHROPIC_REQUESTS_PER_MINUTE = int(os.environ.get("ANTHROPIC_REQUESTS_PER_MINUTE", "0")) or None
+ANTHROPIC_INPUT_TOKENS_PER_MINUTE = int(os.environ.get("ANTHROPIC_INPUT_TOKENS_PER_MINUTE", "0")) or None
+ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE = int(os.environ.get("ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE", "0")) or None
+OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get("OPENAI_REQUESTS_PER_MINUTE", "0")) or None
+# OpenAI limits input and output tokens together
+OPENAI_TOKENS_PER_MINUTE = int(os.environ.get("OPENAI_TOKENS_PER_MINUTE", "0")) or None
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o")
+# Largest completion the OpenAI model allows
+OPENAI_MAX_TOKENS = int(os.environ.get("OPENAI_MAX_TOKENS", "16384"))
+# How long a backend is skipped after a rate limit or overload error without a retry-after header:
+# RETRY_BASE_SECONDS after the first, doubling with each error in a row up to BACKEND_COOLDOWN_SECONDS
+BACKEND_COOLDOWN_SECONDS = float(os.environ.get("BACKEND_COOLDOWN_SECONDS", "30"))
+
+CONTINUE_INSTRUCTION = "Continue exactly where your previous message stopped, without repeating any of it."
+
+
+def request_tokens(request):
+    """Estimated input tokens of a messages.stream request"""
+    texts = [block.get("text", "") for block in request.get("system") or [] if isinstance(block, dict)]
+    if isinstance(request.get("system"), str):
+        texts = [request["system"]]
+    for message in request.get("messages", []):
+        content = message.get("content")
+        texts.extend([content] if isinstance(content, str) else [b.get("text", "") for b in content or []])
+    return sum(estimate_tokens(text) for text in texts)
+
+
+class OpenAIStream:
+    """
+    Adapts a streamed OpenAI chat completion to the parts of Anthropic's AsyncMessageStream
+    the generation agent uses: text_stream and get_final_message().
+    """
+
+    def __init__(self, client, model, request):
+        self.client = client
+        self.model = model
+        self.request = request
+        self.finish_reason = None
+        self.usage = None
+        self.response = None
+
+    def chat_messages(self):
+        system = self.request.get("system") or []
+        if not isinstance(system, str):
+            system = "\n\n".join(block.get("text", "") for block in system)
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.extend({"role": m["role"], "content": m["content"]} for m in self.request.get("messages", []))
+        # OpenAI doesn't continue a prefilled assistant message, so ask for the rest explicitly
+        if messages and messages[-1]["role"] == "assistant":
+            messages.append({"role": "user", "content": CONTINUE_INSTRUCTION})
+        return messages
+
+    async def __aenter__(self):
+        self.response = await self.client.chat.completions.create(
+            model=self.model,
+            max_tokens=min(self.request.get("max_tokens", OPENAI_MAX_TOKENS), OPENAI_MAX_TOKENS),
+            messages=self.chat_messages(),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        self.text_stream = self.iter_text()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.response.close()
+        return False
+
+    @property
+    def headers(self):
+        return self.response.response.headers
+
+    async def iter_text(self):
+        async for chunk in self.response:
+            if chunk.usage is not None:
+                self.usage = chunk.usage
+            for choice in chunk.choices:
+                if choice.finish_reason:
+                    self.finish_reason = choice.finish_reason
+                if choice.delta.content:
+                    yield choice.delta.content
+
+    async def get_final_message(self):
+        async for _ in self.text_stream:
+            pass
+        details = getattr(self.usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", 0) or 0
+        return SimpleNamespace(
+            model=self.model,
+            stop_reason="max_tokens" if self.finish_reason == "length" else "end_turn",
+            usage=SimpleNamespace(
+                input_tokens=(getattr(self.usage, "prompt_tokens", 0) or 0) - cached,
+                output_tokens=getattr(self.usage, "completion_tokens", 0) or 0,
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=cached
+            )
+        )
+
+
+class Backend:
+    """One provider API key with its own client, model, rate limiter and cooldown"""
+
+    def __init__(self, name, provider, client, model, limiter):
+        self.name = name
+        self.provider = provider
+        self.client = client
+        self.model = model
+        self.limiter = limiter
+        self.cooldown_until = 0.0
+        self.served = 0
+        self.failures = 0
+        self.failures_in_a_row = 0
+
+    def open_stream(self, request):
+        """Async context manager streaming request from this backend"""
+        request = dict(request, model=self.model)
+        if self.provider == "openai":
+            return OpenAIStream(self.client, self.model, request)
+        return self.client.messages.stream(**request)
+
+
+class PooledStream:
+    """A stream opened on whichever backend the pool admits it to, failing over on busy errors"""
+
+    def __init__(self, pool, request):
+        self.pool = pool
+        self.request = request
+        self.estimate = request_tokens(request)
+        self.cost = None
+        self.backend = None
+        self.manager = None
+        self.stream = None
+
+    async def __aenter__(self):
+        last_error = None
+        for _ in range(2 * len(self.pool.backends)):
+            backend, cost = await self.pool.acquire(self.estimate)
+            try:
+                manager = backend.open_stream(self.request)
+                self.stream = await manager.__aenter__()
+            except BaseException as e:
+                # Nothing was generated, so the tokens reserved for the response are given back
+                backend.limiter.release(cost)
+                if not isinstance(e, Exception) or not is_retryable_error(e):
+                    raise
+                backend.limiter.update_from_headers(error_headers(e))
+                self.pool.cool_down(backend, e)
+                last_error = e
+                continue
+            backend.limiter.update_from_headers(stream_headers(self.stream))
+            backend.failures_in_a_row = 0
+            self.backend, self.manager, self.cost = backend, manager, cost
+            backend.served += 1
+            return self
+        raise last_error
+
+    async def __aexit__(self, *exc_info):
+        if exc_info[1] is not None and is_retryable_error(exc_info[1]):
+            self.pool.cool_down(self.backend, exc_info[1])
+        return await self.manager.__aexit__(*exc_info)
+
+    @property
+    def text_stream(self):
+        return self.stream.text_stream
+
+    @property
+    def backend_name(self):
+        return self.backend.name
+
+    @property
+    def model(self):
+        return self.backend.model
+
+    async def get_final_message(self):
+        message = await self.stream.get_final_message()
+        usage = message.usage
+        # Cache reads don't count towards the input token limit, cache writes do
+        input_tokens = (usage.input_tokens or 0) + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+        self.backend.limiter.settle(self.cost, input_tokens, usage.output_tokens or 0)
+        return message
+
+
+class ClientPool:
+    """
+    Admits each request to the backend with the largest share of its rate limits free,
+    skipping backends that are cooling down, and waits when none has room.
+    """
+
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("No API keys configured, set ANTHROPIC_API_KEY(S) or OPENAI_API_KEY(S)")
+        self.backends = backends
+        # Mirrors AsyncAnthropic, so generation code calls pool.messages.stream(...)
+        self.messages = self
+
+    def stream(self, **request):
+        return PooledStream(self, request)
+
+    def cool_down(self, backend, error):
+        backend.failures += 1
+        backend.failures_in_a_row += 1
+        seconds = retry_after_seconds(error) or min(
+            BACKEND_COOLDOWN_SECONDS, RETRY_BASE_SECONDS * 2 ** (backend.failures_in_a_row - 1))
+        backend.cooldown_until = time.monotonic() + seconds
+        logger.warning(f"Backend {backend.name} is busy ({type(error).__name__}), skipping it for {seconds:.0f}s")
+
+    async def acquire(self, input_tokens):
+        """
+        Wait for a backend with room for a request of input_tokens, admit the request to it
+        and return the backend with what was charged to its limiter.
+        """
+        while True:
+            now = time.monotonic()
+            costs = {b.name: b.limiter.cost(input_tokens) for b in self.backends}
+            ready = [b for b in self.backends
+                     if b.cooldown_until <= now and b.limiter.seconds_until(costs[b.name]) == 0]
+            if ready:
+                backend = max(ready, key=lambda b: b.limiter.headroom())
+                backend.limiter.admit(costs[backend.name])
+                return backend, costs[backend.name]
+            wait = min(max(b.cooldown_until - now, b.limiter.seconds_until(costs[b.name])) for b in self.backends)
+            await asyncio.sleep(max(wait, 0.05))
+
+    def summary(self):
+        """Requests served, busy errors and current limits per backend"""
+        return {b.name: {"served": b.served, "failures": b.failures, "limits": b.limiter.limits()}
+                for b in self.backends}
+
+
+def split_keys(keys):
+    return [key.strip() for key in keys.split(",") if key.strip()]
+
+
+def build_client_pool(model, providers=LLM_PROVIDERS):
+    """
+    A pool with one backend per configured API key of each provider. Clients don't retry
+    on their own, so a busy backend fails over immediately instead of blocking its request.
+    """
+    backends = []
+    for provider in providers:
+        if provider == "anthropic":
+            for i, key in enumerate(split_keys(ANTHROPIC_API_KEYS)):
+                backends.append(Backend(f"anthropic-{i + 1}", provider,
+                                        anthropic.AsyncAnthropic(api_key=key, max_retries=0),
+                                        model, RateLimiter(ANTHROPIC_REQUESTS_PER_MINUTE,
+                                                           ANTHROPIC_INPUT_TOKENS_PER_MINUTE,
+                                                           ANTHROPIC_OUTPUT_TOKENS_PER_MINUTE)))
+        elif provider == "openai":
+            for i, key in enumerate(split_keys(OPENAI_API_KEYS)):
+                backends.append(Backend(f"openai-{i + 1}", provider,
+                                        openai.AsyncOpenAI(api_key=key, max_retries=0),
+                                        OPENAI_MODEL, RateLimiter(OPENAI_REQUESTS_PER_MINUTE,
+                                                                  OPENAI_TOKENS_PER_MINUTE,
+                                                                  OPENAI_TOKENS_PER_MINUTE)))
+        else:
+            logger.warning(f"Ignoring unknown LLM provider {provider}")
+    return ClientPool(backends)
@@ -1,18 +1,20 @@
 import json
 import os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from request_dedup import new_dedup_report, dedupe_items
 
-def merge_postman_collections(collection_files, output_file="merged_collection.json"):
-    """
-    Merge multiple Postman collection files into a single collection.
-    
-    Args:
-        collection_files: List of file paths to Postman collection JSON files
-        output_file: Output file name for the merged collection
-    """
-    
-    # Base template for the merged collection
-    merged_collection = {
+# Number of collection files read ahead of the writer. Only this many folders are in
+# memory at once, however many endpoints are merged.
+MAX_PARALLEL_READS = int(os.environ.get("MERGE_MAX_PARALLEL_READS", "8"))
+# Duplicate requests across the merged collection are only listed in the dedup report
+# ("report"), "remove"d, "flag"ged in their description, or not looked for ("off")
+DEDUPE_MODE = os.environ.get("MERGE_DEDUPE", "report")
+
+
+def merged_collection_template():
+    """Base template for the merged collection"""
+    return {
         "info": {
             "name": "Postman Collection",
             "description": "Comprehensive regression testing for a given API with maximum test coverage",
@@ -30,58 +32,357 @@ def merge_postman_collections(collection_files, output_file="merged_collection.j
             }
         ]
     }
-    
-    # Array to store all items from all collections
-    all_folders = []
-    
-    # Iterate through each collection file
-    for file_path in collection_files:
-        try:
-            print(f"Processing: {file_path}")
-            
-            # Read the collection file
+
+
+def merged_header_and_footer():
+    """
+    The merged collection's JSON text before and after the folders of its "item" array,
+    formatted exactly as json.dump(..., indent=2) formats the whole collection.
+    """
+    placeholder = "\n    0\n"
+    text = json.dumps(dict(merged_collection_template(), item=[0]), indent=2, ensure_ascii=False)
+    header, footer = text.split(placeholder)
+    return (header + "\n").encode('utf-8'), ("\n" + footer).encode('utf-8')
+
+
+def dedup_report_filename(output_file):
+    return str(Path(output_file).with_suffix('.dedup_report.json'))
+
+
+def index_filename(output_file):
+    """Sidecar file recording the byte range of every folder in a merged collection"""
+    return str(Path(output_file).with_suffix('.index.json'))
+
+
+def folder_name(file_path):
+    """
+    Name of the merged collection's folder for a collection file. Folders are kept sorted by
+    it, so collections should be merged in this order for upserts to keep the same order.
+    """
+    return Path(file_path).stem
+
+
+def render_folder(folder):
+    """A folder as it appears inside the merged collection's item array"""
+    # Newlines inside JSON strings are escaped, so every newline starts a new line of the document
+    text = json.dumps(folder, indent=2, ensure_ascii=False)
+    return ("    " + text.replace("\n", "\n    ")).encode('utf-8')
+
+
+def read_collection_folder(source):
+    """
+    Reads one endpoint collection as a folder of the merged collection. source is the
+    collection's file path, or a (file path, collection) pair for a collection that is
+    already in memory, which is named after the path but not read from it.
+
+    Returns:
+        tuple: (folder name, folder or None, log lines)
+    """
+    file_path, collection_data = source if isinstance(source, tuple) else (source, None)
+    # Extract the filename without extension for folder name
+    filename = folder_name(file_path)
+    log = [f"Processing: {file_path}"]
+    try:
+        # Read the collection file
+        if collection_data is None:
             with open(file_path, 'r', encoding='utf-8') as f:
                 collection_data = json.load(f)
-            
-            # Extract the filename without extension for folder name
-            filename = Path(file_path).stem
-            
-            # Extract items from the top-level "item" array
-            if 'item' in collection_data and isinstance(collection_data['item'], list):
-                items = collection_data['item']
-                print(f"  Found {len(items)} items")
-
-                # Create a folder for this collection's items
-                folder = {
-                    "name": filename,
-                    "item": items,
-                    "description": f"Tests from {file_path}",
-                    "event": [],
-                    "variable": []
-                }
-                
-                # Add all items to our master array
-                all_folders.append(folder)
-            else:
-                print(f"  Warning: No 'item' array found in {file_path}")
-                
-        except FileNotFoundError:
-            print(f"  Error: File not found - {file_path}")
-        except json.JSONDecodeError as e:
-            print(f"  Error: Invalid JSON in {file_path} - {e}")
-        except Exception as e:
-            print(f"  Error processing {file_path}: {e}")
-    
-    # Populate the merged collection with all items
-    merged_collection["item"] = all_folders
-    
+
+        # Extract items from the top-level "item" array
+        if 'item' in collection_data and isinstance(collection_data['item'], list):
+            items = collection_data['item']
+            log.append(f"  Found {len(items)} items")
+
+            # Create a folder for this collection's items
+            folder = {
+                "name": filename,
+                "item": items,
+                "description": f"Tests from {file_path}",
+                "event": [],
+                "variable": []
+            }
+            return filename, folder, log
+
+        log.append(f"  Warning: No 'item' array found in {file_path}")
+    except FileNotFoundError:
+        log.append(f"  Error: File not found - {file_path}")
+    except json.JSONDecodeError as e:
+        log.append(f"  Error: Invalid JSON in {file_path} - {e}")
+    except Exception as e:
+        log.append(f"  Error processing {file_path}: {e}")
+    return filename, None, log
+
+
+def read_folders_in_order(collection_files, max_parallel_reads=MAX_PARALLEL_READS):
+    """
+    Yields read_collection_folder results in the order of collection_files, reading up to
+    max_parallel_reads files ahead concurrently. collection_files may be a generator; it is
+    only advanced as far as the files being read ahead.
+    """
+    sources = iter(collection_files)
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel_reads)) as executor:
+        pending = []
+        exhausted = False
+        while not exhausted or pending:
+            while not exhausted and len(pending) < max(1, max_parallel_reads):
+                source = next(sources, None)
+                if source is None:
+                    exhausted = True
+                else:
+                    pending.append(executor.submit(read_collection_folder, source))
+            if pending:
+                yield pending.pop(0).result()
+
+
+def write_merged_collection(folders, output_file):
+    """
+    Writes (name, rendered folder) pairs into output_file one at a time, then records each
+    folder's byte range in the index file. The file is written under a temporary name and
+    moved into place, so a failed merge never leaves a half-written collection behind.
+
+    Returns:
+        int: Number of folders written
+    """
+    header, footer = merged_header_and_footer()
+    tmp_file = str(output_file) + ".tmp"
+    entries = []
+    with open(tmp_file, 'wb') as f:
+        f.write(header)
+        offset = len(header)
+        for name, rendered in folders:
+            if entries:
+                f.write(b",\n")
+                offset += 2
+            f.write(rendered)
+            entries.append([name, offset, offset + len(rendered)])
+            offset += len(rendered)
+        f.write(footer)
+    os.replace(tmp_file, output_file)
+    # A journal left by an interrupted splice belongs to the file that was just replaced
+    Path(journal_filename(output_file)).unlink(missing_ok=True)
+    save_merge_index(output_file, entries, len(header))
+    return len(entries)
+
+
+def save_merge_index(output_file, entries, items_start):
+    stat = os.stat(output_file)
+    index = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "items_start": items_start,
+        "folders": entries
+    }
+    with open(index_filename(output_file), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+
+def load_merge_index(output_file):
+    """The merged collection's folder index, or None if it is missing or out of date"""
+    try:
+        with open(index_filename(output_file), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        stat = os.stat(output_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if index.get("size") != stat.st_size or index.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    return index
+
+
+def merge_postman_collections(collection_files, output_file="merged_collection.json",
+                              max_parallel_reads=MAX_PARALLEL_READS, dedupe=DEDUPE_MODE):
+    """
+    Merge multiple Postman collection files into a single collection.
+
+    Files are read concurrently but folders are written to output_file in the order of
+    collection_files as soon as each is ready, so only a few collections are held in memory
+    at a time. Requests that duplicate an earlier request (same canonical method, URL, query,
+    headers, body and expected status, see request_dedup) are listed in a report next to the
+    output file, and are also removed or flagged if dedupe asks for it.
+
+    Args:
+        collection_files: File paths of Postman collection JSON files, or (file path,
+            collection) pairs for collections already in memory; may be a generator
+        output_file: Output file name for the merged collection
+        max_parallel_reads: Number of collection files read ahead of the writer
+        dedupe: "report", "remove", "flag" or "off"
+    """
+    # Only the canonical keys of earlier requests are kept, not the requests themselves
+    seen = {}
+    report = new_dedup_report()
+
+    def folders():
+        for name, folder, log in read_folders_in_order(collection_files, max_parallel_reads):
+            print("\n".join(log))
+            if folder is None:
+                continue
+            if dedupe != "off":
+                folder["item"] = dedupe_items(folder["item"], name, seen, report, dedupe)
+            yield name, render_folder(folder)
+
     # Write the merged collection to output file
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(merged_collection, f, indent=2, ensure_ascii=False)
-        
+        write_merged_collection(folders(), output_file)
+
         print(f"\nMerged collection created successfully!")
         print(f"  Output file: {output_file}")
-        
+
     except Exception as e:
         print(f"Error writing output file: {e}")
+        return
+
+    if dedupe != "off":
+        with open(dedup_report_filename(output_file), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"  Duplicate requests: {len(report['duplicates'])} of {report['total']} "
+              f"({report['within_endpoint']} within an endpoint, {report['across_endpoints']} across endpoints), "
+              f"{report['removed']} removed, {report['flagged']} flagged")
+
+
+def journal_filename(path):
+    """File holding the original bytes of a splice in progress on path"""
+    return str(path) + ".journal"
+
+
+def splice_file(path, start, end, replacement):
+    """
+    Replace bytes [start, end) of the file at path with replacement, rewriting only the bytes
+    from start onwards in place. Those original bytes are first saved to a journal next to
+    the file and flushed to disk, so an interrupted splice is rolled back by
+    recover_spliced_file. Each byte after start is written twice (journal, then file) but
+    nothing before start is read or written, so replacing a folder near the end of a large
+    collection is cheap; one near the start costs about a full copy, as before.
+    """
+    recover_spliced_file(path)
+    journal = journal_filename(path)
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(start)
+        with open(journal + ".tmp", 'wb') as j:
+            header = json.dumps({"start": start, "size": size}).encode() + b"\n"
+            j.write(header)
+            while chunk := f.read(1024 * 1024):
+                j.write(chunk)
+            j.flush()
+            os.fsync(j.fileno())
+        # The journal only takes effect once it is complete
+        os.replace(journal + ".tmp", journal)
+
+        with open(journal, 'rb') as j:
+            j.seek(len(header) + end - start)
+            f.seek(start)
+            f.write(replacement)
+            while chunk := j.read(1024 * 1024):
+                f.write(chunk)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+    os.remove(journal)
+
+
+def recover_spliced_file(path):
+    """
+    Rolls back a splice_file that was interrupted, restoring the original bytes from its
+    journal. Does nothing if there is no journal.
+
+    Returns:
+        bool: True if a splice was rolled back
+    """
+    journal = journal_filename(path)
+    if not os.path.exists(journal):
+        return False
+    with open(journal, 'rb') as j, open(path, 'r+b') as f:
+        header = json.loads(j.readline())
+        f.seek(header["start"])
+        while chunk := j.read(1024 * 1024):
+            f.write(chunk)
+        f.truncate(header["size"])
+        f.flush()
+        os.fsync(f.fileno())
+    os.remove(journal)
+    print(f"  Rolled back an interrupted update of {path}")
+    return True
+
+
+def rewrite_with_folder(output_file, name, rendered):
+    """Fallback for upsert_collection_folder when there is no usable index"""
+    with open(output_file, 'r', encoding='utf-8') as f:
+        existing = json.load(f).get('item', [])
+    folders = [(folder.get('name'), render_folder(folder)) for folder in existing if isinstance(folder, dict)]
+    names = [folder_name for folder_name, _ in folders]
+    if name in names:
+        folders[names.index(name)] = (name, rendered)
+    else:
+        position = next((i for i, folder_name in enumerate(names) if str(folder_name) > name), len(folders))
+        folders.insert(position, (name, rendered))
+    write_merged_collection(folders, output_file)
+
+
+def upsert_collection_folder(collection_file, output_file, dedupe=DEDUPE_MODE):
+    """
+    Adds or replaces a single endpoint's folder in an existing merged collection.
+    collection_file is a path or a (path, collection) pair, as for merge_postman_collections.
+
+    Using the byte ranges in the merged collection's index, only the folder itself and the
+    bytes after it are rewritten, in place (see splice_file); no other collection is read or
+    re-serialised. A new folder is inserted before the first folder whose name sorts after
+    it, which keeps a collection merged in folder_name order in that order. If the merged
+    collection doesn't exist yet it is created, and if its index is missing or stale the file
+    is parsed and rewritten instead. With dedupe "remove" or "flag", duplicate requests are
+    only removed or flagged within the folder, since the other folders aren't read.
+
+    Returns:
+        bool: True if the folder was written
+    """
+    name, folder, log = read_collection_folder(collection_file)
+    print("\n".join(log))
+    if folder is None:
+        return False
+    # Only the folder is deduplicated here, so there is nothing to report
+    if dedupe in ("remove", "flag"):
+        folder["item"] = dedupe_items(folder["item"], name, {}, new_dedup_report(), dedupe)
+    rendered = render_folder(folder)
+
+    if not os.path.exists(output_file):
+        write_merged_collection([(name, rendered)], output_file)
+        return True
+
+    recover_spliced_file(output_file)
+    index = load_merge_index(output_file)
+    if index is None:
+        print(f"  No up to date index for {output_file}, rewriting it")
+        rewrite_with_folder(output_file, name, rendered)
+        return True
+
+    entries = index["folders"]
+    names = [entry[0] for entry in entries]
+    if name in names:
+        position = names.index(name)
+        start, end = entries[position][1], entries[position][2]
+        replacement = rendered
+        entries[position] = [name, start, start + len(rendered)]
+    else:
+        position = next((i for i, folder_name in enumerate(names) if folder_name > name), len(entries))
+        if not entries:
+            start = end = index["items_start"]
+            replacement = rendered
+            folder_start = start
+        elif position < len(entries):
+            start = end = entries[position][1]
+            replacement = rendered + b",\n"
+            folder_start = start
+        else:
+            start = end = entries[-1][2]
+            replacement = b",\n" + rendered
+            folder_start = start + 2
+        entries.insert(position, [name, folder_start, folder_start + len(rendered)])
+
+    splice_file(output_file, start, end, replacement)
+    # Every folder after the one written moves by the change in length
+    shift = len(replacement) - (end - start)
+    for entry in entries[position + 1:]:
+        entry[1] += shift
+        entry[2] += shift
+    save_merge_index(output_file, entries, index["items_start"])
+    print(f"  Updated folder {name} in {output_file}")
+    return True
@@ -0,0 +1,263 @@
+"""
+Runs a generated Postman collection against an API and checks the status code assertions
+in its test scripts. Requests are sent concurrently over pooled keep-alive connections,
+with an optional per-host rate limit, and the results are written as JSON and JUnit XML.
+
+Run it with `python collection_runner.py [collection file]`. BASE_URL and APP_KEY override
+the collection's base_url and app_key variables.
+"""
+import re
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import httpx
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from urllib.parse import urlsplit
+from request_dedup import script_statuses, test_script
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RUNNER_COLLECTION = "./output_data/merged_regression_collection.json"
+RUNNER_JSON_RESULTS = "./output_data/run_results.json"
+RUNNER_JUNIT_RESULTS = "./output_data/run_results.xml"
+# Requests in flight at once, which is also the size of the connection pool
+RUNNER_CONCURRENCY = int(os.environ.get("RUNNER_CONCURRENCY", "20"))
+# Maximum requests per second to any one host, 0 for no limit
+RUNNER_RATE_LIMIT = float(os.environ.get("RUNNER_RATE_LIMIT", "0"))
+RUNNER_TIMEOUT = float(os.environ.get("RUNNER_TIMEOUT", "30"))
+
+_VARIABLE = re.compile(r'\{\{\s*([^{}]+?)\s*\}\}')
+_PM_TEST = re.compile(r'pm\.test\(\s*(["\'`])(.*?)\1')
+
+
+class HostRateLimiter:
+    """Spaces out requests to each host so that none receives more than rate per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next_slot = {}
+
+    async def acquire(self, host):
+        if not self.interval:
+            return
+        # Reserve the next free slot before sleeping, so concurrent callers queue up in order
+        now = time.monotonic()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def substitute_variables(value, variables):
+    """Replace {{name}} with the variable's value, leaving unknown variables as they are"""
+    if not isinstance(value, str) or '{{' not in value:
+        return value
+    return _VARIABLE.sub(lambda m: str(variables[m.group(1)]) if m.group(1) in variables else m.group(0), value)
+
+
+def collection_variables(collection, overrides=None):
+    """The collection's variables, with non-empty overrides (e.g. from the environment) applied"""
+    variables = {v['key']: v.get('value', '') for v in collection.get('variable', [])
+                 if isinstance(v, dict) and 'key' in v}
+    variables.update({key: value for key, value in (overrides or {}).items() if value})
+    return variables
+
+
+def iter_request_items(items, folder_path=()):
+    """Yields (folder path, item) for every request in a collection, in collection order"""
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        if 'request' in item:
+            yield folder_path, item
+        elif isinstance(item.get('item'), list):
+            yield from iter_request_items(item['item'], folder_path + (item.get('name', ''),))
+
+
+def request_url(request, variables):
+    """The request's URL with variables substituted"""
+    url = request.get('url', '')
+    if isinstance(url, dict):
+        raw = url.get('raw')
+        if raw is None:
+            host = url.get('host', [])
+            path = url.get('path', [])
+            raw = '/'.join(host if isinstance(host, list) else [host]) + '/' + \
+                '/'.join(path if isinstance(path, list) else [path])
+            query = [f"{q.get('key', '')}={q.get('value') or ''}" for q in url.get('query', [])
+                     if isinstance(q, dict) and not q.get('disabled')]
+            if query:
+                raw += '?' + '&'.join(query)
+        url = raw
+    return substitute_variables(url, variables)
+
+
+def request_options(request, variables):
+    """Keyword arguments for httpx for a Postman request's headers and body"""
+    options = {"headers": {substitute_variables(h.get('key', ''), variables): substitute_variables(h.get('value', ''), variables)
+                           for h in request.get('header', []) if isinstance(h, dict) and not h.get('disabled')}}
+    body = request.get('body') or {}
+    mode = body.get('mode')
+    if mode == 'raw' and body.get('raw'):
+        options["content"] = substitute_variables(body['raw'], variables).encode('utf-8')
+    elif mode in ('urlencoded', 'formdata'):
+        options["data"] = {substitute_variables(p.get('key', ''), variables): substitute_variables(p.get('value', ''), variables)
+                           for p in body.get(mode, []) if isinstance(p, dict) and not p.get('disabled')}
+    return options
+
+
+def status_assertions(item):
+    """
+    (test name, expected statuses) for every pm.test in the item's test script. Tests that
+    don't assert a status have an empty set and are reported as skipped.
+    """
+    script = test_script(item)
+    matches = list(_PM_TEST.finditer(script))
+    assertions = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(script)
+        assertions.append((match.group(2), script_statuses(script[match.end():end])))
+    return assertions
+
+
+async def run_request(client, item, folder_path, variables, semaphore, rate_limiter):
+    """Sends one request and evaluates its status assertions, returning its result record"""
+    request = item['request'] if isinstance(item['request'], dict) else {'method': 'GET', 'url': item['request']}
+    method = request.get('method', 'GET').upper()
+    url = request_url(request, variables)
+    result = {
+        "folder": '/'.join(folder_path),
+        "name": item.get('name', ''),
+        "method": method,
+        "url": url,
+        "status": None,
+        "elapsed_seconds": None,
+        "assertions": [],
+        "error": None
+    }
+    async with semaphore:
+        await rate_limiter.acquire(urlsplit(url).netloc)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **request_options(request, variables))
+            result["status"] = response.status_code
+        except (httpx.HTTPError, ValueError) as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["elapsed_seconds"] = round(time.perf_counter() - started, 4)
+
+    for name, statuses in status_assertions(item):
+        if not statuses:
+            result["assertions"].append({"name": name, "passed": None, "message": "Not a status code assertion"})
+        elif result["status"] is None:
+            result["assertions"].append({"name": name, "passed": False, "message": "No response"})
+        else:
+            passed = result["status"] in statuses
+            result["assertions"].append({
+                "name": name,
+                "passed": passed,
+                "message": None if passed else
+                f"Expected status {' or '.join(str(s) for s in sorted(statuses))}, got {result['status']}"
+            })
+    return result
+
+
+async def run_collection(collection, variables=None, concurrency=RUNNER_CONCURRENCY,
+                         rate_limit=RUNNER_RATE_LIMIT, timeout=RUNNER_TIMEOUT, transport=None):
+    """
+    Runs every request in the collection with up to concurrency requests in flight and at
+    most rate_limit requests per second to each host.
+
+    Returns:
+        list: Result record per request, in collection order
+    """
+    variables = collection_variables(collection, variables)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    rate_limiter = HostRateLimiter(rate_limit)
+    limits = httpx.Limits(max_connections=max(1, concurrency), max_keepalive_connections=max(1, concurrency))
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, transport=transport) as client:
+        return await asyncio.gather(*(
+            run_request(client, item, folder_path, variables, semaphore, rate_limiter)
+            for folder_path, item in iter_request_items(collection.get('item', []))
+        ))
+
+
+def summarise_results(results, duration):
+    assertions = [a for r in results for a in r["assertions"]]
+    return {
+        "requests": len(results),
+        "errors": sum(1 for r in results if r["error"]),
+        "failed_requests": sum(1 for r in results if any(a["passed"] is False for a in r["assertions"])),
+        "assertions_passed": sum(1 for a in assertions if a["passed"] is True),
+        "assertions_failed": sum(1 for a in assertions if a["passed"] is False),
+        "assertions_skipped": sum(1 for a in assertions if a["passed"] is None),
+        "duration_seconds": round(duration, 3),
+        "requests_per_second": round(len(results) / duration, 1) if duration > 0 else None
+    }
+
+
+def write_json_results(results, summary, output_file=RUNNER_JSON_RESULTS):
+    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({"summary": summary, "results": results}, f, indent=2)
+
+
+def write_junit_results(results, output_file=RUNNER_JUNIT_RESULTS):
+    """JUnit XML with one test suite per top-level folder and one test case per request"""
+    suites = {}
+    for result in results:
+        suites.setdefault(result["folder"].split('/')[0] or "collection", []).append(result)
+
+    root = ET.Element("testsuites")
+    for suite_name, suite_results in suites.items():
+        suite = ET.SubElement(root, "testsuite", name=suite_name, tests=str(len(suite_results)))
+        failures = errors = skipped = 0
+        for result in suite_results:
+            case = ET.SubElement(suite, "testcase", classname=result["folder"] or suite_name,
+                                 name=result["name"], time=str(result["elapsed_seconds"] or 0))
+            failed = [a for a in result["assertions"] if a["passed"] is False]
+            if result["error"]:
+                errors += 1
+                ET.SubElement(case, "error", message=result["error"])
+            elif failed:
+                failures += 1
+                ET.SubElement(case, "failure", message="; ".join(f"{a['name']}: {a['message']}" for a in failed))
+            elif not any(a["passed"] for a in result["assertions"]):
+                skipped += 1
+                ET.SubElement(case, "skipped", message="No status code assertions")
+        suite.set("failures", str(failures))
+        suite.set("errors", str(errors))
+        suite.set("skipped", str(skipped))
+
+    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(root).write(output_file, encoding="utf-8", xml_declaration=True)
+
+
+def main(collection_file=RUNNER_COLLECTION):
+    # httpx logs every request at INFO, which would dominate the output and the run time
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with open(collection_file, 'r', encoding='utf-8') as f:
+        collection = json.load(f)
+    overrides = {"base_url": os.environ.get("BASE_URL"), "app_key": os.environ.get("APP_KEY")}
+
+    started = time.perf_counter()
+    results = asyncio.run(run_collection(collection, overrides))
+    summary = summarise_results(results, time.perf_counter() - started)
+
+    write_json_results(results, summary)
+    write_junit_results(results)
+    print(f"Ran {summary['requests']} requests in {summary['duration_seconds']}s "
+          f"({summary['requests_per_second']} requests/s): {summary['assertions_passed']} assertions passed, "
+          f"{summary['assertions_failed']} failed, {summary['assertions_skipped']} skipped, "
+          f"{summary['errors']} request errors")
+    print(f"Results written to {RUNNER_JSON_RESULTS} and {RUNNER_JUNIT_RESULTS}")
+    return summary
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else RUNNER_COLLECTION)
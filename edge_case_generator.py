@@ -0,0 +1,327 @@
+import re
+import json
+from urllib.parse import quote
+from reference_resolver import parse_component_ref, HTTP_METHODS
+
+# Values used for the mechanical test cases
+SPECIAL_CHARACTERS_VALUE = 'Test & <> "\' é ✓ \\n\\t'
+WHITESPACE_VALUE = '    '
+INVALID_VALUE = 'invalidValue'
+INVALID_FORMAT_VALUES = {
+    'email': 'not-an-email',
+    'date': 'not-a-date',
+    'date-time': 'not-a-date-time',
+    'uri': 'not a url',
+    'url': 'not a url',
+    'uuid': 'not-a-uuid'
+}
+FORMAT_PATTERNS = {
+    'email': r'[^@\s]+@[^@\s]+\.[^@\s]+',
+    'date': r'\d{4}-\d{2}-\d{2}',
+    'date-time': r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?',
+    'uri': r'[a-zA-Z][a-zA-Z0-9+.-]*://\S+',
+    'url': r'[a-zA-Z][a-zA-Z0-9+.-]*://\S+',
+    'uuid': r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'
+}
+INTEGER_FORMAT_BOUNDS = {
+    'int32': (-2**31, 2**31 - 1),
+    'int64': (-2**63, 2**63 - 1)
+}
+FAILURE_STATUSES = [400, 404]
+# Expected when a valid request may still match several resources, e.g. free-text locations
+DISAMBIGUATION_STATUSES = [200, 300]
+
+
+def resolve(mini_spec, obj):
+    """Follow local component $refs until a concrete object is reached"""
+    seen = set()
+    while isinstance(obj, dict) and '$ref' in obj:
+        ref = obj['$ref']
+        component = parse_component_ref(ref)
+        if component is None or ref in seen:
+            return {}
+        seen.add(ref)
+        section, name = component
+        obj = mini_spec.get('components', {}).get(section, {}).get(name, {})
+    return obj
+
+
+def collect_parameters(mini_spec, endpoint_path, method):
+    """
+    Path-level and operation-level parameters for an operation, with $refs resolved.
+    Operation parameters override path parameters with the same name and location.
+    """
+    path_item = mini_spec['paths'][endpoint_path]
+    parameters = {}
+    for parameter in path_item.get('parameters', []) + path_item[method].get('parameters', []):
+        parameter = dict(resolve(mini_spec, parameter))
+        if 'name' not in parameter:
+            continue
+        parameter['schema'] = resolve(mini_spec, parameter.get('schema', {}))
+        if parameter['schema'].get('type') == 'array':
+            parameter['schema'] = dict(parameter['schema'])
+            parameter['schema']['items'] = resolve(mini_spec, parameter['schema'].get('items', {}))
+        parameters[(parameter['name'], parameter.get('in'))] = parameter
+    return [p for p in parameters.values() if p.get('in') in ('path', 'query', 'header')]
+
+
+def enum_values(schema):
+    """Allowed values of an enum parameter, including arrays of enums"""
+    if schema.get('type') == 'array':
+        return schema.get('items', {}).get('enum', [])
+    return schema.get('enum', [])
+
+
+def example_value(parameter):
+    """A valid value for a parameter, taken from the spec where possible"""
+    schema = parameter.get('schema', {})
+    for candidate in (parameter.get('example'), schema.get('example'), schema.get('default')):
+        if candidate is not None:
+            return format_value(candidate)
+    values = enum_values(schema)
+    if values:
+        return str(values[0])
+
+    schema_type = schema.get('type')
+    if schema_type == 'array':
+        return example_value({'schema': schema.get('items', {})})
+    if schema_type == 'integer':
+        return str(max(schema.get('minimum', 1), 1))
+    if schema_type == 'number':
+        return str(max(schema.get('minimum', 1), 1))
+    if schema_type == 'boolean':
+        return 'true'
+    return {
+        'date': '2024-01-01',
+        'date-time': '2024-01-01T00:00:00',
+        'email': 'user@example.com',
+        'uri': 'https://example.com',
+        'url': 'https://example.com',
+        'uuid': '123e4567-e89b-12d3-a456-426614174000'
+    }.get(schema.get('format'), 'test')
+
+
+def format_value(value):
+    """Render a spec value the way it appears in a URL"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ','.join(format_value(v) for v in value)
+    return str(value)
+
+
+def is_valid_value(parameter, value):
+    """
+    Whether the API should accept value for the parameter according to its schema. Empty and
+    whitespace-only values are always treated as invalid.
+    """
+    if value.strip() == '':
+        return False
+    schema = parameter.get('schema', {})
+    if schema.get('type') == 'array':
+        return all(is_valid_value({'schema': schema.get('items', {})}, part) for part in value.split(','))
+
+    values = schema.get('enum')
+    if values:
+        return value in [format_value(v) for v in values]
+
+    schema_type = schema.get('type')
+    if schema_type == 'integer':
+        if not re.fullmatch(r'-?\d+', value):
+            return False
+        return within_bounds(schema, int(value))
+    if schema_type == 'number':
+        try:
+            return within_bounds(schema, float(value))
+        except ValueError:
+            return False
+    if schema_type == 'boolean':
+        return value.lower() in ('true', 'false')
+
+    if 'pattern' in schema and not re.search(schema['pattern'], value):
+        return False
+    if not schema.get('minLength', 0) <= len(value) <= schema.get('maxLength', len(value)):
+        return False
+    value_format = schema.get('format')
+    if value_format in FORMAT_PATTERNS and not re.fullmatch(FORMAT_PATTERNS[value_format], value):
+        return False
+    return True
+
+
+def within_bounds(schema, number):
+    lower, upper = integer_bounds(schema)
+    if lower is not None and number < lower:
+        return False
+    if upper is not None and number > upper:
+        return False
+    return True
+
+
+def integer_bounds(schema):
+    """Minimum and maximum of a numeric schema, falling back to the limits of its format"""
+    format_lower, format_upper = INTEGER_FORMAT_BOUNDS.get(schema.get('format'), (None, None))
+    lower = schema.get('minimum', format_lower)
+    upper = schema.get('maximum', format_upper)
+    if lower is not None and schema.get('exclusiveMinimum') is True:
+        lower += 1
+    if upper is not None and schema.get('exclusiveMaximum') is True:
+        upper -= 1
+    return lower, upper
+
+
+def may_disambiguate(parameter):
+    """Whether the parameter's description says some values cause disambiguation"""
+    return 'disambiguation' in (parameter.get('description') or '').lower()
+
+
+def status_test_event(expected):
+    """Postman test script checking the response status, as the LLM-generated tests do"""
+    if isinstance(expected, list):
+        exec_lines = [
+            f'pm.test("Status code is {" or ".join(str(s) for s in expected)}", function () {{',
+            f'    pm.expect(pm.response.code).to.be.oneOf({json.dumps(expected)});',
+            '});'
+        ]
+    else:
+        exec_lines = [
+            f'pm.test("Status code is {expected}", function () {{',
+            f'    pm.response.to.have.status({expected});',
+            '});'
+        ]
+    return [{"listen": "test", "script": {"exec": exec_lines, "type": "text/javascript"}}]
+
+
+def build_request_item(name, method, endpoint_path, values, parameters, expected):
+    """A Postman request item for the operation with the given parameter values"""
+    segments = []
+    for segment in endpoint_path.strip('/').split('/'):
+        for parameter in parameters:
+            if parameter['in'] == 'path':
+                segment = segment.replace('{' + parameter['name'] + '}', values.get(parameter['name'], ''))
+        segments.append(segment)
+
+    query = [{"key": "app_key", "value": "{{app_key}}"}]
+    headers = []
+    for parameter in parameters:
+        if parameter['name'] not in values or parameter['in'] == 'path':
+            continue
+        entry = {"key": parameter['name'], "value": values[parameter['name']]}
+        (query if parameter['in'] == 'query' else headers).append(entry)
+
+    raw_path = '/'.join(quote(segment, safe=',') for segment in segments)
+    raw_query = '&'.join(
+        f"{entry['key']}={entry['value'] if entry['key'] == 'app_key' else quote(entry['value'], safe=',')}"
+        for entry in query
+    )
+    return {
+        "name": name,
+        "request": {
+            "method": method.upper(),
+            "header": headers,
+            "url": {
+                "raw": f"{{{{base_url}}}}/{raw_path}?{raw_query}",
+                "host": ["{{base_url}}"],
+                "path": segments,
+                "query": query
+            }
+        },
+        "event": status_test_event(expected)
+    }
+
+
+def parameter_edge_cases(parameter):
+    """(test name, value) pairs for the mechanical edge cases of a single parameter"""
+    name = parameter['name']
+    schema = parameter.get('schema', {})
+    schema_type = schema.get('type')
+    if schema_type in ('array', 'object'):
+        cases = [(f"Empty {name} {schema_type}", '')]
+    else:
+        cases = [(f"Empty {name} parameter", '')]
+    cases.append((f"Null {name} parameter", 'null'))
+
+    if schema_type == 'string' and not schema.get('enum'):
+        cases.append((f"Special characters and escape sequences in {name}", SPECIAL_CHARACTERS_VALUE))
+        cases.append((f"Only whitespace in {name}", WHITESPACE_VALUE))
+
+    if schema_type in ('integer', 'number'):
+        cases.append((f"Negative {name}", '-1'))
+        if schema_type == 'integer':
+            cases.append((f"Decimal {name}", '1.5'))
+        lower, upper = integer_bounds(schema)
+        if upper is not None:
+            cases.append((f"{name} above maximum", str(upper + 1)))
+        if lower is not None:
+            cases.append((f"{name} below minimum", str(lower - 1)))
+
+    value_format = schema.get('format') or schema.get('items', {}).get('format')
+    if value_format in INVALID_FORMAT_VALUES:
+        cases.append((f"Invalid {value_format} format for {name}", INVALID_FORMAT_VALUES[value_format]))
+
+    if schema_type == 'boolean':
+        cases.append((f"Invalid boolean value for {name}", INVALID_VALUE))
+    if enum_values(schema):
+        cases.append((f"Invalid enum value for {name}", INVALID_VALUE))
+    return cases
+
+
+def generate_edge_case_items(mini_spec):
+    """
+    Generates the mechanical tests for every operation in a mini-spec: one positive test per
+    enum value, and the empty/null/special character/boundary/format/invalid value edge cases
+    for every parameter. Each request starts from the required parameters with valid values
+    and changes a single parameter. Tests expect 200 when the value satisfies the parameter's
+    schema and 400 or 404 otherwise. When a parameter's description mentions disambiguation
+    and the spec gives no example value for it, valid requests accept either 200 or 300.
+
+    Returns:
+        tuple: (positive test items, edge test items)
+    """
+    positive_items = []
+    edge_items = []
+    for endpoint_path, path_item in mini_spec.get('paths', {}).items():
+        for method in path_item:
+            if method.lower() not in HTTP_METHODS:
+                continue
+            parameters = collect_parameters(mini_spec, endpoint_path, method)
+            baseline_parameters = [p for p in parameters if p.get('required') or p['in'] == 'path']
+            baseline = {p['name']: example_value(p) for p in baseline_parameters}
+            baseline_ambiguous = any(
+                may_disambiguate(p) and p.get('example') is None and p.get('schema', {}).get('example') is None
+                for p in baseline_parameters
+            )
+
+            for parameter in parameters:
+                valid_status = DISAMBIGUATION_STATUSES if baseline_ambiguous or may_disambiguate(parameter) else 200
+                for value in enum_values(parameter.get('schema', {})):
+                    values = dict(baseline, **{parameter['name']: format_value(value)})
+                    positive_items.append(build_request_item(
+                        f"{parameter['name']} - {format_value(value)}", method, endpoint_path,
+                        values, parameters, valid_status
+                    ))
+
+                for name, value in parameter_edge_cases(parameter):
+                    values = dict(baseline, **{parameter['name']: value})
+                    expected = valid_status if is_valid_value(parameter, value) else FAILURE_STATUSES
+                    edge_items.append(build_request_item(name, method, endpoint_path, values, parameters, expected))
+
+    return positive_items, edge_items
+
+
+def merge_generated_items(collection, positive_items, edge_items):
+    """
+    Adds locally generated tests to an LLM-generated collection, into its "Positive Tests" and
+    "Edge Tests" folders when it has them, otherwise into new folders with those names.
+    """
+    items = collection.setdefault('item', [])
+    for folder_name, generated in (("Positive Tests", positive_items), ("Edge Tests", edge_items)):
+        if not generated:
+            continue
+        folder = next((item for item in items
+                       if isinstance(item, dict) and item.get('name') == folder_name and 'item' in item), None)
+        if folder is None:
+            folder = {"name": folder_name, "item": []}
+            items.append(folder)
+        existing_names = {item.get('name') for item in folder['item'] if isinstance(item, dict)}
+        folder['item'].extend(item for item in generated if item['name'] not in existing_names)
+    return collection
@@ -0,0 +1,372 @@
+"""
+Local stand-in for the Anthropic Messages API, used to exercise the generation pipeline
+without calling the real API. Responses replay the Postman collections in example_output/,
+chosen by the endpoint path found in the prompt. Streaming responses can be slowed down,
+made to fail or truncated at max_tokens to benchmark the pipeline (see benchmark.py).
+
+Run it with `python fake_llm_server.py` and point the client at it with
+ANTHROPIC_BASE_URL=http://127.0.0.1:8765
+"""
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rate_limiter import TokenBucket
+
+EXAMPLE_OUTPUT_DIR = Path(__file__).parent / "example_output"
+# Heading of the specs in a packed prompt, as written by packed_generation.build_packed_user_prompt
+PACKED_SPECS_HEADING = "OpenAPI specifications by endpoint name :"
+
+
+def load_example_collections(example_dir=EXAMPLE_OUTPUT_DIR):
+    """
+    Map endpoint name (e.g. get_BikePoint_Search) to the JSON of its example collection. The
+    JSON is re-serialised compactly, the same way the incremental parser re-serialises
+    completed items, so a continuation prefix is always a prefix of the replayed text.
+    """
+    collections = {}
+    for file in sorted(Path(example_dir).glob('*_collection.json')):
+        if file.name.startswith('merged'):
+            continue
+        collection = json.loads(file.read_text(encoding='utf-8'))
+        collections[file.stem[:-len('_collection')]] = json.dumps(collection, separators=(',', ':'))
+    return collections
+
+
+def prompt_text(request_body):
+    """Concatenated text of every message in a Messages API request"""
+    parts = []
+    for message in request_body.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get('text', '') for block in content or [])
+    return "\n".join(parts)
+
+
+def cached_prefix(request_body):
+    """Text of the system blocks up to the last one with a cache_control breakpoint, if any"""
+    system = request_body.get('system')
+    if not isinstance(system, list):
+        return ""
+    marked = [i for i, block in enumerate(system) if block.get('cache_control')]
+    if not marked:
+        return ""
+    return "\n".join(block.get('text', '') for block in system[:marked[-1] + 1])
+
+
+def endpoint_name_from_prompt(request_body):
+    """Recover the endpoint name from the path and method of the mini-spec in the user prompt"""
+    match = re.search(r'"paths":\s*\{\s*"([^"]+)":\s*\{\s*"(get|put|post|delete|patch|head|options|trace)"',
+                      prompt_text(request_body))
+    if not match:
+        return None
+    path, method = match.groups()
+    safe_path = path.replace('/', '_').replace('{', '').replace('}', '').strip('_')
+    return f"{method}_{safe_path}" if safe_path else f"{method}_root"
+
+
+def packed_endpoint_names(request_body):
+    """Endpoint names of a packed prompt's specs (see packed_generation.py), or None for a single endpoint"""
+    text = prompt_text(request_body)
+    start = text.find(PACKED_SPECS_HEADING)
+    if start < 0:
+        return None
+    specs, _ = json.JSONDecoder().raw_decode(text[start + len(PACKED_SPECS_HEADING):].lstrip())
+    return list(specs)
+
+
+def assistant_prefix(request_body):
+    """Text of a trailing assistant message (a continuation prefix), or an empty string"""
+    messages = request_body.get('messages', [])
+    if not messages or messages[-1].get('role') != 'assistant':
+        return ""
+    content = messages[-1].get('content')
+    if isinstance(content, str):
+        return content
+    return "".join(block.get('text', '') for block in content or [])
+
+
+def sse_event(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+def message_object(text, model, stop_reason="end_turn", input_tokens=0, output_tokens=0, cache_usage=(0, 0)):
+    """A Messages API response body wrapping text. cache_usage is (cache write, cache read) tokens."""
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_creation_input_tokens": cache_usage[0],
+            "cache_read_input_tokens": cache_usage[1]
+        }
+    }
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, content_type="application/json", headers=None):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_POST(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/v1/messages/batches':
+            self.send_json(200, self.server.create_batch(self.read_json()['requests']))
+        elif path == '/v1/messages':
+            self.stream_message(self.read_json())
+        else:
+            self.send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+    def stream_message(self, body):
+        """
+        Replays the endpoint's collection as a Messages API event stream. Depending on the
+        server's settings the request is rate limited, fails with an overloaded error, or the
+        text is cut off part way through with stop_reason max_tokens.
+        """
+        server = self.server
+        input_tokens = len(prompt_text(body)) // 4
+        admitted, rate_limit_headers = server.admit(input_tokens)
+        if not admitted:
+            self.send_json(429, {"type": "error", "error": {"type": "rate_limit_error", "message": "Rate limited"}},
+                           headers=rate_limit_headers)
+            return
+        if server.should_fail():
+            self.send_json(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+            return
+
+        text = server.collection_for(body)
+        prefix = assistant_prefix(body)
+        if prefix and text.startswith(prefix):
+            text = text[len(prefix):]
+        stop_reason = "end_turn"
+        if server.should_truncate():
+            text = text[:max(1, int(len(text) * server.truncate_at))]
+            stop_reason = "max_tokens"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in rate_limit_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        cache_usage = server.prompt_cache_usage(body)
+        message = message_object("", body.get("model", "fake"), None, input_tokens=input_tokens,
+                                 output_tokens=1, cache_usage=cache_usage)
+        message["content"] = []
+        time.sleep(server.first_token_latency)
+        self.wfile.write(sse_event("message_start", {"type": "message_start", "message": message}))
+        self.wfile.write(sse_event("content_block_start", {
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+        }))
+        for i in range(0, len(text), server.chunk_size):
+            self.wfile.write(sse_event("content_block_delta", {
+                "type": "content_block_delta", "index": 0,
+                "delta": {"type": "text_delta", "text": text[i:i + server.chunk_size]}
+            }))
+            self.wfile.flush()
+            if server.chunk_delay:
+                time.sleep(server.chunk_delay)
+        self.wfile.write(sse_event("content_block_stop", {"type": "content_block_stop", "index": 0}))
+        self.wfile.write(sse_event("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": len(text) // 4}
+        }))
+        self.wfile.write(sse_event("message_stop", {"type": "message_stop"}))
+        self.wfile.flush()
+
+    def do_GET(self):
+        match = re.fullmatch(r'/v1/messages/batches/([^/]+)(/results)?', self.path.split('?')[0])
+        batch = self.server.batches.get(match.group(1)) if match else None
+        if batch is None:
+            self.send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+        elif match.group(2):
+            lines = "\n".join(json.dumps(result) for result in self.server.batch_results(batch)) + "\n"
+            self.send_json(200, lines.encode('utf-8'), "application/x-jsonl")
+        else:
+            self.send_json(200, self.server.batch_status(batch))
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Serves streaming /v1/messages and the Message Batches endpoints.
+
+    Streamed responses start after first_token_latency seconds and are sent in chunk_size
+    character deltas, chunk_delay seconds apart. A fraction error_rate of requests fail with
+    a 529 overloaded error, and a fraction truncate_rate stop with max_tokens after
+    truncate_at of their text. With requests_per_minute or input_tokens_per_minute set,
+    streamed requests report their remaining limits in anthropic-ratelimit-* headers and get
+    a 429 with retry-after when they exceed them. A batch reports processing until batch_latency seconds after
+    it was created, then ended with one succeeded result per request. Like the real API, a system
+    prefix marked with cache_control is reported as written to the prompt cache the first time it
+    is seen and read from it afterwards, unless it is shorter than min_cacheable_tokens.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address=("127.0.0.1", 0), batch_latency=0.0, example_dir=EXAMPLE_OUTPUT_DIR,
+                 first_token_latency=0.0, chunk_size=64, chunk_delay=0.0, error_rate=0.0,
+                 truncate_rate=0.0, truncate_at=0.5, requests_per_minute=None, input_tokens_per_minute=None,
+                 min_cacheable_tokens=1024, seed=0):
+        super().__init__(address, FakeLLMHandler)
+        self.batch_latency = batch_latency
+        self.first_token_latency = first_token_latency
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.truncate_at = truncate_at
+        self.limits = {name: TokenBucket(limit) for name, limit in
+                       (("requests", requests_per_minute), ("input-tokens", input_tokens_per_minute)) if limit}
+        self.rate_limited = 0
+        self.min_cacheable_tokens = min_cacheable_tokens
+        self.cached_prefixes = set()
+        self.random = random.Random(seed)
+        self.collections = load_example_collections(example_dir)
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def should_fail(self):
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def admit(self, input_tokens):
+        """
+        Charge a request to the rate limits, unless one of them has no room for it. Returns
+        whether it was admitted and the rate limit headers to send with the response.
+        """
+        with self.lock:
+            cost = {"requests": 1, "input-tokens": input_tokens}
+            wait = max((bucket.seconds_until(cost[name]) for name, bucket in self.limits.items()), default=0)
+            if not wait:
+                for name, bucket in self.limits.items():
+                    bucket.consume(cost[name])
+            else:
+                self.rate_limited += 1
+            headers = {}
+            for name, bucket in self.limits.items():
+                headers[f"anthropic-ratelimit-{name}-limit"] = str(int(bucket.capacity))
+                headers[f"anthropic-ratelimit-{name}-remaining"] = str(max(0, int(bucket.available())))
+            if wait:
+                headers["retry-after"] = str(int(wait) + 1)
+            return not wait, headers
+
+    def prompt_cache_usage(self, request_body):
+        """(cache write, cache read) input tokens of a request's cached system prefix"""
+        prefix = cached_prefix(request_body)
+        tokens = len(prefix) // 4
+        if tokens < self.min_cacheable_tokens:
+            return 0, 0
+        with self.lock:
+            if prefix in self.cached_prefixes:
+                return 0, tokens
+            self.cached_prefixes.add(prefix)
+            return tokens, 0
+
+    def should_truncate(self):
+        with self.lock:
+            return self.random.random() < self.truncate_rate
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def collection_for(self, request_body):
+        """
+        Example collection text for the endpoint in the request, or the first example. A packed
+        request gets an object with the collection of each of its endpoints.
+        """
+        names = packed_endpoint_names(request_body)
+        if names is not None:
+            return "{" + ",".join(f"{json.dumps(name)}:{self.collections.get(name, next(iter(self.collections.values())))}"
+                                  for name in names) + "}"
+        name = endpoint_name_from_prompt(request_body)
+        if name in self.collections:
+            return self.collections[name]
+        return next(iter(self.collections.values()))
+
+    def create_batch(self, requests):
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.batches[batch_id] = {"id": batch_id, "created": time.time(), "requests": requests}
+        return self.batch_status(self.batches[batch_id])
+
+    def batch_status(self, batch):
+        ended = time.time() - batch["created"] >= self.batch_latency
+        count = len(batch["requests"])
+        created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(batch["created"]))
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": created_at,
+            "expires_at": created_at,
+            "ended_at": created_at if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+
+    def batch_results(self, batch):
+        for request in batch["requests"]:
+            text = self.collection_for(request["params"])
+            yield {
+                "custom_id": request["custom_id"],
+                "result": {
+                    "type": "succeeded",
+                    "message": message_object(text, request["params"].get("model", "fake"),
+                                              input_tokens=len(prompt_text(request["params"])) // 4,
+                                              output_tokens=len(text) // 4,
+                                              cache_usage=self.prompt_cache_usage(request["params"]))
+                }
+            }
+
+
+def start_fake_llm_server(port=0, **options):
+    """Start a FakeLLMServer on a background thread and return it; call shutdown() to stop"""
+    server = FakeLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = FakeLLMServer(("127.0.0.1", 8765))
+    print(f"Fake LLM server listening on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,132 @@
+import json
+import hashlib
+from pathlib import Path
+from reference_resolver import (
+    extract_endpoint_info, endpoint_filename, build_component_dependency_index,
+    bundle_external_refs, iter_operations
+)
+from input_data.req_doc import REQUIREMENTS_SPEC_DOC
+
+
+MANIFEST_FILE = "./output_data/generation_manifest.json"
+
+
+def endpoint_name(path, method):
+    """Name used for an endpoint's spec and collection files, e.g. get_BikePoint_Search"""
+    return Path(endpoint_filename(path, method)).stem
+
+
+def collection_filename(name, output_dir="./output_data"):
+    """Path of the collection generated for the named endpoint"""
+    return str(Path(output_dir) / f"{name}_collection.json")
+
+
+def endpoint_fingerprint(mini_spec):
+    """
+    Hash of the parts of a mini-spec that affect generated tests. The mini-spec already
+    contains every transitively referenced schema, so a changed component schema changes
+    the fingerprint of each endpoint that uses it. The info block is left out so that a
+    version bump alone doesn't invalidate every endpoint.
+    """
+    relevant = {
+        'paths': mini_spec.get('paths', {}),
+        'components': mini_spec.get('components', {})
+    }
+    payload = json.dumps(relevant, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def requirements_fingerprint(requirements_doc=REQUIREMENTS_SPEC_DOC):
+    """Hash of the requirements document"""
+    return hashlib.sha256(requirements_doc.encode('utf-8')).hexdigest()
+
+
+def endpoint_requirements_fingerprints(endpoint_requirements):
+    """Hash of the requirements sections that apply to each endpoint, from index_requirements"""
+    return {
+        name: hashlib.sha256(json.dumps(sections).encode('utf-8')).hexdigest()
+        for name, sections in endpoint_requirements.items()
+    }
+
+
+def spec_fingerprints(spec, base_dir='.', spec_file=None):
+    """Fingerprint every endpoint in a full OpenAPI spec"""
+    fingerprints = {}
+    spec = bundle_external_refs(spec, base_dir, spec_file)
+    component_index = build_component_dependency_index(spec)
+    for endpoint_path, method in iter_operations(spec):
+        mini_spec = extract_endpoint_info(spec, endpoint_path, method, component_index)
+        fingerprints[endpoint_name(endpoint_path, method)] = endpoint_fingerprint(mini_spec)
+    return fingerprints
+
+
+def processed_endpoint_fingerprints(processed_endpoints):
+    """Fingerprint the endpoints returned by process_all_endpoints"""
+    return {
+        endpoint_name(endpoint['path'], endpoint['method']): endpoint_fingerprint(endpoint['spec'])
+        for endpoint in processed_endpoints
+    }
+
+
+def diff_spec_fingerprints(previous, current):
+    """
+    Compare two endpoint fingerprint maps.
+
+    Returns:
+        dict: Sorted endpoint names under 'added', 'removed', 'changed' and 'unchanged'
+    """
+    return {
+        'added': sorted(current.keys() - previous.keys()),
+        'removed': sorted(previous.keys() - current.keys()),
+        'changed': sorted(name for name in current.keys() & previous.keys()
+                          if current[name] != previous[name]),
+        'unchanged': sorted(name for name in current.keys() & previous.keys()
+                            if current[name] == previous[name])
+    }
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    """Load the fingerprints recorded by the previous run, or an empty manifest"""
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"requirements_hash": None, "endpoints": {}}
+
+
+def save_manifest(endpoint_fingerprints, requirements_hash, manifest_file=MANIFEST_FILE,
+                  endpoint_requirements=None):
+    """
+    Record the fingerprints of the endpoints whose collections are up to date, and with a
+    requirements index, the fingerprint of the requirements sections each was generated with
+    """
+    manifest = {"requirements_hash": requirements_hash, "endpoints": endpoint_fingerprints}
+    if endpoint_requirements is not None:
+        manifest["endpoint_requirements"] = endpoint_requirements
+    Path(manifest_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def plan_incremental_run(previous, current, requirements_changed, output_dir="./output_data"):
+    """
+    Decide which endpoints need regenerating.
+
+    An endpoint is reused only if its fingerprint is unchanged, its requirements are unchanged
+    and its previous collection still exists in output_dir. requirements_changed is True when
+    the whole requirements document applies to every endpoint and changed, otherwise the names
+    of the endpoints whose requirements sections changed.
+
+    Returns:
+        tuple: (names to regenerate, names whose existing collection is reused, the diff)
+    """
+    diff = diff_spec_fingerprints(previous, current)
+    if requirements_changed is True:
+        return sorted(current), [], diff
+
+    changed_requirements = set(requirements_changed or ())
+    reused = [name for name in diff['unchanged']
+              if name not in changed_requirements and Path(collection_filename(name, output_dir)).exists()]
+    reused_set = set(reused)
+    regenerate = [name for name in sorted(current) if name not in reused_set]
+    return regenerate, reused, diff
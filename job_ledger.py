@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQLite file recording the state of every endpoint in the current generation job
+LEDGER_FILE = os.environ.get("LEDGER_FILE", "./output_data/job_ledger.sqlite")
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    key TEXT PRIMARY KEY,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS endpoints (
+    name TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT,
+    content_hash TEXT,
+    message TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def open_ledger(ledger_file=LEDGER_FILE):
+    """Open (creating if needed) the ledger database. Every update is committed immediately."""
+    Path(ledger_file).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(ledger_file, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL keeps each per-endpoint commit cheap and the file consistent if the run is killed
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def job_key(fingerprints, requirements_hash):
+    """Identifies a job by the fingerprints of its endpoints and the requirements document"""
+    payload = json.dumps([sorted(fingerprints.items()), requirements_hash], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def collection_content_hash(collection):
+    """Hash of a collection as save_postman_collection_to_file writes it, without reading the file back"""
+    return content_hash(json.dumps(collection, indent=2).encode('utf-8'))
+
+
+def file_matches(output_path, expected_hash):
+    """Whether the file at output_path still has the content recorded in the ledger"""
+    if not output_path or not expected_hash:
+        return False
+    try:
+        return content_hash(Path(output_path).read_bytes()) == expected_hash
+    except FileNotFoundError:
+        return False
+
+
+def start_job(conn, key, fingerprints):
+    """
+    Starts or resumes the job with the given key. If the ledger holds the same job and it
+    didn't finish, the job is resumed: endpoints that are done, and whose output file is
+    unchanged, are kept, and everything else (pending, in flight when the run died, failed,
+    or with a missing output file) is set back to pending. Otherwise the ledger is reset
+    with every endpoint pending.
+
+    Returns:
+        set: Names of the endpoints that are already done
+    """
+    row = conn.execute("SELECT key FROM job").fetchone()
+    unfinished = conn.execute("SELECT COUNT(*) FROM endpoints WHERE state != ?", (DONE,)).fetchone()[0]
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN")
+        if row is None or row["key"] != key or not unfinished:
+            conn.execute("DELETE FROM job")
+            conn.execute("DELETE FROM endpoints")
+            conn.execute("INSERT INTO job (key, started_at) VALUES (?, ?)", (key, now))
+            done = set()
+        else:
+            done = {
+                r["name"] for r in conn.execute(
+                    "SELECT name, output_path, content_hash FROM endpoints WHERE state = ?", (DONE,))
+                if file_matches(r["output_path"], r["content_hash"])
+            }
+            conn.execute("UPDATE endpoints SET state = ?, updated_at = ? WHERE name NOT IN (%s)"
+                         % ",".join("?" * len(done)), (PENDING, now, *sorted(done)))
+        conn.executemany(
+            "INSERT OR IGNORE INTO endpoints (name, fingerprint, state, updated_at) VALUES (?, ?, ?, ?)",
+            [(name, fingerprint, PENDING, now) for name, fingerprint in fingerprints.items()]
+        )
+    return done
+
+
+def mark_in_flight(conn, name):
+    """Record that an attempt at the endpoint has started"""
+    conn.execute("UPDATE endpoints SET state = ?, attempts = attempts + 1, updated_at = ? WHERE name = ?",
+                 (IN_FLIGHT, time.time(), name))
+
+
+def mark_done(conn, name, output_path=None, digest=None, message=None):
+    conn.execute("UPDATE endpoints SET state = ?, output_path = ?, content_hash = ?, message = ?, updated_at = ? "
+                 "WHERE name = ?", (DONE, output_path, digest, message, time.time(), name))
+
+
+def mark_failed(conn, name, message):
+    conn.execute("UPDATE endpoints SET state = ?, message = ?, updated_at = ? WHERE name = ?",
+                 (FAILED, message, time.time(), name))
+
+
+def record_result(conn, name, result):
+    """Record an endpoint's status dict from generation as done or failed"""
+    if result["status"] != "success":
+        mark_failed(conn, name, result.get("message"))
+        return
+    output_path = result.get("output_file")
+    # Only collections written to disk can be reused by a resumed run
+    digest = collection_content_hash(result["collection"]) if output_path and "collection" in result else None
+    mark_done(conn, name, output_path, digest, result.get("message"))
+
+
+def record_existing_collection(conn, name, output_path):
+    """Record an endpoint whose collection from an earlier run is reused as done"""
+    mark_done(conn, name, output_path, content_hash(Path(output_path).read_bytes()), "Reused existing collection.")
+
+
+def completed_endpoints(conn):
+    """Maps the name of every done endpoint to its output file (None if it was only kept in memory)"""
+    return {r["name"]: r["output_path"]
+            for r in conn.execute("SELECT name, output_path FROM endpoints WHERE state = ?", (DONE,))}
+
+
+def ledger_summary(conn):
+    """Number of endpoints in each state, and the total number of attempts"""
+    summary = {state: 0 for state in (PENDING, IN_FLIGHT, DONE, FAILED)}
+    for r in conn.execute("SELECT state, COUNT(*) AS count FROM endpoints GROUP BY state"):
+        summary[r["state"]] = r["count"]
+    summary["attempts"] = conn.execute("SELECT COALESCE(SUM(attempts), 0) FROM endpoints").fetchone()[0]
+    return summary
@@ -1,14 +1,33 @@
 from reference_resolver import process_all_endpoints
-from collection_merger import merge_postman_collections
-from postman_generation_agent import generate_postman_collection
-import yaml
+from collection_merger import merge_postman_collections, upsert_collection_folder, load_merge_index, folder_name
+from postman_generation_agent import (
+    generate_postman_collection_async, register_endpoint_specs, index_requirements, CACHE_MODE,
+    WRITE_INTERMEDIATE_FILES, MODEL
+)
+from client_pool import build_client_pool
+from packed_generation import pack_endpoints, generate_packed_collections_async
+from rate_limiter import backoff_delay, MAX_RETRIES
+from batch_generation import generate_postman_collections_batch
+from spec_loader import load_spec
+from telemetry import write_telemetry, summarise_telemetry, print_run_report, add_earlier_attempts
+from job_ledger import (
+    open_ledger, job_key, start_job, mark_in_flight, record_result, record_existing_collection,
+    completed_endpoints, ledger_summary
+)
+from incremental import (
+    processed_endpoint_fingerprints, spec_fingerprints, requirements_fingerprint, endpoint_requirements_fingerprints,
+    load_manifest, save_manifest, plan_incremental_run, collection_filename
+)
 from openai import OpenAI
-import anthropic  
+import anthropic
+import asyncio
 import logging
-from dotenv import load_dotenv 
+import queue
+import threading
+from dotenv import load_dotenv
 from pathlib import Path
 import os
-import concurrent.futures
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,32 +35,273 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 SPECIFICATION_FILE = './input_data/tfl_openapi_spec_multiple_api_old.yaml'
+MERGED_COLLECTION_FILE = "./output_data/merged_regression_collection.json"
 
-with open(SPECIFICATION_FILE, 'r') as f:
-    spec = yaml.safe_load(f)
-
-processed_endpoints = process_all_endpoints(spec)
-
-try:
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("Required environment variable not set: ANTHROPIC_API_KEY")
-    # client = OpenAI(api_key=api_key)
-    client = anthropic.Anthropic(api_key=api_key)
-except ValueError as e:
-    logger.error(f"API configuration failed: {e}")
-
-
-endpoint_files = [str(f) for f in Path("./endpoint_specs").glob('*.json')]
-if endpoint_files:
-    for file in endpoint_files:
-        generate_postman_collection(client, file)
-else:
-    print("No endpoint spec files found!")
-
-collection_files = [str(f) for f in Path("./output_data").glob('*.json')]
-# print(collection_files)    
-if collection_files:
-    merge_postman_collections(collection_files, "./output_data/merged_regression_collection.json")
-else:
-    print("No Postman collection files found!")
\ No newline at end of file
+# Only regenerate endpoints whose mini-spec (or the requirements document) changed since the
+# last run, reusing the existing collections in output_data for the rest (set INCREMENTAL=1).
+# PREVIOUS_SPECIFICATION_FILE optionally names the old spec to diff against; otherwise the
+# fingerprints recorded in output_data/generation_manifest.json by the last run are used.
+INCREMENTAL = os.environ.get("INCREMENTAL", "0") == "1"
+PREVIOUS_SPECIFICATION_FILE = os.environ.get("PREVIOUS_SPECIFICATION_FILE")
+
+# "stream" generates endpoints concurrently with streaming requests, "packed" does the same but
+# packs endpoints with small specs into shared requests, "batch" submits them all as one
+# Message Batches job (higher latency, batch pricing)
+GENERATION_MODE = os.environ.get("GENERATION_MODE", "stream")
+
+# Maximum number of endpoints generated at the same time (override with MAX_CONCURRENCY)
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "5"))
+
+
+async def generate_all_collections(client, endpoint_files, max_concurrency=MAX_CONCURRENCY, cache_mode=CACHE_MODE,
+                                   ledger=None, max_retries=MAX_RETRIES, pack=False, on_result=None):
+    """
+    Generates a Postman collection for every endpoint spec concurrently, with at most
+    max_concurrency requests to the LLM in flight at once. An endpoint that fails with a
+    retryable API error (rate limited, overloaded) is retried up to max_retries times after a
+    jittered exponential backoff, without holding its concurrency slot while it waits. When a
+    job ledger is given, each attempt is recorded as in flight when it starts and the endpoint
+    as done or failed once it ends. With pack, endpoints with small specs are generated
+    several to a request (see packed_generation.py); any the packed response doesn't cover
+    are generated on their own. on_result(file, result) is called as soon as each endpoint
+    has finished, after it is recorded in the ledger, e.g. to merge it straight away.
+
+    Returns:
+        dict: Maps each endpoint spec file to the status dict returned for it
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(file):
+        name = Path(file).stem
+        started = time.perf_counter()
+        earlier = None
+        for attempt in range(max_retries + 1):
+            async with semaphore:
+                if ledger is not None:
+                    mark_in_flight(ledger, name)
+                try:
+                    result = await generate_postman_collection_async(client, file, cache_mode)
+                except Exception as e:
+                    result = {"status": "error", "message": f"Unhandled error for {file}: {e}"}
+            # One telemetry record covers every attempt, so tokens spent on failed ones are counted
+            result = add_earlier_attempts(result, earlier, started)
+            earlier = result.get("telemetry", earlier)
+            if result["status"] == "success" or not result.get("retryable") or attempt == max_retries:
+                break
+            delay = backoff_delay(attempt, result.get("retry_after"))
+            logger.warning(f"{name}: retry {attempt + 1} of {max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        if "telemetry" in result:
+            result["telemetry"]["retries"] = attempt
+        if ledger is not None:
+            record_result(ledger, name, result)
+        logger.info(f"{name}: {result['status']} in {time.perf_counter() - started:.1f}s")
+        if on_result is not None:
+            on_result(file, result)
+        return result
+
+    async def run_pack(files):
+        async with semaphore:
+            if ledger is not None:
+                for file in files:
+                    mark_in_flight(ledger, Path(file).stem)
+            try:
+                results, unpacked = await generate_packed_collections_async(client, files, cache_mode)
+            except Exception as e:
+                logger.error(f"Unhandled error for packed request of {len(files)} endpoints: {e}")
+                results, unpacked = {}, files
+        for file, result in results.items():
+            if ledger is not None:
+                record_result(ledger, Path(file).stem, result)
+            if on_result is not None:
+                on_result(file, result)
+        results.update(zip(unpacked, await asyncio.gather(*(run(file) for file in unpacked))))
+        return results
+
+    packs, singles = pack_endpoints(endpoint_files) if pack else ([], endpoint_files)
+    if packs:
+        print(f"Packing {sum(map(len, packs))} small endpoints into {len(packs)} requests")
+    async def run_single(file):
+        return {file: await run(file)}
+
+    results = {}
+    for done in await asyncio.gather(*(run_pack(files) for files in packs), *(run_single(file) for file in singles)):
+        results.update(done)
+    return {file: results[file] for file in endpoint_files}
+
+
+def arrived_collections(arrivals):
+    """
+    Yields (name, result) from the arrivals queue, which generation fills with (name, result)
+    as each endpoint finishes and ends with None.
+    """
+    while (arrival := arrivals.get()) is not None:
+        yield arrival
+
+
+def merge_source(name, result):
+    """
+    The merge source for an endpoint: the collection generated in this run, straight from its
+    result, or the file of a collection reused from an earlier run. The collection is dropped
+    from its result once handed over, so it can be freed after merging.
+    """
+    if result is not None and "collection" in result:
+        return collection_filename(name), result.pop("collection")
+    return collection_filename(name)
+
+
+def collection_sources(names, reused, arrivals):
+    """
+    Yields the merge source for each named endpoint in order while generation is still
+    running. Reused endpoints are yielded straight away and generated ones as soon as their
+    result arrives, so only results that finish ahead of their turn wait in memory. Endpoints
+    whose generation failed are left out.
+    """
+    waiting = {}
+    arrived = arrived_collections(arrivals)
+    for name in names:
+        if name in reused:
+            yield merge_source(name, None)
+            continue
+        while name not in waiting:
+            arrival = next(arrived, None)
+            if arrival is None:
+                break
+            waiting[arrival[0]] = arrival[1]
+        result = waiting.pop(name, None)
+        if result is not None and result["status"] == "success":
+            yield merge_source(name, result)
+
+
+def merge_generated_collections(merge_order, reused, arrivals):
+    """
+    Merges the collections of merge_order into MERGED_COLLECTION_FILE while they are
+    generated, taking each generated one from the arrivals queue as it finishes. If the
+    existing merged collection already holds every reused endpoint (and nothing removed), only
+    the regenerated endpoints' folders are upserted, in the order they finish.
+    """
+    index = load_merge_index(MERGED_COLLECTION_FILE) if INCREMENTAL else None
+    merged_folders = {entry[0] for entry in index["folders"]} if index else set()
+    if index and {folder_name(collection_filename(name)) for name in reused} <= merged_folders \
+            <= {folder_name(collection_filename(name)) for name in merge_order}:
+        for name, result in arrived_collections(arrivals):
+            if result["status"] == "success":
+                upsert_collection_folder(merge_source(name, result), MERGED_COLLECTION_FILE)
+    elif merge_order:
+        merge_postman_collections(collection_sources(merge_order, reused, arrivals), MERGED_COLLECTION_FILE)
+    else:
+        print("No Postman collection files found!")
+
+
+def main():
+    spec = load_spec(SPECIFICATION_FILE)
+
+    processed_endpoints = process_all_endpoints(
+        spec, Path(SPECIFICATION_FILE).parent, "./endpoint_specs" if WRITE_INTERMEDIATE_FILES else None,
+        spec_file=SPECIFICATION_FILE
+    )
+    # Generation reads the mini-specs from memory rather than from endpoint_specs/
+    register_endpoint_specs(processed_endpoints)
+    # Each prompt only carries the requirements sections that apply to its endpoint
+    endpoint_requirements = index_requirements(processed_endpoints)
+
+    try:
+        if GENERATION_MODE == "batch":
+            api_key = os.environ.get("ANTHROPIC_API_KEY")
+            if not api_key:
+                raise ValueError("Required environment variable not set: ANTHROPIC_API_KEY")
+            client = anthropic.Anthropic(api_key=api_key)
+        else:
+            # Streamed requests are spread over every configured key and provider (see client_pool)
+            client = build_client_pool(MODEL)
+    except ValueError as e:
+        logger.error(f"API configuration failed: {e}")
+        return
+
+    current = processed_endpoint_fingerprints(processed_endpoints)
+    requirements_hash = requirements_fingerprint()
+    requirements_hashes = endpoint_requirements_fingerprints(endpoint_requirements) if endpoint_requirements else None
+    endpoint_names = sorted(current)
+    reused = []
+
+    if INCREMENTAL:
+        manifest = load_manifest()
+        if PREVIOUS_SPECIFICATION_FILE:
+            previous = spec_fingerprints(load_spec(PREVIOUS_SPECIFICATION_FILE),
+                                         Path(PREVIOUS_SPECIFICATION_FILE).parent, PREVIOUS_SPECIFICATION_FILE)
+        else:
+            previous = manifest["endpoints"]
+        if requirements_hashes is not None and manifest.get("endpoint_requirements") is not None:
+            # Only endpoints whose requirements sections changed are affected by a document change
+            requirements_changed = {name for name, digest in requirements_hashes.items()
+                                    if manifest["endpoint_requirements"].get(name) != digest}
+            requirements_note = (f" (requirements changed for {len(requirements_changed)} endpoints)"
+                                 if requirements_changed else "")
+        else:
+            requirements_changed = manifest["requirements_hash"] not in (None, requirements_hash)
+            requirements_note = " (requirements changed)" if requirements_changed else ""
+        endpoint_names, reused, diff = plan_incremental_run(previous, current, requirements_changed)
+        print(f"Incremental run: {len(diff['added'])} added, {len(diff['changed'])} changed, "
+              f"{len(diff['removed'])} removed, {len(diff['unchanged'])} unchanged{requirements_note}")
+        print(f"Regenerating {len(endpoint_names)} endpoints, reusing {len(reused)} collections")
+
+    # A run that died part way through resumes its job, skipping the endpoints already done
+    ledger = open_ledger()
+    done = start_job(ledger, job_key(current, requirements_hash), current)
+    if done:
+        print(f"Resuming unfinished run: {len(done)} endpoints already done")
+        endpoint_names = [name for name in endpoint_names if name not in done]
+    for name in reused:
+        record_existing_collection(ledger, name, collection_filename(name))
+    reused = sorted(set(reused) | done)
+
+    endpoint_files = [str(Path("./endpoint_specs") / f"{name}.json") for name in endpoint_names]
+    # Collections are merged on a separate thread as they finish, in the order upserts keep
+    merge_order = sorted(set(endpoint_names) | set(reused), key=lambda name: folder_name(collection_filename(name)))
+    arrivals = queue.Queue()
+    merger = threading.Thread(target=merge_generated_collections, args=(merge_order, set(reused), arrivals))
+    merger.start()
+    try:
+        if endpoint_files:
+            started = time.perf_counter()
+            if GENERATION_MODE == "batch":
+                for file in endpoint_files:
+                    mark_in_flight(ledger, Path(file).stem)
+                results = generate_postman_collections_batch(client, endpoint_files)
+                for file, result in results.items():
+                    record_result(ledger, Path(file).stem, result)
+                    arrivals.put((Path(file).stem, result))
+            else:
+                results = asyncio.run(generate_all_collections(
+                    client, endpoint_files, ledger=ledger, pack=GENERATION_MODE == "packed",
+                    on_result=lambda file, result: arrivals.put((Path(file).stem, result))
+                ))
+            failed = {file: result for file, result in results.items() if result["status"] != "success"}
+            print(f"Generated {len(results) - len(failed)}/{len(results)} collections in "
+                  f"{time.perf_counter() - started:.1f}s ({GENERATION_MODE} mode)")
+            for file, result in failed.items():
+                print(f"  Failed: {file} - {result['message']}")
+            records = [result["telemetry"] for result in results.values() if "telemetry" in result]
+            if records:
+                write_telemetry(records)
+                print_run_report(summarise_telemetry(records))
+        elif not reused:
+            print("No endpoint spec files found!")
+    finally:
+        arrivals.put(None)
+        merger.join()
+
+    # The merged collection holds exactly the endpoints the ledger has as done
+    completed = set(completed_endpoints(ledger)) & set(current)
+    summary = ledger_summary(ledger)
+    print(f"Job ledger: {summary['done']} done, {summary['failed']} failed, {summary['pending']} pending, "
+          f"{summary['attempts']} attempts in total")
+    ledger.close()
+
+    save_manifest({name: current[name] for name in completed}, requirements_hash,
+                  endpoint_requirements={name: requirements_hashes[name] for name in completed}
+                  if requirements_hashes else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Local mock of the API described by the OpenAPI spec, for running generated collections
+without calling the real upstream. Every operation in the spec is served from its
+mini-spec: requests to unknown paths get 404, missing or invalid parameters (according to
+the parameter schemas and enum values) get 400, free-text values of parameters whose
+description mentions disambiguation get 300, and everything else gets 200 with a body shaped
+like the operation's response schema. The changes described in the requirements document
+are applied to the spec first, so tests for new parameters pass against the mock.
+
+Run it with `python mock_api_server.py` and run a collection against it with
+BASE_URL=http://127.0.0.1:8080 python collection_runner.py
+"""
+import re
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qsl, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from spec_loader import load_spec
+from reference_resolver import (
+    bundle_external_refs, build_component_dependency_index, extract_endpoint_info, iter_operations
+)
+from edge_case_generator import resolve, collect_parameters, is_valid_value, may_disambiguate
+from requirements_parser import parse_requirements_doc, apply_requirements
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MOCK_SPECIFICATION_FILE = os.environ.get("MOCK_SPECIFICATION_FILE", "./input_data/tfl_openapi_spec_multiple_api_old.yaml")
+MOCK_PORT = int(os.environ.get("MOCK_PORT", "8080"))
+# Apply the requirements document's changes to the spec before serving it (set to 0 to serve the spec as is)
+MOCK_APPLY_REQUIREMENTS = os.environ.get("MOCK_APPLY_REQUIREMENTS", "1") == "1"
+
+# Values that identify a single place rather than needing disambiguation: coordinates,
+# numeric IDs and codes such as ICS or NaPTAN IDs
+_UNAMBIGUOUS_VALUE = re.compile(r'-?\d+(\.\d+)?\s*,\s*-?\d+(\.\d+)?|.*\d.*')
+# Response bodies are only built this many levels deep
+MAX_BODY_DEPTH = 4
+
+
+def compile_route(endpoint_path):
+    """Regex matching request paths for a path template, capturing each path parameter"""
+    parts = re.split(r'\{[^{}]+\}', endpoint_path)
+    return re.compile('([^/]+)'.join(re.escape(part) for part in parts) + '/?')
+
+
+def example_body(mini_spec, schema, depth=0):
+    """A JSON value shaped like schema, using its example where the spec gives one"""
+    schema = resolve(mini_spec, schema)
+    if not isinstance(schema, dict):
+        return None
+    if 'example' in schema:
+        return schema['example']
+    if schema.get('enum'):
+        return schema['enum'][0]
+    schema_type = schema.get('type', 'object' if 'properties' in schema else None)
+    if schema_type == 'array':
+        return [] if depth >= MAX_BODY_DEPTH else [example_body(mini_spec, schema.get('items', {}), depth + 1)]
+    if schema_type == 'object':
+        if depth >= MAX_BODY_DEPTH:
+            return {}
+        return {name: example_body(mini_spec, prop, depth + 1) for name, prop in schema.get('properties', {}).items()}
+    return {'integer': 0, 'number': 0, 'boolean': True, 'string': 'string'}.get(schema_type)
+
+
+def success_body(mini_spec, operation):
+    """Body of a 200 response to an operation, from its JSON response schema"""
+    response = resolve(mini_spec, operation.get('responses', {}).get('200', {}))
+    for media_type, content in (response.get('content') or {}).items():
+        if 'json' in media_type:
+            return example_body(mini_spec, content.get('schema', {}))
+    return {}
+
+
+def build_routes(spec):
+    """
+    One route per operation in the spec: its method, path template, compiled path regex,
+    parameters and 200 response body. Routes with more literal path segments come first, so
+    /BikePoint/Search is matched before /BikePoint/{id}.
+    """
+    component_index = build_component_dependency_index(spec)
+    routes = []
+    for endpoint_path, method in iter_operations(spec):
+        mini_spec = extract_endpoint_info(spec, endpoint_path, method, component_index)
+        routes.append({
+            "method": method.upper(),
+            "path": endpoint_path,
+            "regex": compile_route(endpoint_path),
+            "path_names": re.findall(r'\{([^{}]+)\}', endpoint_path),
+            "parameters": collect_parameters(mini_spec, endpoint_path, method),
+            "body": json.dumps(success_body(mini_spec, mini_spec['paths'][endpoint_path][method])).encode('utf-8')
+        })
+    routes.sort(key=lambda route: -sum(1 for s in route["path"].split('/') if s and '{' not in s))
+    return routes
+
+
+def load_mock_spec(spec_file=MOCK_SPECIFICATION_FILE, apply_changes=MOCK_APPLY_REQUIREMENTS):
+    """The spec main.py generates tests from, with the requirements document's changes applied"""
+    spec = bundle_external_refs(load_spec(spec_file), Path(spec_file).parent, spec_file)
+    if apply_changes:
+        spec = apply_requirements(spec, parse_requirements_doc())
+    return spec
+
+
+def check_parameters(route, path_values, query, headers):
+    """
+    Status a request with these parameter values should get: 400 when a required parameter
+    is missing or a value doesn't satisfy its schema, 300 when a free-text value needs
+    disambiguation, otherwise 200. Returns (status, message).
+    """
+    ambiguous = None
+    for parameter in route["parameters"]:
+        name = parameter['name']
+        if parameter['in'] == 'path':
+            value = path_values.get(name)
+        elif parameter['in'] == 'query':
+            value = query.get(name)
+        else:
+            value = headers.get(name)
+        if value is None:
+            if parameter.get('required'):
+                return 400, f"Missing required {parameter['in']} parameter {name}"
+            continue
+        if not is_valid_value(parameter, value):
+            return 400, f"Invalid value for {parameter['in']} parameter {name}: {value!r}"
+        if ambiguous is None and may_disambiguate(parameter) and not _UNAMBIGUOUS_VALUE.fullmatch(value.strip()):
+            ambiguous = name
+    if ambiguous:
+        return 300, f"Multiple matches for {ambiguous}, disambiguation required"
+    return 200, None
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Buffer the whole response instead of writing the status line and each header separately,
+    # which stalls keep-alive connections on delayed ACKs
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        self.wfile.flush()
+
+    def handle_request(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        if length:
+            self.rfile.read(length)
+
+        matches = [(route, match) for route in self.server.routes
+                   if (match := route["regex"].fullmatch(parts.path))]
+        if not matches:
+            self.send_json(404, {"message": f"No resource found at {parts.path}"})
+            return
+        route, match = next(((r, m) for r, m in matches if r["method"] == self.command), (None, None))
+        if route is None:
+            self.send_json(405, {"message": f"The requested resource does not support http method '{self.command}'"})
+            return
+
+        path_values = {name: unquote(value) for name, value in zip(route["path_names"], match.groups())}
+        query = {}
+        for key, value in parse_qsl(parts.query, keep_blank_values=True):
+            # Repeated keys (?ids=a&ids=b) are treated like a comma-separated list
+            query[key] = f"{query[key]},{value}" if key in query else value
+        status, message = check_parameters(route, path_values, query, self.headers)
+        self.send_json(status, route["body"] if status == 200 else {"message": message})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = handle_request
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """Serves the operations of a spec, see check_parameters for the responses"""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, spec, address=("127.0.0.1", 0)):
+        super().__init__(address, MockAPIHandler)
+        self.routes = build_routes(spec)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_mock_api_server(spec, port=0):
+    """Start a MockAPIServer on a background thread and return it; call shutdown() to stop"""
+    server = MockAPIServer(spec, ("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = MockAPIServer(load_mock_spec(), ("127.0.0.1", MOCK_PORT))
+    print(f"Mock API serving {len(server.routes)} operations on {server.base_url}")
+    server.serve_forever()
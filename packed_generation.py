@@ -0,0 +1,186 @@
+"""
+Packs endpoints with small mini-specs into shared generation requests. Every request pays for
+the system prompt and Requirements Document (written to or read from the prompt cache) and a
+round-trip, which for a simple lookup with one or two parameters costs more than its own spec.
+Packing groups small specs into one request up to a token budget, asks for a JSON object
+mapping each endpoint name to its collection, and splits the response back into one result
+(and collection file) per endpoint. Endpoints whose collection is missing or invalid in the
+response, or whose packed request failed, are returned for generating one at a time.
+"""
+import os
+import time
+import logging
+from pathlib import Path
+from postman_generation_agent import (
+    MODEL, MAX_TOKENS, CACHE_MODE, load_prompt_spec, build_system_blocks, collection_cache_key,
+    cached_result, save_generated_collection, usage_summary, endpoint_requirement_sections,
+    build_requirements_prompt
+)
+from utils import validate_and_clean_json
+from spec_compactor import estimate_tokens, compact_json
+from telemetry import start_endpoint_telemetry, mark_first_token, finish_endpoint_telemetry
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Endpoints whose compacted spec is estimated at no more than this many tokens are packed
+PACK_MAX_SPEC_TOKENS = int(os.environ.get("PACK_MAX_SPEC_TOKENS", "600"))
+# Estimated spec tokens per packed request
+PACK_TOKEN_BUDGET = int(os.environ.get("PACK_TOKEN_BUDGET", "3000"))
+# Endpoints per packed request, bounded so every collection fits in one response of MAX_TOKENS
+PACK_MAX_ENDPOINTS = int(os.environ.get("PACK_MAX_ENDPOINTS", "6"))
+
+# Heading of the specs in a packed prompt (fake_llm_server.py looks for the same text)
+PACKED_SPECS_HEADING = "OpenAPI specifications by endpoint name :"
+
+packed_instructions = """
+    The user has provided the OpenAPI specifications of several endpoints, keyed by endpoint
+    name, instead of one. Follow the instructions above for every endpoint independently,
+    generating a separate Postman Collection for each one. The output should only be the raw
+    JSON of one object that maps every endpoint name to its Postman collection. No explanations,
+    markdown formatting or additional text.
+"""
+
+
+def spec_tokens(filename):
+    """Estimated tokens of an endpoint's spec as it is sent in the prompt"""
+    return estimate_tokens(compact_json(load_prompt_spec(filename)))
+
+
+def pack_endpoints(endpoint_files, max_spec_tokens=PACK_MAX_SPEC_TOKENS, token_budget=PACK_TOKEN_BUDGET,
+                   max_endpoints=PACK_MAX_ENDPOINTS):
+    """
+    Groups the endpoints with small specs, in order, into packs of at most max_endpoints
+    whose specs add up to at most token_budget. Order is kept, so endpoints of the same
+    resource tend to share a request. Only endpoints with the same requirements sections
+    share a pack, so every endpoint in a packed request sees exactly its own sections.
+
+    Returns:
+        tuple: (list of packs of two or more spec files, spec files to generate on their own)
+    """
+    packs, singles = [], []
+    # Pack being filled and its spec tokens, per set of requirements sections
+    open_packs = {}
+    for file in endpoint_files:
+        tokens = spec_tokens(file)
+        if tokens > max_spec_tokens:
+            singles.append(file)
+            continue
+        sections = endpoint_requirement_sections(file)
+        group = None if sections is None else tuple(sections)
+        pack, pack_tokens = open_packs.get(group, ([], 0))
+        if pack and (pack_tokens + tokens > token_budget or len(pack) >= max_endpoints):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append(file)
+        open_packs[group] = (pack, pack_tokens + tokens)
+    packs.extend(pack for pack, _ in open_packs.values())
+    # A pack of one saves nothing
+    singles.extend(file for pack in packs if len(pack) == 1 for file in pack)
+    return [pack for pack in packs if len(pack) > 1], singles
+
+
+def build_packed_user_prompt(specs, requirement_sections=None):
+    """
+    User prompt for several endpoints' specs, keyed by endpoint name, with the requirements
+    sections that apply to every one of them
+    """
+    return f"""
+    {packed_instructions}{build_requirements_prompt(requirement_sections)}
+    {PACKED_SPECS_HEADING}
+    {compact_json(specs)}
+    """
+
+
+def split_usage(usage, weights):
+    """
+    Divides a packed request's token counts between its endpoints in proportion to weights
+    (their spec sizes), so per-endpoint telemetry adds up to what the request used.
+    """
+    total = sum(weights.values()) or 1
+    return {name: {key: round(value * weight / total) for key, value in usage.items()}
+            for name, weight in weights.items()}
+
+
+def is_collection(value):
+    return isinstance(value, dict) and isinstance(value.get("item"), list)
+
+
+async def generate_packed_collections_async(client, endpoint_files, cache_mode=CACHE_MODE):
+    """
+    Generates the collections of several endpoints with one request. Cached endpoints are
+    served from the cache and left out of the request. The endpoints must share their
+    requirements sections (see pack_endpoints), since each collection is cached under the key
+    of a request for its endpoint alone.
+
+    Returns:
+        tuple: (dict mapping each spec file that succeeded to its status dict,
+                list of spec files to generate on their own)
+    """
+    results = {}
+    specs, keys, files, requirements = {}, {}, {}, {}
+    telemetry = {}
+    for file in endpoint_files:
+        name = Path(file).stem
+        telemetry[name] = start_endpoint_telemetry(file, mode="packed")
+        data = load_prompt_spec(file)
+        requirements[name] = endpoint_requirement_sections(file)
+        keys[name] = collection_cache_key(data, requirements[name])
+        result = cached_result(keys[name], file, cache_mode)
+        if result is not None:
+            results[file] = finish_endpoint_telemetry(telemetry[name], result, MODEL)
+        else:
+            specs[name], files[name] = data, file
+    if len(specs) < 2:
+        return results, list(files.values())
+    requirement_sections = requirements[next(iter(specs))]
+    if any(requirements[name] != requirement_sections for name in specs):
+        logger.warning(f"Endpoints {', '.join(specs)} have different requirements sections, generating them one at a time")
+        return results, list(files.values())
+
+    try:
+        logger.info(f"Sending packed conversion request to LLM for {len(specs)} endpoints: {', '.join(specs)}")
+        async with client.messages.stream(
+            model=MODEL,
+            max_tokens=MAX_TOKENS,
+            system=build_system_blocks(),
+            messages=[{"role": "user", "content": build_packed_user_prompt(specs, requirement_sections)}]
+        ) as stream:
+            chunks = []
+            async for text in stream.text_stream:
+                for record in telemetry.values():
+                    mark_first_token(record)
+                chunks.append(text)
+            final_message = await stream.get_final_message()
+            backend = getattr(stream, "backend_name", None)
+            model = getattr(stream, "model", MODEL)
+    except Exception as e:
+        logger.error(f"Packed request for {len(specs)} endpoints failed, generating them one at a time: {e}")
+        return results, list(files.values())
+
+    started = time.perf_counter()
+    response = validate_and_clean_json("".join(chunks))
+    parse_seconds = time.perf_counter() - started
+    if final_message.stop_reason == "max_tokens" or not isinstance(response, dict):
+        logger.warning(f"Packed response for {len(specs)} endpoints could not be split "
+                       f"(stop reason {final_message.stop_reason}), generating them one at a time")
+        return results, list(files.values())
+
+    usage = split_usage(usage_summary(final_message.usage),
+                        {name: estimate_tokens(compact_json(data)) for name, data in specs.items()})
+    unpacked = []
+    for name, file in files.items():
+        collection = response.get(name)
+        if not is_collection(collection):
+            logger.warning(f"Packed response has no valid collection for {name}, generating it on its own")
+            unpacked.append(file)
+            continue
+        record = telemetry[name]
+        # The request is counted once, on the first endpoint split from the response
+        record.update(requests=int(not any(r["telemetry"]["requests"] for r in results.values())),
+                      parse_seconds=parse_seconds / len(files),
+                      backend=backend, model=model, pack_size=len(files))
+        result = save_generated_collection(collection, file, keys[name], cache_mode, usage[name])
+        results[file] = finish_endpoint_telemetry(record, result, MODEL)
+    return results, unpacked
@@ -1,9 +1,19 @@
 import json 
 import yaml
+import hashlib
 import logging
+import os
+import time
 from dotenv import load_dotenv
 from input_data.req_doc import REQUIREMENTS_SPEC_DOC
-from utils import validate_and_clean_json
+from utils import validate_and_clean_json, repair_truncated_json
+from stream_parser import IncrementalCollectionParser, MalformedStreamError
+from spec_compactor import compact_mini_spec, compact_json, estimate_tokens
+from edge_case_generator import generate_edge_case_items, merge_generated_items
+from telemetry import start_endpoint_telemetry, mark_first_token, finish_endpoint_telemetry, count_requests
+from reference_resolver import endpoint_filename
+from rate_limiter import is_retryable_error, retry_after_seconds
+from requirements_index import build_requirements_index
 from pathlib import Path
 
 # Configure logging
@@ -18,8 +28,8 @@ system_prompt="""
     maximum test coverage of the endpoint. 
     
     You are provided with an OpenAPI 3.x specification that outlines the structure of one 
-    endpoint in the API, and a Requirements Document that outlines any changes across the entire API
-    from the user.
+    endpoint in the API, and the user's Requirements Document that outlines changes to the API, 
+    which may only contain the sections that could apply to this endpoint.
 
     You must perform the following instructions:
     1. Understand the API endpoint structure using the OpenAPI specification (its inputs and ouputs)
@@ -62,6 +72,64 @@ system_prompt="""
     Present the collection in valid and complete JSON that can be imported directly into Postman. 
 """
 
+# Used instead of system_prompt when the mechanical enum/edge case tests are generated locally
+requirements_focused_prompt="""
+    You are an expert API tester tasked with creating a Postman Collection (v2.1.0) based on the 
+    user's input. Your task is to understand an API endpoint using the OpenAPI 3.x specification and 
+    Requirements Document provided by the user and then generate the Postman Collection tests that 
+    need an understanding of the endpoint. 
+    
+    You are provided with an OpenAPI 3.x specification that outlines the structure of one 
+    endpoint in the API, and the user's Requirements Document that outlines changes to the API, 
+    which may only contain the sections that could apply to this endpoint.
+
+    The following tests are generated separately for every parameter in the OpenAPI specification 
+    and will be added to your collection, do NOT generate them: one test per enum value, and the 
+    empty, null, special character, whitespace, negative, decimal, maximum + 1, minimum - 1, invalid 
+    format, invalid boolean/enum value and empty array/object tests.
+
+    You must perform the following instructions:
+    1. Understand the API endpoint structure using the OpenAPI specification (its inputs and ouputs)
+    2. Determine whether any of the changes in the Requirement Document are related to this endpoint,
+       if they are, update your understanding of the API endpoint structure to reflect these changes 
+    3. Generate positive test cases for the endpoint in a folder named "Positive Tests":
+        - There must be one test that uses all parameters at once, including parameters added by 
+          the Requirements Document 
+        - For every parameter value that causes disambiguation, there must be a test that checks 
+          for a 300 status 
+        - Tests for behaviour described in the parameter descriptions or the Requirements Document 
+    4. Generate edge test cases in a folder named "Edge Tests" for behaviour described in the 
+       parameter descriptions or the Requirements Document (e.g. combinations of parameters). 
+    5. For every parameter that is added or changed by the Requirements Document, also generate all of 
+       the following tests, because they are not generated separately:
+        - For every enum parameter, one positive test case for every enum value 
+        - A test case where it is empty and one where it is null
+        - For string parameters, one test with special/unicode characters and escape sequences, and 
+          one test where the string is only multiple whitespaces 
+        - For integer parameters, tests with negative values, decimals, the maximum value + 1, and 
+          the minimum value - 1 
+        - For email, date, URL or UUID parameters, a test with an invalid format 
+        - For boolean and enum parameters, a test where it is an invalid value 
+        - For array, object, and collection parameters, a test where it is empty 
+    6. For every test there must be a test script that checks the response status: 300 if the values 
+       cause disambiguation, 200 if the request should pass, and both 400 and 404 if it should fail. 
+    7. Present these test cases in a Postman collection. The output should only be the raw JSON 
+       of the Postman collection. No explanations, markdown formatting or additional text. 
+    
+    <note>
+        - Carefully read parameter descriptions in the OpenAPI specification and Requirements 
+          document. If a parameter description mentions that certain values will "cause disambiguation"
+          the test cases that have those values should expect a 300 status code response. 
+        - For path parameters (parameters that are part of the URL path), use realistic example 
+          values instead of variables. 
+        - The url is provided as a variable called base_url and api_key is provided as a variable
+          called app_key in Postman that can be used when generating the collection. 
+        - No other variables are provided.  
+    </note>
+
+    Present the collection in valid and complete JSON that can be imported directly into Postman. 
+"""
+
 def save_postman_collection_to_file(collection_json, filename) -> str:
     """
     Saves the Postman collection JSON to a file in the current directory.
@@ -74,6 +142,7 @@ def save_postman_collection_to_file(collection_json, filename) -> str:
         str: The file path where the collection was saved
     """
 
+    Path("./output_data").mkdir(exist_ok=True)
     output_filename = "./output_data/" + Path(filename).stem + "_collection.json"
     
     # Save the collection to file
@@ -83,84 +152,515 @@ def save_postman_collection_to_file(collection_json, filename) -> str:
     return output_filename
 
 
-def generate_postman_collection(client, filename):
-    # Read JSON spec for singular endpoint
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 30000
+# Continuation requests made when an endpoint's output is cut off at MAX_TOKENS
+MAX_CONTINUATIONS = 2
+
+
+# On-disk cache of validated collections, keyed on everything that determines the LLM output.
+# LLM_CACHE_MODE is "use" (read and write), "refresh" (ignore stored entries but overwrite them)
+# or "bypass" (neither read nor write).
+CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", "./.llm_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024
+CACHE_MODE = os.environ.get("LLM_CACHE_MODE", "use")
+
+# When enabled, the mechanical enum/edge case tests are generated by edge_case_generator and merged
+# into the collection, and the LLM only writes the tests that need the requirements or descriptions.
+LOCAL_EDGE_CASES = os.environ.get("LOCAL_EDGE_CASES", "1") == "1"
+GENERATION_PROMPT = requirements_focused_prompt if LOCAL_EDGE_CASES else system_prompt
+
+# Estimated token budget for an endpoint's spec in the prompt, larger specs are pruned to fit
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "4000"))
+
+# Write every endpoint's spec to endpoint_specs/ and its collection to output_data/. With
+# WRITE_INTERMEDIATE_FILES=0 they are only passed along in memory, from the resolver to
+# generation and from generation to the merger. Incremental runs always write them, because
+# the next run reuses the collections.
+WRITE_INTERMEDIATE_FILES = (os.environ.get("WRITE_INTERMEDIATE_FILES", "1") == "1"
+                            or os.environ.get("INCREMENTAL", "0") == "1")
+
+# Send each endpoint only the sections of the requirements document that apply to it (see
+# requirements_index.py), in its user prompt, instead of the whole document in the shared
+# system prompt. An endpoint no section applies to then has the same prompt, and cache key,
+# whatever else changes in the document.
+REQUIREMENTS_INDEX = os.environ.get("REQUIREMENTS_INDEX", "1") == "1"
+
+# Anthropic doesn't cache a prefix shorter than this many tokens (1024 for Sonnet and Opus, 2048 for
+# Haiku); a cache_control breakpoint on a shorter prefix is silently ignored
+MIN_CACHEABLE_TOKENS = int(os.environ.get("MIN_CACHEABLE_TOKENS", "1024"))
+# The Requirements Document sent in the cached system prompt, if any. With the requirements index
+# the instructions alone are close to MIN_CACHEABLE_TOKENS, so unless their (rough) estimate clears
+# it by a quarter the whole document is added to the prefix for reference, and every request can
+# still read it from the cache; each endpoint's user prompt still says which sections apply.
+SYSTEM_REQUIREMENTS_DOC = (REQUIREMENTS_SPEC_DOC
+                           if not REQUIREMENTS_INDEX or estimate_tokens(GENERATION_PROMPT) < 1.25 * MIN_CACHEABLE_TOKENS
+                           else None)
+
+# Mini-specs registered by register_endpoint_specs, keyed on the resolved path of their spec file
+_endpoint_specs = {}
+# Requirements sections matched to each endpoint by index_requirements, keyed on endpoint name
+_endpoint_requirements = {}
+
+
+def register_endpoint_specs(processed_endpoints, spec_dir="./endpoint_specs"):
+    """
+    Makes the mini-specs returned by process_all_endpoints available to load_endpoint_spec
+    under their spec file names, so they are not read back from spec_dir (or written at all).
+    Replaces any previously registered specs.
+    """
+    _endpoint_specs.clear()
+    for endpoint in processed_endpoints:
+        spec_file = Path(spec_dir) / endpoint_filename(endpoint['path'], endpoint['method'])
+        _endpoint_specs[str(spec_file.resolve())] = endpoint['spec']
+
+
+def index_requirements(processed_endpoints, requirements_doc=REQUIREMENTS_SPEC_DOC):
+    """
+    Matches the sections of the requirements document to the endpoints returned by
+    process_all_endpoints, for endpoint_requirement_sections. Replaces any previous index and
+    does nothing when REQUIREMENTS_INDEX is disabled.
+
+    Returns:
+        dict: Maps each endpoint name to the sections that apply to it
+    """
+    _endpoint_requirements.clear()
+    if not REQUIREMENTS_INDEX:
+        return {}
+    sections, matches = build_requirements_index(processed_endpoints, requirements_doc)
+    for name, indices in matches.items():
+        _endpoint_requirements[name] = [sections[i] for i in indices]
+    unaffected = sum(1 for indices in matches.values() if not indices)
+    print(f"Requirements index: {len(sections)} change sections, "
+          f"{len(matches) - unaffected} endpoints affected, {unaffected} unaffected")
+    return dict(_endpoint_requirements)
+
+
+def endpoint_requirement_sections(filename):
+    """
+    Requirements sections for an endpoint's user prompt, or None when the whole document is
+    in the shared system prompt instead (REQUIREMENTS_INDEX=0). An endpoint that wasn't
+    indexed gets the whole document.
+    """
+    if not REQUIREMENTS_INDEX:
+        return None
+    return _endpoint_requirements.get(Path(filename).stem, [REQUIREMENTS_SPEC_DOC])
+
+
+def load_endpoint_spec(filename):
+    """Read JSON spec for singular endpoint, from memory when it was registered"""
+    spec = _endpoint_specs.get(str(Path(filename).resolve()))
+    if spec is not None:
+        return spec
     with open(filename, 'r') as f:
-        data = json.load(f)
+        return json.load(f)
+
+
+def load_prompt_spec(filename, token_budget=PROMPT_TOKEN_BUDGET):
+    """Read an endpoint's spec and compact it to the form sent in the prompt"""
+    return compact_mini_spec(load_endpoint_spec(filename), token_budget)
 
-    # Convert to JSON string
-    OPENAPI_SPEC_DOC = json.dumps(data, indent=2)
 
-    user_prompt=f"""
+def build_system_blocks(requirements_doc=SYSTEM_REQUIREMENTS_DOC, system=GENERATION_PROMPT,
+                        requirements_index=REQUIREMENTS_INDEX):
+    """
+    Builds the system content shared by every endpoint: the instructions followed by the
+    Requirements Document, if it is sent there (see SYSTEM_REQUIREMENTS_DOC). The final block
+    carries a cache_control breakpoint, so the whole shared prefix is written to the provider's
+    prompt cache on the first request and read from it by every later endpoint in the run.
+    """
+    if requirements_doc is None:
+        return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+    heading = "Requirements Document :"
+    if requirements_index:
+        heading = ("Requirements Document, for reference only. Only the sections given with an endpoint "
+                   "apply to it :")
+    return [
+        {"type": "text", "text": system},
+        {
+            "type": "text",
+            "text": f"{heading}\n{requirements_doc}",
+            "cache_control": {"type": "ephemeral"}
+        }
+    ]
+
+
+def build_requirements_prompt(requirement_sections):
+    """The part of a user prompt giving the requirements sections that apply to its endpoints"""
+    if requirement_sections is None:
+        return ""
+    text = "\n\n".join(requirement_sections) or "None of the changes in the Requirements Document apply."
+    return f"""
+    Requirements Document (only the sections that apply) :
+    {text}
+    """
+
+
+def build_user_prompt(data, requirement_sections=None):
+    """
+    Builds the per-endpoint user prompt, which only contains the endpoint's mini-spec (and the
+    requirements sections that apply to it, when they aren't in the system prompt) so that it
+    comes after the cached shared prefix.
+    """
+    # Convert to JSON string, without whitespace to save tokens
+    OPENAPI_SPEC_DOC = compact_json(data)
+
+    return f"""{build_requirements_prompt(requirement_sections)}
     OpenAPI specification :
     {OPENAPI_SPEC_DOC}
-    Requirements Document :
-    {REQUIREMENTS_SPEC_DOC}
     """
 
+
+def usage_summary(usage):
+    """Token counts from an Anthropic usage object, including prompt cache reads and writes"""
+    if usage is None:
+        return {}
+    if isinstance(usage, dict):
+        return usage
+    return {
+        "input_tokens": usage.input_tokens or 0,
+        "output_tokens": usage.output_tokens or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0
+    }
+
+
+def collection_cache_key(data, requirement_sections=None, requirements_doc=SYSTEM_REQUIREMENTS_DOC,
+                         system=GENERATION_PROMPT, model=MODEL, max_tokens=MAX_TOKENS):
+    """
+    Content hash of every input that determines the generated collection: the requirements
+    sections sent with the endpoint and the document sent in the system prompt, if any.
+    """
+    payload = json.dumps(
+        [data, requirement_sections, requirements_doc, system, model, max_tokens],
+        sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_cached_collection(key, cache_dir=CACHE_DIR):
+    """
+    Returns the cached collection for key, or None on a miss. A hit refreshes the entry's
+    mtime so that eviction is least-recently-used.
+    """
+    path = Path(cache_dir) / f"{key}.json"
     try:
-        logger.info("Sending conversion request to LLM...")
-        # response = client.chat.completions.create(
-        #     model="gpt-4o",
-        #     messages=[
-        #         {"role": "system", "content": system_prompt},
-        #         {"role": "user", "content": user_prompt}
-        #     ],
-        #     max_tokens=16384,  # Adjust based on your spec size
-        #     response_format={"type": "json_object"}  # Ensures JSON output
-        # )
-        # Access the response content correctly
-        # raw_text = response.choices[0].message.content
-
-        # # Validate that the model returned valid JSON
-        # postman_collection_json = json.loads(raw_text)
-
-        #Correct way to send a message to Claude
-        with client.messages.stream(
-            model="claude-sonnet-4-20250514",  # or use "claude-sonnet-4-20250514" for Claude Sonnet 4
-            max_tokens=30000,
-            system=system_prompt,  # System prompt goes here, not in messages
-            messages=[
-                {"role": "user", "content": user_prompt}
-            ]
-        ) as stream: 
-            response_text = ""
-            char_count = 0
-            
-            # Stream the response
-            for text in stream.text_stream:
-                response_text += text
-                char_count += len(text)
-                
-                # Show progress every 5000 characters
-                if char_count % 5000 == 0:
-                    logger.info(f"Generated {char_count} characters...")
-            
-            logger.info(f"Streaming completed. Total characters: {len(response_text)}")
-            
-            # Validate and clean the JSON response
-            postman_collection_json = validate_and_clean_json(response_text)
-            
-            if postman_collection_json is None:
-                return {
-                    "status": "error", 
-                    "message": "Failed to parse JSON response from Claude"
-                }
-
-        logger.info("Successfully converted spec to Postman collection with LLM.")
-
-        # Save the result to the directory 
-        save_postman_collection_to_file(postman_collection_json, filename)
-        
+        with open(path, 'r', encoding='utf-8') as f:
+            collection = json.load(f)
+        os.utime(path)
+        return collection
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def store_cached_collection(key, collection, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Stores a validated collection under key, then evicts least-recently-used entries
+    until the cache fits within max_bytes.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{key}.json"
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(collection, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    evict_cache(cache_dir, max_bytes)
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Delete the least recently used cache entries until the cache is within max_bytes"""
+    entries = []
+    for entry in Path(cache_dir).glob('*.json'):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        try:
+            entry.unlink()
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def cached_result(key, filename, cache_mode):
+    """
+    Saves and returns a success result if the collection for key is cached, otherwise None.
+    """
+    if cache_mode != "use":
+        return None
+    collection = load_cached_collection(key)
+    if collection is None:
+        return None
+
+    logger.info(f"Cache hit for {Path(filename).stem}, skipping LLM call.")
+    collection = add_local_edge_cases(collection, filename)
+    output_filename = save_postman_collection_to_file(collection, filename) if WRITE_INTERMEDIATE_FILES else None
+    return {
+        "status": "success",
+        "message": "Loaded from cache.",
+        "output_file": output_filename,
+        "collection": collection,
+        "cached": True,
+        "item_count": count_requests(collection)
+    }
+
+
+def add_local_edge_cases(collection, filename):
+    """
+    Merges the locally generated enum and edge case tests for the endpoint spec in filename into
+    an LLM-generated collection. Does nothing when LOCAL_EDGE_CASES is disabled.
+    """
+    if not LOCAL_EDGE_CASES or not isinstance(collection, dict):
+        return collection
+    positive_items, edge_items = generate_edge_case_items(load_endpoint_spec(filename))
+    logger.info(f"Adding {len(positive_items)} positive and {len(edge_items)} edge tests generated locally "
+                f"for {Path(filename).stem}")
+    return merge_generated_items(collection, positive_items, edge_items)
+
+
+def add_usage(total, usage):
+    """Add the token counts of another request (e.g. a continuation) to a usage summary"""
+    usage = usage_summary(usage)
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in usage.keys() | total.keys()}
+
+
+def build_messages(user_prompt, prefix=""):
+    """
+    Messages for a generation request. When continuing a truncated response, prefix is the
+    collection so far (cut back to its last complete item) and is sent as the start of the
+    assistant's turn, so the model resumes writing from exactly that point.
+    """
+    messages = [{"role": "user", "content": user_prompt}]
+    if prefix:
+        messages.append({"role": "assistant", "content": prefix})
+    return messages
+
+
+def partial_items_filename(filename):
+    """File that completed collection items are appended to while an endpoint is streaming"""
+    return "./output_data/" + Path(filename).stem + "_collection.partial.jsonl"
+
+
+def start_collection_parser(filename, prefix=""):
+    """
+    Creates an incremental parser for a streamed collection that appends each completed
+    request, with the names of the folders it is in, to the endpoint's partial items file as
+    soon as it closes. A continuation prefix is fed to the parser first so the continuation's
+    text is parsed as part of the same document.
+
+    Returns:
+        tuple: (parser, open partial items file)
+    """
+    Path("./output_data").mkdir(exist_ok=True)
+    partial_file = open(partial_items_filename(filename), 'w', encoding='utf-8')
+
+    def write_request(item, folders):
+        partial_file.write(json.dumps({"folders": folders, "item": item}, separators=(',', ':')) + "\n")
+        partial_file.flush()
+
+    parser = IncrementalCollectionParser(on_request=write_request)
+    if prefix:
+        parser.feed(prefix)
+    return parser, partial_file
+
+
+def finalise_collection(response_text, filename, cache_key=None, cache_mode=CACHE_MODE, usage=None,
+                        telemetry=None):
+    """
+    Validates a complete response text and saves the collection, returning the status dict.
+    Time spent validating is added to telemetry["parse_seconds"] when a record is given.
+    """
+    logger.info(f"Streaming completed. Total characters: {len(response_text)}")
+
+    # Validate and clean the JSON response
+    started = time.perf_counter()
+    postman_collection_json = validate_and_clean_json(response_text)
+    if telemetry is not None:
+        telemetry["parse_seconds"] += time.perf_counter() - started
+    return save_generated_collection(postman_collection_json, filename, cache_key, cache_mode, usage)
+
+
+def truncated_result(result, filename):
+    """Marks the status dict of a collection saved up to its last complete item as truncated"""
+    if result["status"] == "success":
+        logger.warning(f"Saved truncated collection for {Path(filename).stem} up to its last complete item")
+        result["message"] = "Output was truncated, saved up to the last complete item."
+        result["truncated"] = True
+    return result
+
+
+def finalise_truncated_collection(response_text, filename, cache_mode=CACHE_MODE, usage=None, telemetry=None):
+    """
+    Saves a complete response that stopped at max_tokens up to its last complete item,
+    returning the status dict. It is not cached, so the endpoint is generated again next run.
+    """
+    started = time.perf_counter()
+    collection = repair_truncated_json(response_text)
+    if telemetry is not None:
+        telemetry["parse_seconds"] += time.perf_counter() - started
+    return truncated_result(save_generated_collection(collection, filename, None, cache_mode, usage), filename)
+
+
+def finalise_streamed_collection(parser, partial_file, filename, cache_key=None, cache_mode=CACHE_MODE,
+                                 usage=None, telemetry=None, stop_reason="end_turn"):
+    """
+    Builds the collection from an incremental parser and saves it, returning the status dict.
+    A collection that is still incomplete after stopping at max_tokens (every continuation
+    used) is saved up to its last complete item. One that ended incomplete for any other
+    reason (e.g. the connection dropped) is a retryable error instead, so it's generated again.
+    The partial items file is removed once the full collection has been saved. Time spent
+    building or repairing the collection is added to telemetry["parse_seconds"].
+    """
+    partial_file.close()
+    logger.info(f"Streaming completed. Total characters: {parser.char_count}")
+    if not parser.complete and stop_reason != "max_tokens":
+        message = (f"Stream for {Path(filename).stem} ended with stop reason {stop_reason} before the "
+                   f"collection was complete ({parser.char_count} characters)")
+        logger.error(message)
+        return {"status": "error", "message": message, "retryable": True, "usage": usage_summary(usage)}
+
+    started = time.perf_counter()
+    if parser.complete:
+        collection = parser.finish()
+    else:
+        # Still truncated after every continuation, keep what completed but don't cache it
+        collection = repair_truncated_json(parser.received_text())
+        cache_key = None
+    if telemetry is not None:
+        telemetry["parse_seconds"] += time.perf_counter() - started
+
+    result = save_generated_collection(collection, filename, cache_key, cache_mode, usage)
+    if not parser.complete:
+        result = truncated_result(result, filename)
+    if result["status"] == "success":
+        Path(partial_file.name).unlink(missing_ok=True)
+    return result
+
+
+def save_generated_collection(postman_collection_json, filename, cache_key=None, cache_mode=CACHE_MODE,
+                              usage=None):
+    """
+    Caches and saves a validated collection, returning the status dict.
+    """
+    usage = usage_summary(usage)
+    if usage:
+        logger.info(
+            f"Tokens for {Path(filename).stem}: {usage['input_tokens']} input, "
+            f"{usage['cache_read_input_tokens']} cache read, "
+            f"{usage['cache_creation_input_tokens']} cache write, {usage['output_tokens']} output"
+        )
+
+    if postman_collection_json is None:
         return {
-            "status": "success",
-            "message": "Conversion successful."
+            "status": "error",
+            "message": "Failed to parse JSON response from Claude",
+            "usage": usage
         }
-    
-    except Exception as e:
-        message = f"An unexpected error occurred during OpenAI API call: {e}"
-        logger.error(message)
-        return {"status": "error", "message": message}
 
+    logger.info("Successfully converted spec to Postman collection with LLM.")
 
+    # Only the LLM output is cached, the local tests are regenerated from the spec on a cache hit
+    if cache_key is not None and cache_mode != "bypass":
+        store_cached_collection(cache_key, postman_collection_json)
 
+    # Save the result to the directory
+    postman_collection_json = add_local_edge_cases(postman_collection_json, filename)
+    output_filename = None
+    if WRITE_INTERMEDIATE_FILES:
+        output_filename = save_postman_collection_to_file(postman_collection_json, filename)
+
+    return {
+        "status": "success",
+        "message": "Conversion successful.",
+        "output_file": output_filename,
+        "collection": postman_collection_json,
+        "usage": usage,
+        "item_count": count_requests(postman_collection_json)
+    }
+
+
+def malformed_stream_result(filename, error):
+    """Status dict for a stream that was stopped early because its output could not be parsed"""
+    message = f"Stopped streaming {Path(filename).stem} early, output is not a valid collection: {error}"
+    logger.error(message)
+    return {"status": "error", "message": message}
+
+
+def api_error_result(message, error):
+    """Status dict for a failed API call, saying whether it's worth retrying and after how long"""
+    return {"status": "error", "message": message, "retryable": is_retryable_error(error),
+            "retry_after": retry_after_seconds(error)}
+
+
+async def generate_postman_collection_async(client, filename, cache_mode=CACHE_MODE):
+    """
+    Generates the collection of one endpoint spec with anthropic.AsyncAnthropic (or a ClientPool),
+    so several endpoints can be generated concurrently on one event loop.
+    """
+    telemetry = start_endpoint_telemetry(filename)
+    data = load_prompt_spec(filename)
+    requirement_sections = endpoint_requirement_sections(filename)
+    key = collection_cache_key(data, requirement_sections)
+    result = cached_result(key, filename, cache_mode)
+    if result is not None:
+        return finish_endpoint_telemetry(telemetry, result, MODEL)
+
+    user_prompt = build_user_prompt(data, requirement_sections)
+
+    partial_file = None
+    usage = {}
+    try:
+        logger.info(f"Sending conversion request to LLM for {Path(filename).stem}...")
+        prefix = ""
+        for attempt in range(MAX_CONTINUATIONS + 1):
+            async with client.messages.stream(
+                model=MODEL,
+                max_tokens=MAX_TOKENS,
+                system=build_system_blocks(),
+                messages=build_messages(user_prompt, prefix)
+            ) as stream:
+                telemetry["requests"] += 1
+                parser, partial_file = start_collection_parser(filename, prefix)
+                try:
+                    async for text in stream.text_stream:
+                        mark_first_token(telemetry)
+                        started = time.perf_counter()
+                        parser.feed(text)
+                        telemetry["parse_seconds"] += time.perf_counter() - started
+                except MalformedStreamError as e:
+                    return finish_endpoint_telemetry(telemetry, malformed_stream_result(filename, e), MODEL)
+
+                final_message = await stream.get_final_message()
+                # A ClientPool stream names the backend and model that served it
+                telemetry["backend"] = getattr(stream, "backend_name", None)
+                telemetry["model"] = getattr(stream, "model", MODEL)
+
+            usage = add_usage(usage, final_message.usage)
+            if final_message.stop_reason != "max_tokens" or parser.complete or attempt == MAX_CONTINUATIONS:
+                break
+            partial_file.close()
+            telemetry["continuations"] += 1
+            prefix = parser.continuation_prefix()
+            logger.warning(f"{Path(filename).stem} hit max_tokens, continuing from its last complete item "
+                           f"({len(prefix)} characters)")
+
+        result = finalise_streamed_collection(parser, partial_file, filename, key, cache_mode, usage, telemetry,
+                                              final_message.stop_reason)
+        return finish_endpoint_telemetry(telemetry, result, MODEL)
+
+    except Exception as e:
+        message = f"An unexpected error occurred during Anthropic API call for {filename}: {e}"
+        logger.error(message)
+        # Tokens of any requests that completed before the error are still billed
+        return finish_endpoint_telemetry(telemetry, dict(api_error_result(message, e), usage=usage), MODEL)
+    finally:
+        # Closing twice is harmless; this covers errors raised part way through a stream
+        if partial_file is not None:
+            partial_file.close()
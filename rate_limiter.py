@@ -0,0 +1,204 @@
+"""
+Client-side rate limiting for LLM requests. A RateLimiter keeps a token bucket for each
+limit the API enforces: requests, input tokens and output tokens per minute. Each request
+is admitted on its estimated size before it is sent. The rate limit headers of every
+response then correct the buckets to the limits and remaining capacity the API reports.
+This keeps generation close to the limits without tripping them.
+
+Requests that still fail with a retryable error (rate limited, overloaded, server or
+connection error) are retried after a jittered exponential backoff, or after the
+retry-after the API asked for if that is longer (see backoff_delay).
+"""
+import os
+import time
+import random
+import anthropic
+import openai
+
+# Retries of an endpoint after a retryable API error before it is reported as failed
+MAX_RETRIES = int(os.environ.get("MAX_RETRIES", "4"))
+# Backoff before retry n is drawn uniformly from 0 to RETRY_BASE_SECONDS * 2**n, capped at RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = float(os.environ.get("RETRY_BASE_SECONDS", "2"))
+RETRY_MAX_SECONDS = float(os.environ.get("RETRY_MAX_SECONDS", "60"))
+# Output tokens a response is assumed to use until actual responses have been seen
+EXPECTED_OUTPUT_TOKENS = int(os.environ.get("EXPECTED_OUTPUT_TOKENS", "4000"))
+
+# Status codes that mean the API is busy rather than that the request is wrong
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504, 529)
+# Error types of an error event in the middle of a stream, which arrives with status 200
+RETRY_ERROR_TYPES = ("rate_limit_error", "overloaded_error", "api_error")
+
+# (limit, remaining) header pairs per bucket, Anthropic's first. OpenAI has a single limit
+# for input and output tokens together, which is tracked as the input token limit.
+RATE_LIMIT_HEADERS = {
+    "requests": [("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining"),
+                 ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests")],
+    "input_tokens": [("anthropic-ratelimit-input-tokens-limit", "anthropic-ratelimit-input-tokens-remaining"),
+                     ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens")],
+    "output_tokens": [("anthropic-ratelimit-output-tokens-limit", "anthropic-ratelimit-output-tokens-remaining")],
+}
+
+
+def is_retryable_error(error):
+    """Whether an API error means the same request may succeed later or on another backend"""
+    if isinstance(error, (anthropic.APIConnectionError, openai.APIConnectionError)):
+        return True
+    if getattr(error, "status_code", None) in RETRY_STATUSES:
+        return True
+    body = getattr(error, "body", None)
+    details = body.get("error") if isinstance(body, dict) else None
+    return isinstance(details, dict) and details.get("type") in RETRY_ERROR_TYPES
+
+
+def retry_after_seconds(error):
+    """The retry-after header of an API error response, if it has one"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def error_headers(error):
+    """Headers of the response an API error came with, if any"""
+    return getattr(getattr(error, "response", None), "headers", None)
+
+
+def stream_headers(stream):
+    """Response headers of an open stream. Anthropic's stream keeps its HTTP response on the raw stream."""
+    if hasattr(stream, "headers"):
+        return stream.headers
+    return getattr(getattr(getattr(stream, "_raw_stream", None), "response", None), "headers", None)
+
+
+def backoff_delay(attempt, retry_after=None, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS, rng=random):
+    """
+    Seconds to wait before retry number attempt + 1: a random time up to base * 2**attempt
+    (capped at cap), so requests that failed together don't all retry together, but never
+    less than the retry-after the API asked for.
+    """
+    return max(rng.uniform(0, min(cap, base * 2 ** attempt)), retry_after or 0.0)
+
+
+def header_number(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Per minute budget that refills continuously and can be overdrawn by actual usage. A bucket
+    created without a limit doesn't throttle until set_limit gives it one.
+    """
+
+    def __init__(self, per_minute=None):
+        self.capacity = float(per_minute) if per_minute else None
+        self.rate = self.capacity / 60.0 if self.capacity else None
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        if self.capacity is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        self.refill()
+        return self.tokens if self.capacity is not None else float('inf')
+
+    def consume(self, tokens):
+        self.refill()
+        if self.capacity is not None:
+            self.tokens -= tokens
+
+    def release(self, tokens):
+        """Give back tokens consumed for a request that was never served"""
+        self.refill()
+        if self.capacity is not None:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def seconds_until(self, tokens):
+        """Seconds until tokens are available; a request larger than the bucket waits for a full bucket"""
+        if self.capacity is None:
+            return 0.0
+        missing = min(tokens, self.capacity) - self.available()
+        return max(0.0, missing / self.rate) if self.rate else float('inf')
+
+    def set_limit(self, limit, remaining):
+        """
+        Adopt the limit and remaining capacity the API reported. Remaining only ever lowers the
+        bucket, since requests admitted after the reported one aren't counted in it yet.
+        """
+        self.refill()
+        if limit:
+            if self.capacity is None:
+                self.tokens = limit
+            self.capacity = limit
+            self.rate = limit / 60.0
+        if self.capacity is not None:
+            self.tokens = min(self.tokens, remaining, self.capacity)
+
+
+class RateLimiter:
+    """
+    Requests, input tokens and output tokens per minute for one API key. A limit given as
+    None isn't enforced until a response's rate limit headers report it.
+    """
+
+    def __init__(self, requests_per_minute=None, input_tokens_per_minute=None, output_tokens_per_minute=None):
+        self.buckets = {
+            "requests": TokenBucket(requests_per_minute),
+            "input_tokens": TokenBucket(input_tokens_per_minute),
+            "output_tokens": TokenBucket(output_tokens_per_minute),
+        }
+        self.output_estimate = float(EXPECTED_OUTPUT_TOKENS)
+
+    def cost(self, input_tokens):
+        """What admitting a request with this many input tokens charges to each bucket"""
+        return {"requests": 1, "input_tokens": input_tokens, "output_tokens": self.output_estimate}
+
+    def seconds_until(self, cost):
+        return max(self.buckets[name].seconds_until(amount) for name, amount in cost.items())
+
+    def headroom(self):
+        """Free share of the fullest bucket, 1.0 when nothing has been used"""
+        return min(bucket.available() / bucket.capacity if bucket.capacity else 1.0
+                   for bucket in self.buckets.values())
+
+    def admit(self, cost):
+        for name, amount in cost.items():
+            self.buckets[name].consume(amount)
+
+    def release(self, cost):
+        """
+        Give back the tokens admitted for a request that failed before it was served. The
+        request itself stays counted, since the API counts failed requests too.
+        """
+        self.buckets["input_tokens"].release(cost["input_tokens"])
+        self.buckets["output_tokens"].release(cost["output_tokens"])
+
+    def settle(self, cost, input_tokens, output_tokens):
+        """Charge the difference between an admitted request's estimate and its actual usage"""
+        self.buckets["input_tokens"].consume(input_tokens - cost["input_tokens"])
+        self.buckets["output_tokens"].consume(output_tokens - cost["output_tokens"])
+        # Later requests are estimated from a moving average of actual response sizes
+        self.output_estimate = 0.8 * self.output_estimate + 0.2 * output_tokens
+
+    def update_from_headers(self, headers):
+        """Correct each bucket to the limit and remaining capacity in a response's rate limit headers"""
+        if not headers:
+            return
+        for name, pairs in RATE_LIMIT_HEADERS.items():
+            for limit_header, remaining_header in pairs:
+                remaining = header_number(headers, remaining_header)
+                if remaining is not None:
+                    self.buckets[name].set_limit(header_number(headers, limit_header), remaining)
+                    break
+
+    def limits(self):
+        """Current per minute limit of each bucket, None while it isn't known"""
+        return {name: int(bucket.capacity) if bucket.capacity is not None else None
+                for name, bucket in self.buckets.items()}
@@ -1,165 +1,489 @@
 import os
-import yaml
 import json
+import time
+import multiprocessing
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 from openai import OpenAI
 from dotenv import load_dotenv
+from spec_loader import load_spec
 
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
+HTTP_METHODS = ('get', 'put', 'post', 'delete', 'options', 'head', 'patch', 'trace')
 
-def find_all_refs(obj):
-    """Recursively find all $ref values in the object"""
-    refs = set()
+# Component sections that can be shared between endpoints through $ref
+COMPONENT_SECTIONS = (
+    'schemas', 'parameters', 'responses', 'requestBodies', 'headers',
+    'examples', 'links', 'callbacks', 'securitySchemes'
+)
 
-    if isinstance(obj, dict):
-        for key, value in obj.items():
-            if key == '$ref' and isinstance(value, str):
-                # Extract schema name from "#/components/schemas/SchemaName"
-                if value.startswith('#/components/schemas/'):
-                    schema_name = value.replace('#/components/schemas/', '')
-                    refs.add(schema_name)
-            else:
-                refs.update(find_all_refs(value))
-    elif isinstance(obj, list):
-        for item in obj:
-            refs.update(find_all_refs(item))
-    
+# Component section an external $ref is bundled into, based on where the $ref appears
+SECTION_FOR_KEY = {
+    'parameters': 'parameters',
+    'responses': 'responses',
+    'requestBody': 'requestBodies',
+    'requestBodies': 'requestBodies',
+    'securitySchemes': 'securitySchemes',
+    'headers': 'headers',
+    'examples': 'examples',
+    'links': 'links',
+    'callbacks': 'callbacks'
+}
+
+# Parsed external files, so each file referenced by a spec is only loaded once
+_parsed_file_cache = {}
+
+# Worker processes used to split a spec into endpoint files. Specs with fewer than
+# PARALLEL_SPLIT_MIN_OPERATIONS operations are split in this process, where starting
+# workers would cost more than it saves.
+SPLIT_WORKERS = int(os.environ.get("SPLIT_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_SPLIT_MIN_OPERATIONS = int(os.environ.get("PARALLEL_SPLIT_MIN_OPERATIONS", "200"))
+
+# The bundled spec and its component index in a split worker process, set once per worker
+_worker_spec = None
+_worker_component_index = None
+
+
+def iter_operations(spec):
+    """Yield (path, method) for every operation in the spec, skipping path-level keys"""
+    for endpoint_path, path_item in spec['paths'].items():
+        for method in path_item:
+            if method.lower() in HTTP_METHODS:
+                yield endpoint_path, method
+
+
+def unescape_pointer_token(token):
+    """Decode a JSON pointer token (~1 is '/', ~0 is '~')"""
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def escape_pointer_token(token):
+    """Encode a JSON pointer token"""
+    return token.replace('~', '~0').replace('/', '~1')
+
+
+def parse_component_ref(ref):
+    """
+    Split a local component reference such as "#/components/parameters/Foo" into
+    (section, name), or return None for any other kind of reference.
+    """
+    if not ref.startswith('#/components/'):
+        return None
+    parts = ref[len('#/components/'):].split('/', 1)
+    if len(parts) != 2:
+        return None
+    return parts[0], unescape_pointer_token(parts[1])
+
+
+def find_ref_values(obj):
+    """Recursively find every $ref string in the object, in a single walk"""
+    refs = set()
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            for key, value in current.items():
+                if key == '$ref' and isinstance(value, str):
+                    refs.add(value)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        else:
+            stack.extend(item for item in current if isinstance(item, (dict, list)))
     return refs
 
 
-def get_all_schema_dependencies(spec, initial_refs, visited=None, max_depth=10):
-    """Recursively find all schema dependencies"""
-    if visited is None:
-        visited = set()
-    
-    all_refs = set(initial_refs)
-    depth = 0
-    # Use a queue to process references level by level
-    to_process = list(initial_refs)
-    
-    while to_process and depth < max_depth:
-        current_level = to_process.copy()
-        to_process.clear()
-        for ref in current_level:
-            if ref in visited:
+def component_refs(ref_values):
+    """The local component references among $ref values, as (section, name) tuples"""
+    return {component for component in map(parse_component_ref, ref_values) if component is not None}
+
+
+def find_component_refs(obj):
+    """Recursively find all local component references as (section, name) tuples"""
+    return component_refs(find_ref_values(obj)) if isinstance(obj, (dict, list)) else set()
+
+
+def find_external_refs(obj):
+    """Recursively find all $ref values that point outside the document"""
+    if not isinstance(obj, (dict, list)):
+        return set()
+    return {ref for ref in find_ref_values(obj) if not ref.startswith('#')}
+
+
+def build_component_dependency_index(spec):
+    """
+    Build the transitive closure of references for every component in the spec's
+    components sections (schemas, parameters, responses, requestBodies, ...).
+
+    Strongly connected components (reference cycles) are found with an iterative Tarjan walk,
+    and each component's closure is computed once from the closures of the components it points
+    to, so the whole index costs one pass over the components with no depth limit. Each
+    (section, name) key maps to a frozenset of every component it reaches, including itself and
+    any referenced components that are missing from the spec.
+    """
+    components = spec.get('components', {}) or {}
+    edges = {}
+    for section in COMPONENT_SECTIONS:
+        for name, component in (components.get(section) or {}).items():
+            edges[(section, name)] = find_component_refs(component)
+
+    index_of = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    closures = {}
+    counter = 0
+
+    for root in edges:
+        if root in index_of:
+            continue
+        # Each frame is (node, iterator over its neighbours)
+        work = [(root, iter(edges[root]))]
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+
+        while work:
+            node, neighbours = work[-1]
+            advanced = False
+            for target in neighbours:
+                if target not in edges:
+                    continue  # Missing component, reported by the caller
+                if target not in index_of:
+                    index_of[target] = lowlink[target] = counter
+                    counter += 1
+                    stack.append(target)
+                    on_stack.add(target)
+                    work.append((target, iter(edges[target])))
+                    advanced = True
+                    break
+                if target in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[target])
+            if advanced:
                 continue
 
-            visited.add(ref)
-
-            # Check if the schema exists in the spec
-            if ref in spec.get('components', {}).get('schemas', {}):
-                schema = spec['components']['schemas'][ref]
-                nested_refs = find_all_refs(schema)
-                
-                # Add new references to the set and queue for processing
-                for nested_ref in nested_refs:
-                    if nested_ref not in visited and nested_ref not in all_refs:
-                        all_refs.add(nested_ref)
-                        to_process.append(nested_ref)
-            else:
-                print(f"Warning: Referenced schema '{ref}' not found in components/schemas")
-        
-        depth += 1
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+            if lowlink[node] == index_of[node]:
+                # node is the root of a strongly connected component; every component it
+                # points to has already been closed, because Tarjan emits sinks first
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    members.append(member)
+                    if member == node:
+                        break
+                closure = set(members)
+                for member in members:
+                    for target in edges[member]:
+                        if target in closures:
+                            closure |= closures[target]
+                        else:
+                            closure.add(target)
+                closure = frozenset(closure)
+                for member in members:
+                    closures[member] = closure
+
+    return closures
+
+
+def get_all_component_dependencies(spec, initial_refs, component_index=None):
+    """Find all component dependencies of initial_refs using the precomputed dependency index"""
+    if component_index is None:
+        component_index = build_component_dependency_index(spec)
+
+    all_refs = set(initial_refs)
+    for ref in initial_refs:
+        closure = component_index.get(ref)
+        if closure is None:
+            section, name = ref
+            print(f"Warning: Referenced component '{name}' not found in components/{section}")
+            continue
+        all_refs |= closure
     return all_refs
 
 
-def extract_endpoint_info(spec, endpoint_path, method):
+def extract_endpoint_info(spec, endpoint_path, method, component_index=None):
     """Extract a single endpoint with its dependencies"""
-    endpoint = spec['paths'][endpoint_path][method]
-    refs = find_all_refs(endpoint)
+    path_item = spec['paths'][endpoint_path]
+    endpoint = path_item[method]
+    mini_path_item = {method: endpoint}
+    # Parameters declared on the path apply to every operation under it
+    if 'parameters' in path_item:
+        mini_path_item['parameters'] = path_item['parameters']
+    refs = find_component_refs(mini_path_item)
     
-    # Need to recursively get all referenced schemas and their dependencies
-    all_refs = get_all_schema_dependencies(spec, refs)
+    # Look up all referenced components and their dependencies in the index
+    all_refs = get_all_component_dependencies(spec, refs, component_index)
     
-    # Build the mini spec with all required schemas
-    schemas_dict = {}
-    missing_schemas = []
+    # Build the mini spec with all required components
+    components = spec.get('components', {}) or {}
+    components_dict = {}
+    missing_components = []
     
-    for ref in all_refs:
-        if ref in spec.get('components', {}).get('schemas', {}):
-            schemas_dict[ref] = spec['components']['schemas'][ref]
+    for section, name in sorted(all_refs):
+        if name in (components.get(section) or {}):
+            components_dict.setdefault(section, {})[name] = components[section][name]
         else:
-            missing_schemas.append(ref)
+            missing_components.append(f"{section}/{name}")
     
-    if missing_schemas:
-        print(f"Warning: Missing schemas for {endpoint_path} {method}: {missing_schemas}")
+    if missing_components:
+        print(f"Warning: Missing components for {endpoint_path} {method}: {missing_components}")
+    
+    # Always include schemas so that existing consumers of the mini spec keep working
+    components_dict.setdefault('schemas', {})
     
     mini_spec = {
         'openapi': spec['openapi'],
         'info': spec['info'], 
-        'paths': {endpoint_path: {method: endpoint}},
-        'components': {
-            'schemas': schemas_dict
-        }
+        'paths': {endpoint_path: mini_path_item},
+        'components': components_dict
     }
     
     return mini_spec
 
-def validate_mini_spec(mini_spec, endpoint_path, method):
+def validate_mini_spec(mini_spec, endpoint_path, method, verbose=True):
     """Validate that all references in the mini spec can be resolved"""
-    all_refs = find_all_refs(mini_spec)
-    available_schemas = set(mini_spec.get('components', {}).get('schemas', {}).keys())
+    ref_values = find_ref_values(mini_spec)
+    all_refs = component_refs(ref_values)
+    components = mini_spec.get('components', {})
+    available = {
+        (section, name)
+        for section, entries in components.items() if isinstance(entries, dict)
+        for name in entries
+    }
     
-    missing_refs = all_refs - available_schemas
+    missing_refs = {f"{section}/{name}" for section, name in all_refs - available}
+    missing_refs |= {ref for ref in ref_values if not ref.startswith('#')}
     if missing_refs:
         print(f"ERROR: {method.upper()} {endpoint_path} has unresolved references: {missing_refs}")
         return False
     else:
-        print(f"SUCCESS: {method.upper()} {endpoint_path} - all references resolved")
+        if verbose:
+            print(f"SUCCESS: {method.upper()} {endpoint_path} - all references resolved")
         return True
 
-def save_endpoint_specs(processed_endpoints, output_dir="endpoint_specs"):
-    """Save each endpoint to a separate YAML file"""
-    
-    # Create output directory if it doesn't exist
-    Path(output_dir).mkdir(exist_ok=True)
-    
-    for endpoint_data in processed_endpoints:
-        path = endpoint_data['path']
-        method = endpoint_data['method']
-        spec = endpoint_data['spec']
-        is_valid = endpoint_data.get('is_valid', False)
-        
-        # Create safe filename from path and method
-        # Replace / with _ and remove any problematic characters
-        safe_path = path.replace('/', '_').replace('{', '').replace('}', '').strip('_')
-        filename = f"{method.lower()}_{safe_path}.json"
-        
-        # Handle edge cases for filename
-        if not safe_path:  # Root path "/"
-            filename = f"{method.lower()}_root.json"
-        
-        filepath = os.path.join(output_dir, filename)
-        
-        # Save to JSON file
-        with open(filepath, 'w') as f:
-            json.dump(spec, f, indent=2)
-        
-        status = "✓" if is_valid else "✗"
-        print(f"{status} Saved: {filepath}")
-
-
-def process_all_endpoints(spec):
-    """Process all endpoints in the spec"""
-    inlined_endpoints = []
+def load_ref_file(file_path):
+    """Load an external file referenced by a spec, parsing each file only once"""
+    file_path = str(Path(file_path).resolve())
+    if file_path not in _parsed_file_cache:
+        _parsed_file_cache[file_path] = load_spec(file_path)
+    return _parsed_file_cache[file_path]
+
+
+def resolve_json_pointer(document, fragment):
+    """Return the part of document addressed by a JSON pointer fragment such as /components/schemas/Foo"""
+    target = document
+    for token in fragment.strip('/').split('/') if fragment.strip('/') else []:
+        token = unescape_pointer_token(token)
+        if isinstance(target, list):
+            target = target[int(token)]
+        else:
+            target = target[token]
+    return target
+
+
+def bundle_external_refs(spec, base_dir='.', spec_file=None):
+    """
+    Copy every component referenced from external files (relative file refs such as
+    "common.yaml#/components/schemas/Error" or "./parameters/page.yaml") into the spec's own
+    components and rewrite the refs to point at them, so every endpoint can be resolved locally.
+
+    External files are parsed once through load_ref_file. Refs inside an external file are
+    resolved relative to that file, and name clashes between files get a file-based suffix.
+    spec_file is the path the spec was loaded from, so refs from external files back into it
+    (e.g. "../openapi.yaml#/components/schemas/Limit") point at its own components instead of
+    copying them; without it the spec is taken to be a file in base_dir that no ref names.
+    Returns the spec unchanged when it has no external refs.
+    """
+    if not find_external_refs(spec):
+        return spec
+
+    if spec_file is not None:
+        root_path = str(Path(spec_file).resolve())
+    else:
+        root_path = str((Path(base_dir) / '__root__').resolve())
+    bundled = {'components': {}}
+    # (document path, fragment) -> local ref, filled in before recursing so cycles terminate
+    local_refs = {}
+
+    def local_name(section, preferred, origin):
+        existing = bundled['components'].get(section, {})
+        root_existing = (spec.get('components', {}) or {}).get(section, {}) or {}
+        name = preferred
+        suffix = 1
+        while name in existing or name in root_existing:
+            name = f"{preferred}_{Path(origin).stem}" if suffix == 1 else f"{preferred}_{Path(origin).stem}_{suffix}"
+            suffix += 1
+        return name
+
+    def internalise(doc_path, fragment, section_hint):
+        key = (doc_path, fragment)
+        if key in local_refs:
+            return local_refs[key]
+
+        document = load_ref_file(doc_path)
+        target = resolve_json_pointer(document, fragment)
+
+        parts = fragment.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'components' and parts[1] in COMPONENT_SECTIONS:
+            section, preferred = parts[1], unescape_pointer_token(parts[2])
+        else:
+            section = section_hint
+            preferred = unescape_pointer_token(parts[-1]) if parts[-1] else Path(doc_path).stem
+
+        name = local_name(section, preferred, doc_path)
+        ref = f"#/components/{section}/{escape_pointer_token(name)}"
+        local_refs[key] = ref
+        bundled['components'].setdefault(section, {})[name] = None  # Reserve the name
+        bundled['components'][section][name] = rewrite(target, doc_path, section)
+        return ref
+
+    def rewrite(obj, doc_path, section_hint):
+        if isinstance(obj, dict):
+            result = {}
+            for key, value in obj.items():
+                if key == '$ref' and isinstance(value, str):
+                    file_part, _, fragment = value.partition('#')
+                    if file_part:
+                        target_doc = str((Path(doc_path).parent / file_part).resolve())
+                    else:
+                        target_doc = doc_path
+                    if target_doc == root_path:
+                        result[key] = '#' + fragment
+                    else:
+                        result[key] = internalise(target_doc, fragment, section_hint)
+                else:
+                    result[key] = rewrite(value, doc_path, SECTION_FOR_KEY.get(key, section_hint_for(key, section_hint)))
+            return result
+        if isinstance(obj, list):
+            return [rewrite(item, doc_path, section_hint) for item in obj]
+        return obj
+
+    def section_hint_for(key, current):
+        # Below a parameter, response, etc. any nested $ref is a schema unless stated otherwise
+        if key in ('schema', 'items', 'properties', 'additionalProperties', 'allOf', 'oneOf',
+                   'anyOf', 'not', 'content'):
+            return 'schemas'
+        return current
+
+    result = rewrite(spec, root_path, 'schemas')
+    components = result.setdefault('components', {})
+    for section, entries in bundled['components'].items():
+        components.setdefault(section, {}).update(entries)
+    return result
+
+def endpoint_filename(path, method):
+    """Create a safe JSON filename from an endpoint's path and method"""
+    # Replace / with _ and remove any problematic characters
+    safe_path = path.replace('/', '_').replace('{', '').replace('}', '').strip('_')
+    filename = f"{method.lower()}_{safe_path}.json"
     
-    for endpoint_path, methods in spec['paths'].items():
-        for method, _ in methods.items():
-            print(f"Processing {method.upper()} {endpoint_path}")
-            
-            # Extract endpoint with dependencies
-            mini_spec = extract_endpoint_info(spec, endpoint_path, method)
-            is_valid = validate_mini_spec(mini_spec, endpoint_path, method)
-            inlined_endpoints.append({
-                'path': endpoint_path,
-                'method': method,
-                'spec': mini_spec,
-                'is_valid': is_valid
-            })
+    # Handle edge cases for filename
+    if not safe_path:  # Root path "/"
+        filename = f"{method.lower()}_root.json"
     
-    # Save all processed endpoints
-    save_endpoint_specs(inlined_endpoints)
+    return filename
+
+def write_endpoint_spec(endpoint_data, output_dir="endpoint_specs"):
+    """Write an endpoint's mini-spec as compact JSON; it is only read back by the pipeline"""
+    filepath = os.path.join(output_dir, endpoint_filename(endpoint_data['path'], endpoint_data['method']))
+    # json.dumps uses the C encoder, json.dump streaming to a file does not
+    with open(filepath, 'w') as f:
+        f.write(json.dumps(endpoint_data['spec'], separators=(',', ':')))
+    return filepath
+
+
+def split_endpoint(spec, endpoint_path, method, component_index, output_dir):
+    """Extract, validate and save one endpoint, returning its processed endpoint record"""
+    mini_spec = extract_endpoint_info(spec, endpoint_path, method, component_index)
+    endpoint_data = {
+        'path': endpoint_path,
+        'method': method,
+        'spec': mini_spec,
+        'is_valid': validate_mini_spec(mini_spec, endpoint_path, method, verbose=False)
+    }
+    if output_dir is not None:
+        write_endpoint_spec(endpoint_data, output_dir)
+    return endpoint_data
+
+
+def init_split_worker(spec, component_index):
+    """
+    Process pool initializer. With the fork start method the spec is inherited from the
+    parent without being pickled; otherwise it is sent once per worker, not once per task.
+    """
+    global _worker_spec, _worker_component_index
+    _worker_spec = spec
+    _worker_component_index = component_index
+
+
+def split_operations(operations, output_dir):
+    """Split a chunk of (path, method) operations in a worker process"""
+    return [split_endpoint(_worker_spec, endpoint_path, method, _worker_component_index, output_dir)
+            for endpoint_path, method in operations]
+
+
+def split_in_processes(spec, component_index, operations, output_dir, workers, on_progress):
+    """Split operations across a pool of worker processes, returning records in spec order"""
+    # A few chunks per worker keeps them all busy without a round trip per operation
+    chunk_size = max(1, len(operations) // (workers * 4))
+    chunks = [operations[i:i + chunk_size] for i in range(0, len(operations), chunk_size)]
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_split_worker,
+                             initargs=(spec, component_index)) as executor:
+        for chunk_results in executor.map(split_operations, chunks, [output_dir] * len(chunks)):
+            results.extend(chunk_results)
+            on_progress(len(results))
+    return results
+
+
+def process_all_endpoints(spec, base_dir='.', output_dir="endpoint_specs", workers=SPLIT_WORKERS, spec_file=None):
+    """
+    Process all endpoints in the spec. base_dir is the directory of the spec file, used to
+    resolve refs to external files, and spec_file the file itself (see bundle_external_refs).
+
+    Every endpoint's mini-spec is written to output_dir as it is extracted, unless output_dir
+    is None and the returned mini-specs are used directly. Large specs are
+    split by a pool of worker processes that share the bundled spec and its component
+    index. Progress is reported every tenth of the operations, and unresolved references are
+    reported per endpoint.
+    """
+    spec = bundle_external_refs(spec, base_dir, spec_file)
+    # Resolve component dependencies once for the whole spec rather than per endpoint
+    component_index = build_component_dependency_index(spec)
+    operations = list(iter_operations(spec))
+    if output_dir is not None:
+        Path(output_dir).mkdir(exist_ok=True)
+
+    started = time.perf_counter()
+    step = max(1, len(operations) // 10)
+    reported = [0]
+
+    def on_progress(done):
+        if done // step > reported[0] and done < len(operations):
+            reported[0] = done // step
+            print(f"Split {done}/{len(operations)} endpoints ({time.perf_counter() - started:.1f}s)")
+
+    workers = min(workers, len(operations))
+    if workers > 1 and len(operations) >= PARALLEL_SPLIT_MIN_OPERATIONS:
+        inlined_endpoints = split_in_processes(spec, component_index, operations, output_dir, workers, on_progress)
+    else:
+        workers = 1
+        inlined_endpoints = []
+        for endpoint_path, method in operations:
+            inlined_endpoints.append(split_endpoint(spec, endpoint_path, method, component_index, output_dir))
+            on_progress(len(inlined_endpoints))
+
+    invalid = sum(1 for endpoint in inlined_endpoints if not endpoint['is_valid'])
+    print(f"Split {len(inlined_endpoints)} endpoints into {output_dir or 'memory'} in {time.perf_counter() - started:.2f}s "
+          f"({workers} process{'es' if workers > 1 else ''}), {invalid} with unresolved references")
     
     return inlined_endpoints
@@ -0,0 +1,159 @@
+import re
+import json
+import hashlib
+from urllib.parse import unquote, urlsplit, parse_qsl
+
+# Patterns in Postman test scripts that state the expected response status
+_STATUS_PATTERNS = (
+    re.compile(r'to\.have\.status\(\s*(\d{3})\s*\)'),
+    re.compile(r'oneOf\(\s*\[([\d,\s]+)\]\s*\)'),
+    re.compile(r'response\.code\)?\s*(?:===?|\.to\.(?:equal|eql|be)\()\s*(\d{3})'),
+)
+
+
+def request_url_parts(url):
+    """
+    (path, sorted query pairs) of a Postman url, which may be a raw string or a url object.
+    Variables such as {{base_url}} are left in place; every collection uses the same ones.
+    """
+    if isinstance(url, dict):
+        raw = url.get('raw')
+        if raw is None:
+            host = url.get('host', [])
+            path = url.get('path', [])
+            raw = '/'.join(host if isinstance(host, list) else [host]) + '/' + \
+                '/'.join(path if isinstance(path, list) else [path])
+            query = [(q.get('key', ''), q.get('value') or '') for q in url.get('query', [])
+                     if isinstance(q, dict) and not q.get('disabled')]
+        else:
+            query = None
+    else:
+        raw = url or ''
+        query = None
+
+    parts = urlsplit(raw if '://' in raw else 'http://' + raw.lstrip('/'))
+    path = unquote(parts.netloc + parts.path).rstrip('/')
+    if query is None:
+        query = parse_qsl(parts.query, keep_blank_values=True)
+    return path, tuple(sorted((unquote(k), unquote(v)) for k, v in query))
+
+
+def body_hash(body):
+    """Hash of a request body that ignores JSON formatting and form field order"""
+    if not body:
+        return None
+    mode = body.get('mode')
+    content = body.get(mode) if mode else None
+    if mode == 'raw' and isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except json.JSONDecodeError:
+            content = content.strip()
+    elif mode in ('urlencoded', 'formdata') and isinstance(content, list):
+        content = sorted((p.get('key', ''), str(p.get('value', ''))) for p in content
+                         if isinstance(p, dict) and not p.get('disabled'))
+    if content in (None, '', [], {}):
+        return None
+    payload = json.dumps([mode, content], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def script_statuses(text):
+    """Response statuses asserted anywhere in a piece of test script"""
+    statuses = set()
+    for pattern in _STATUS_PATTERNS:
+        for match in pattern.findall(text):
+            statuses.update(int(code) for code in re.findall(r'\d{3}', match))
+    return statuses
+
+
+def test_script(item):
+    """Text of an item's test scripts"""
+    scripts = []
+    for event in item.get('event', []):
+        if not isinstance(event, dict) or event.get('listen') != 'test':
+            continue
+        script = event.get('script', {}).get('exec', [])
+        scripts.append('\n'.join(script) if isinstance(script, list) else str(script))
+    return '\n'.join(scripts)
+
+
+def expected_statuses(item):
+    """Response statuses the item's test scripts check for"""
+    return tuple(sorted(script_statuses(test_script(item))))
+
+
+def canonical_request_key(item):
+    """
+    Canonical form of a collection request: method, resolved URL path, sorted query
+    parameters, enabled headers, body hash and the statuses its tests expect. Two requests
+    with the same key send the same request and assert the same outcome, whatever their names.
+    """
+    request = item.get('request', {})
+    if isinstance(request, str):
+        request = {'method': 'GET', 'url': request}
+    path, query = request_url_parts(request.get('url'))
+    headers = tuple(sorted(
+        (h.get('key', '').lower(), str(h.get('value', '')))
+        for h in request.get('header', []) if isinstance(h, dict) and not h.get('disabled')
+    ))
+    return (
+        request.get('method', 'GET').upper(),
+        path,
+        query,
+        headers,
+        body_hash(request.get('body')),
+        expected_statuses(item)
+    )
+
+
+def new_dedup_report():
+    return {"total": 0, "removed": 0, "flagged": 0, "within_endpoint": 0, "across_endpoints": 0, "duplicates": []}
+
+
+def dedupe_items(items, endpoint, seen, report, mode="report", folder_path=()):
+    """
+    Removes (mode "remove"), marks (mode "flag") or only reports (mode "report") requests in
+    items whose canonical key was already seen, recursing into folders. seen maps keys to (endpoint, name) of the first
+    request with that key and is shared across endpoints to find cross-endpoint duplicates.
+
+    Returns:
+        list: The items that are kept
+    """
+    kept = []
+    for item in items:
+        if not isinstance(item, dict):
+            kept.append(item)
+            continue
+        if 'request' not in item:
+            if isinstance(item.get('item'), list):
+                item['item'] = dedupe_items(item['item'], endpoint, seen, report, mode,
+                                            folder_path + (item.get('name', ''),))
+            kept.append(item)
+            continue
+
+        report["total"] += 1
+        name = '/'.join(folder_path + (item.get('name', ''),))
+        key = canonical_request_key(item)
+        original = seen.get(key)
+        if original is None:
+            seen[key] = (endpoint, name)
+            kept.append(item)
+            continue
+
+        report["within_endpoint" if original[0] == endpoint else "across_endpoints"] += 1
+        report["duplicates"].append({
+            "endpoint": endpoint, "name": name,
+            "duplicate_of": {"endpoint": original[0], "name": original[1]}
+        })
+        if mode == "flag":
+            report["flagged"] += 1
+            note = f"Duplicate of {original[1]} in {original[0]}"
+            item['description'] = f"{item['description']}\n\n{note}" if item.get('description') else note
+            kept.append(item)
+        elif mode == "report":
+            kept.append(item)
+        else:
+            report["removed"] += 1
+    return kept
+
@@ -0,0 +1,183 @@
+"""
+Matches the sections of the requirements document to the endpoints they change, so each
+endpoint's prompt only carries the relevant parts of the document instead of all of it.
+
+The document is split into change sections at headings ("# ...", "1. ...", "---") or, where
+there are none, at each new top-level paragraph after a section that has named an endpoint.
+A section applies to an operation when it names:
+- the operation's path (with or without a method)
+- its operationId, or one of its parameter or schema names
+- all endpoints ("every endpoint", "all operations")
+A section that names none of these is matched by lexical (TF-IDF) similarity to the
+operation's path, operationId, summary and parameters. A section that still matches nothing
+applies to every endpoint, so no change is dropped from every prompt.
+"""
+import os
+import re
+import math
+import logging
+from collections import Counter
+from requirements_parser import mentioned_endpoints
+from edge_case_generator import collect_parameters
+from incremental import endpoint_name
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Minimum cosine similarity for a section that names nothing to apply to an operation (it must
+# also score at least half as high as the section's best match)
+REQUIREMENTS_MATCH_THRESHOLD = float(os.environ.get("REQUIREMENTS_MATCH_THRESHOLD", "0.3"))
+
+_BLANK_LINES = re.compile(r'\n\s*\n')
+_HEADING = re.compile(r'^(#{1,6}\s+\S|\d+[.)]\s+\S|(?:change|requirement)\s*\d*\s*[:\-])', re.IGNORECASE)
+_RULE = re.compile(r'^\s*(-{3,}|={3,}|\*{3,})\s*$')
+# Code-like names: camelCase, snake_case, dotted or backticked
+_IDENTIFIER = re.compile(r'`([^`\s]+)`|([A-Za-z_][\w.\-]*[A-Za-z0-9_])')
+_CODE_LIKE = re.compile(r'[a-z][A-Z]|_|[A-Za-z]\.[A-Za-z]{2}')
+_ALL_ENDPOINTS = re.compile(r'\b(all|every|each)\s+(api\s+)?(endpoints?|operations?|requests?)\b', re.IGNORECASE)
+_WORD = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+_STOPWORDS = frozenset("""
+    the and for are but not you all any can had has her was one our out get set use with that this from they
+    will would there their what when which who why how its into than then them these those been being have
+    each other some such only own same very just also may must should could need needs want add new existing
+    endpoint endpoints api parameter parameters value values list return returns returned users user ability
+""".split())
+
+
+def normalise_path(path):
+    """Path compared case-insensitively and with path parameter names ignored"""
+    return re.sub(r'\{[^{}]*\}', '{}', path).rstrip('/').lower()
+
+
+def stem(word):
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('s') and not word.endswith('ss') and len(word) > 4:
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """Lowercased, lightly stemmed words of text, splitting camelCase and ignoring stopwords"""
+    words = (word.lower() for word in _WORD.findall(text))
+    return [stem(word) for word in words if len(word) > 2 and word not in _STOPWORDS]
+
+
+def identifiers(text):
+    """Lowercased code-like names in text, e.g. operationIds, parameter and schema names"""
+    names = set()
+    for quoted, word in _IDENTIFIER.findall(text):
+        if quoted:
+            names.add(quoted.strip('.,;:()').lower())
+        elif len(word) >= 4 and _CODE_LIKE.search(word):
+            names.add(word.lower())
+    return names
+
+
+def is_top_level(paragraph):
+    first_line = paragraph.split('\n', 1)[0]
+    return bool(first_line) and not first_line[0].isspace() and first_line.lstrip()[0] not in '-*' \
+        and not re.fullmatch(r'[A-Z][A-Z ]+:\s*', first_line)
+
+
+def split_change_sections(requirements_doc):
+    """The change sections of a requirements document, as text"""
+    sections, current, names_endpoint = [], [], False
+    for paragraph in _BLANK_LINES.split(requirements_doc.strip('\n')):
+        if not paragraph.strip():
+            continue
+        heading = _HEADING.match(paragraph.lstrip())
+        rule = _RULE.match(paragraph.split('\n', 1)[0])
+        if current and (heading or rule or (names_endpoint and is_top_level(paragraph))):
+            sections.append("\n\n".join(current).rstrip())
+            current, names_endpoint = [], False
+        if rule:
+            paragraph = paragraph.split('\n', 1)[1] if '\n' in paragraph else ''
+            if not paragraph.strip():
+                continue
+        current.append(paragraph)
+        names_endpoint = names_endpoint or bool(mentioned_endpoints(paragraph))
+    if current:
+        sections.append("\n\n".join(current).rstrip())
+    return sections
+
+
+def operation_profile(endpoint):
+    """Names and terms of an operation from process_all_endpoints that sections are matched against"""
+    path, method, mini_spec = endpoint['path'], endpoint['method'], endpoint['spec']
+    operation = mini_spec['paths'][path][method]
+    parameters = collect_parameters(mini_spec, path, method)
+    schemas = list(mini_spec.get('components', {}).get('schemas', {}))
+    names = {p['name'].lower() for p in parameters}
+    for schema in schemas:
+        names.add(schema.lower())
+        # Tfl.Api.Presentation.Entities.LineStatus is usually written as LineStatus
+        short_name = schema.rsplit('.', 1)[-1]
+        if _CODE_LIKE.search(short_name):
+            names.add(short_name.lower())
+    if operation.get('operationId'):
+        names.add(operation['operationId'].lower())
+    text = " ".join([path, operation.get('operationId', ''), operation.get('summary', ''),
+                     " ".join(operation.get('tags', []))] + [p['name'] for p in parameters])
+    return {
+        "name": endpoint_name(path, method),
+        "path": normalise_path(path),
+        "method": method,
+        "names": names,
+        "terms": Counter(terms(text))
+    }
+
+
+def tfidf(counts, idf):
+    vector = {term: count * idf.get(term, 0.0) for term, count in counts.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return vector, norm
+
+
+def cosine(a, b):
+    (vector_a, norm_a), (vector_b, norm_b) = a, b
+    if not norm_a or not norm_b:
+        return 0.0
+    return sum(weight * vector_b.get(term, 0.0) for term, weight in vector_a.items()) / (norm_a * norm_b)
+
+
+def build_requirements_index(processed_endpoints, requirements_doc, threshold=REQUIREMENTS_MATCH_THRESHOLD):
+    """
+    Matches every change section of the requirements document to the endpoints it applies to.
+
+    Returns:
+        tuple: (list of section texts, dict mapping each endpoint name to the indices of the
+                sections that apply to it, in document order)
+    """
+    sections = split_change_sections(requirements_doc)
+    operations = [operation_profile(endpoint) for endpoint in processed_endpoints]
+    matches = {operation["name"]: [] for operation in operations}
+
+    document_frequency = Counter(term for operation in operations for term in operation["terms"])
+    idf = {term: math.log((1 + len(operations)) / (1 + count)) + 1 for term, count in document_frequency.items()}
+    vectors = [tfidf(operation["terms"], idf) for operation in operations]
+    known_names = set().union(*(operation["names"] for operation in operations))
+
+    for i, section in enumerate(sections):
+        endpoints = [(method, normalise_path(path)) for method, path in mentioned_endpoints(section)]
+        names = identifiers(section)
+        if _ALL_ENDPOINTS.search(section):
+            matched = operations
+        elif endpoints or names & known_names:
+            matched = [operation for operation in operations
+                       if any(path == operation["path"] and method in (None, operation["method"])
+                              for method, path in endpoints)
+                       or names & operation["names"]]
+        else:
+            section_vector = tfidf(Counter(terms(section)), idf)
+            scores = [cosine(section_vector, vector) for vector in vectors]
+            # Operations that only share the resource name with the best match score about half as high
+            cutoff = max(threshold, max(scores, default=0.0) / 2)
+            matched = [operation for operation, score in zip(operations, scores) if score >= cutoff]
+        if not matched:
+            logger.warning(f"Requirements section {i + 1} matches no endpoint, including it for every endpoint")
+            matched = operations
+        for operation in matched:
+            matches[operation["name"]].append(i)
+    return sections, matches
@@ -0,0 +1,128 @@
+import re
+import copy
+import logging
+from input_data.req_doc import REQUIREMENTS_SPEC_DOC
+from reference_resolver import HTTP_METHODS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "add a new query parameter accessibilityPreference", "new header parameter X-Api-Version", ...
+_PARAMETER_INTRO = re.compile(
+    r'\bnew\s+(?:(query|path|header|cookie)\s+)?parameter\s+[`"\']?([A-Za-z_][\w.\-\[\]]*)', re.IGNORECASE
+)
+_ENDPOINT = re.compile(r'(?:\b(GET|PUT|POST|DELETE|PATCH|HEAD|OPTIONS)\s+)?(?<![\w/])(/[A-Za-z0-9_.{}\-/]*[A-Za-z0-9_}])')
+_SPEC_LINE = re.compile(r'^\s*-\s*([A-Za-z ]+?)\s*:\s*(.+?)\s*$')
+_ALLOWED_VALUE = re.compile(r'^\s*-\s*([^\s-][^\s]*)\s*(?:-\s*.*)?$')
+_SECTION = re.compile(r'^\s*([A-Z][A-Z ]+):\s*$')
+_TYPES = ('integer', 'number', 'boolean', 'string', 'object')
+
+
+def mentioned_endpoints(text):
+    """(method or None, path) of every endpoint named in text, e.g. "GET /Line/{ids}" or "/BikePoint" """
+    return [(method.lower() if method else None, path) for method, path in _ENDPOINT.findall(text)]
+
+
+def parse_schema(type_text, allowed_values):
+    """OpenAPI schema for a "Type:" line such as "array of strings (enum)" or "integer" """
+    type_text = type_text.lower()
+    item_type = next((t for t in _TYPES if t in type_text), 'string')
+    schema = {'type': item_type}
+    if allowed_values:
+        schema['enum'] = allowed_values
+    if 'array' in type_text or 'list' in type_text:
+        return {'type': 'array', 'items': schema}
+    return schema
+
+
+def parse_parameter_block(name, location, text):
+    """Build an OpenAPI parameter from the specification lines and allowed values after its introduction"""
+    fields = {}
+    allowed_values = []
+    section = None
+    for line in text.splitlines():
+        heading = _SECTION.match(line)
+        if heading:
+            section = heading.group(1).strip()
+            continue
+        if section == 'ALLOWED VALUES':
+            match = _ALLOWED_VALUE.match(line)
+            if match:
+                allowed_values.append(match.group(1))
+            continue
+        match = _SPEC_LINE.match(line)
+        if match:
+            fields[match.group(1).strip().lower()] = match.group(2)
+
+    location = (location or fields.get('location', 'query')).lower()
+    location = next((l for l in ('query', 'path', 'header', 'cookie') if l in location), 'query')
+    parameter = {
+        'name': name,
+        'in': location,
+        'required': location == 'path' or fields.get('required', 'false').strip().lower() in ('true', 'yes'),
+        'schema': parse_schema(fields.get('type', 'string'), allowed_values)
+    }
+    if 'description' in fields:
+        parameter['description'] = fields['description']
+    if parameter['schema']['type'] == 'array' and 'comma' in fields.get('format', '').lower():
+        parameter['style'] = 'form'
+        parameter['explode'] = False
+    return parameter
+
+
+def parse_requirements_doc(requirements_doc=REQUIREMENTS_SPEC_DOC):
+    """
+    Extracts the structured changes described in a requirements document. Each new parameter
+    is introduced by a sentence like "add a new query parameter <name> to the existing <path>
+    endpoint", optionally followed by "- Key: value" specification lines and an ALLOWED
+    VALUES list. An endpoint named earlier in the document applies until another is named.
+
+    Returns:
+        list: Changes of the form {"action": "add_parameter", "path", "method" (None for
+              every method), "parameter"}
+    """
+    intros = list(_PARAMETER_INTRO.finditer(requirements_doc))
+    changes = []
+    for i, intro in enumerate(intros):
+        name = intro.group(2).rstrip('.-')
+        block_end = intros[i + 1].start() if i + 1 < len(intros) else len(requirements_doc)
+        # The endpoint is usually named later in the same line as the parameter
+        line_end = requirements_doc.find('\n', intro.end())
+        line_end = block_end if line_end == -1 else min(line_end, block_end)
+        endpoints = list(_ENDPOINT.finditer(requirements_doc, 0, line_end))
+        if not endpoints:
+            logger.warning(f"No endpoint found for new parameter {name}, ignoring it")
+            continue
+        method, path = endpoints[-1].groups()
+        changes.append({
+            "action": "add_parameter",
+            "path": path,
+            "method": method.lower() if method else None,
+            "parameter": parse_parameter_block(name, intro.group(1),
+                                               requirements_doc[intro.end():block_end])
+        })
+    return changes
+
+
+def apply_requirements(spec, changes):
+    """
+    Returns a copy of spec with the requirement changes applied. A parameter that already
+    exists with the same name and location is replaced.
+    """
+    spec = copy.deepcopy(spec)
+    for change in changes:
+        path_item = spec.get('paths', {}).get(change['path'])
+        if path_item is None:
+            logger.warning(f"Requirements change refers to unknown path {change['path']}")
+            continue
+        methods = [change['method']] if change['method'] else [m for m in path_item if m in HTTP_METHODS]
+        parameter = change['parameter']
+        for method in methods:
+            operation = path_item.get(method)
+            if operation is None:
+                continue
+            parameters = [p for p in operation.get('parameters', [])
+                          if not (p.get('name') == parameter['name'] and p.get('in') == parameter['in'])]
+            operation['parameters'] = parameters + [copy.deepcopy(parameter)]
+    return spec
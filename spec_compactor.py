@@ -0,0 +1,232 @@
+import re
+import json
+import logging
+from reference_resolver import build_component_dependency_index, get_all_component_dependencies, find_component_refs
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Keys that never affect the generated tests
+UNUSED_KEYS = ('tags', 'externalDocs', 'servers', 'deprecated', 'xml')
+# Media types tried, in order, when collapsing a content map to a single entry
+PREFERRED_MEDIA_TYPES = ('application/json', 'text/json')
+# Parameter descriptions are cut to this length at the last pruning stage
+MAX_PARAMETER_DESCRIPTION = 160
+# Keywords whose value maps names chosen by the spec author (not keywords) to objects
+NAME_MAP_KEYS = ('paths', 'properties', 'patternProperties', 'definitions', '$defs', 'responses', 'content',
+                 'headers', 'encoding', 'links', 'callbacks', 'examples', 'parameters', 'requestBodies',
+                 'schemas', 'securitySchemes', 'variables', 'mapping')
+# Keywords whose value is literal data rather than part of the spec's structure
+LITERAL_KEYS = ('example', 'default', 'enum', 'const', 'value')
+
+_TOKEN_PATTERN = re.compile(r'[A-Za-z]+|\d+|\s+|[^\sA-Za-z\d]')
+
+
+def estimate_tokens(text):
+    """
+    Rough local estimate of the number of tokens the model sees for text. Words cost a token
+    per ~4 letters, digit runs a token per ~3 digits, and every punctuation character is its
+    own token, which matches compact JSON closely enough to budget prompts without an API call.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            tokens += (len(piece) + 3) // 4
+        elif first.isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif not first.isspace():
+            tokens += 1
+    return tokens
+
+
+def compact_json(data):
+    """Whitespace-free JSON used in prompts"""
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def map_schema_keywords(obj, transform):
+    """
+    Applies transform(dict) -> dict to every object in a spec that is in a keyword position.
+    Maps keyed by names the spec author chose (components, properties, responses, content,
+    ...) are walked without being transformed, so a schema or property called e.g.
+    "description", "xml" or "example" is kept. Literal values (examples, defaults, enums) are
+    left as they are.
+    """
+    if isinstance(obj, list):
+        return [map_schema_keywords(value, transform) for value in obj]
+    if not isinstance(obj, dict):
+        return obj
+    result = {}
+    for key, value in transform(obj).items():
+        if key in LITERAL_KEYS:
+            result[key] = value
+        elif key == 'components' and isinstance(value, dict):
+            result[key] = {section: map_named_entries(entries, transform) for section, entries in value.items()}
+        elif key in NAME_MAP_KEYS and isinstance(value, dict):
+            result[key] = map_named_entries(value, transform)
+        else:
+            result[key] = map_schema_keywords(value, transform)
+    return result
+
+
+def map_named_entries(entries, transform):
+    """map_schema_keywords for each entry of a map keyed by names, leaving the names alone"""
+    if not isinstance(entries, dict):
+        return map_schema_keywords(entries, transform)
+    return {name: map_schema_keywords(entry, transform) for name, entry in entries.items()}
+
+
+def drop_unused_keys(obj):
+    return {key: value for key, value in obj.items()
+            if key not in UNUSED_KEYS and not key.startswith('x-')}
+
+
+def single_media_type(obj):
+    """Keep one entry of every content map, the schemas are the same for each media type"""
+    content = obj.get('content')
+    if not isinstance(content, dict) or len(content) <= 1:
+        return obj
+    media_type = next((m for m in PREFERRED_MEDIA_TYPES if m in content), next(iter(content)))
+    return dict(obj, content={media_type: content[media_type]})
+
+
+def drop_examples(obj):
+    """Remove examples, except from parameters where they give realistic path values"""
+    if 'in' in obj and 'name' in obj:
+        return obj
+    return {key: value for key, value in obj.items() if key not in ('example', 'examples')}
+
+
+def drop_descriptions(obj):
+    return {key: value for key, value in obj.items() if key != 'description'}
+
+
+def shorten_description(description):
+    """
+    Cuts a parameter description to MAX_PARAMETER_DESCRIPTION characters, always keeping any
+    sentence that mentions disambiguation since the tests' expected status depends on it.
+    """
+    if len(description) <= MAX_PARAMETER_DESCRIPTION:
+        return description
+    sentences = re.split(r'(?<=[.!?])\s+', description)
+    kept = [sentences[0]] + [s for s in sentences[1:] if 'disambiguation' in s.lower()]
+    shortened = ' '.join(kept)
+    if len(shortened) > MAX_PARAMETER_DESCRIPTION and 'disambiguation' not in shortened.lower():
+        shortened = shortened[:MAX_PARAMETER_DESCRIPTION].rstrip() + '...'
+    return shortened
+
+
+def map_operations(mini_spec, transform):
+    """Applies transform(operation) -> operation to every operation in the mini-spec"""
+    paths = {}
+    for path, path_item in mini_spec.get('paths', {}).items():
+        paths[path] = {method: transform(operation) if isinstance(operation, dict) and method != 'parameters'
+                       else operation
+                       for method, operation in path_item.items()}
+    return dict(mini_spec, paths=paths)
+
+
+def drop_response_bodies(operation):
+    """Keep each response's status code and description, but not its body schema"""
+    responses = {status: {'description': response.get('description', '')} if isinstance(response, dict)
+                 else response
+                 for status, response in operation.get('responses', {}).items()}
+    return dict(operation, responses=responses)
+
+
+def shorten_parameter_descriptions(mini_spec):
+    def shorten(parameter):
+        if isinstance(parameter, dict) and isinstance(parameter.get('description'), str):
+            return dict(parameter, description=shorten_description(parameter['description']))
+        return parameter
+
+    paths = {}
+    for path, path_item in mini_spec.get('paths', {}).items():
+        path_item = dict(path_item)
+        for key, value in path_item.items():
+            if key == 'parameters':
+                path_item[key] = [shorten(p) for p in value]
+            elif isinstance(value, dict) and 'parameters' in value:
+                path_item[key] = dict(value, parameters=[shorten(p) for p in value['parameters']])
+        paths[path] = path_item
+    components = dict(mini_spec.get('components', {}))
+    if 'parameters' in components:
+        components['parameters'] = {name: shorten(p) for name, p in components['parameters'].items()}
+    return dict(mini_spec, paths=paths, components=components)
+
+
+def prune_components(mini_spec):
+    """Remove components that are no longer referenced from the paths, directly or transitively"""
+    components = mini_spec.get('components')
+    if not components:
+        return mini_spec
+    used = get_all_component_dependencies(mini_spec, find_component_refs(mini_spec.get('paths', {})),
+                                          build_component_dependency_index(mini_spec))
+    pruned = {}
+    for section, entries in components.items():
+        if not isinstance(entries, dict):
+            continue
+        kept = {name: value for name, value in entries.items() if (section, name) in used}
+        if kept or section == 'schemas':
+            pruned[section] = kept
+    return dict(mini_spec, components=pruned)
+
+
+def minimal_spec(mini_spec):
+    """The parts of a mini-spec test generation needs, without pruning any content"""
+    compacted = {}
+    if 'openapi' in mini_spec:
+        compacted['openapi'] = mini_spec['openapi']
+    title = mini_spec.get('info', {}).get('title')
+    if title:
+        compacted['info'] = {'title': title}
+    compacted.update({key: mini_spec[key] for key in ('paths', 'components') if key in mini_spec})
+    compacted = map_schema_keywords(compacted, lambda obj: single_media_type(drop_unused_keys(obj)))
+    return prune_components(compacted)
+
+
+def drop_schema_descriptions(mini_spec):
+    """Remove descriptions from component schemas, keeping parameter and response descriptions"""
+    components = dict(mini_spec.get('components', {}))
+    if 'schemas' in components:
+        components['schemas'] = map_named_entries(components['schemas'], drop_descriptions)
+    return dict(mini_spec, components=components)
+
+
+# Applied in order until the mini-spec fits its token budget, least useful content first
+PRUNING_STAGES = (
+    ('examples', lambda spec: map_schema_keywords(spec, drop_examples)),
+    ('schema descriptions', drop_schema_descriptions),
+    ('response bodies', lambda spec: prune_components(map_operations(spec, drop_response_bodies))),
+    ('parameter descriptions', shorten_parameter_descriptions),
+)
+
+
+def compact_mini_spec(mini_spec, token_budget=None):
+    """
+    Reduces an endpoint's mini-spec to what test generation needs: info, servers, tags,
+    vendor extensions and duplicate media types are always removed, along with components
+    that are no longer referenced. If the compact JSON is still estimated to be over
+    token_budget, examples, schema descriptions, response bodies and finally long parameter
+    descriptions are pruned, stopping as soon as it fits.
+
+    Returns:
+        dict: The compacted mini-spec
+    """
+    compacted = minimal_spec(mini_spec)
+    if token_budget is None:
+        return compacted
+
+    tokens = estimate_tokens(compact_json(compacted))
+    for stage, prune in PRUNING_STAGES:
+        if tokens <= token_budget:
+            break
+        compacted = prune(compacted)
+        tokens = estimate_tokens(compact_json(compacted))
+        logger.info(f"Pruned {stage} from mini-spec, now ~{tokens} tokens")
+
+    if tokens > token_budget:
+        logger.warning(f"Mini-spec is ~{tokens} tokens after pruning, over its budget of {token_budget}")
+    return compacted
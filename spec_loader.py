@@ -0,0 +1,79 @@
+import os
+import json
+import yaml
+import pickle
+import hashlib
+import logging
+from pathlib import Path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Use the libyaml C loader when PyYAML was built with it, it is several times faster
+try:
+    SpecLoader = yaml.CSafeLoader
+except AttributeError:
+    SpecLoader = yaml.SafeLoader
+
+SPEC_CACHE_DIR = Path(os.environ.get("SPEC_CACHE_DIR", "./.spec_cache"))
+
+
+def parse_spec_file(file_path):
+    """Parse a YAML or JSON spec file without using the cache"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if str(file_path).endswith('.json'):
+            return json.load(f)
+        return yaml.load(f, Loader=SpecLoader)
+
+
+def load_spec(file_path, cache_dir=SPEC_CACHE_DIR):
+    """
+    Load an OpenAPI spec, reusing a pickled copy of the parsed spec from an earlier run.
+
+    The cache entry stores the file's mtime, size and content hash. If the mtime and size
+    match, the pickle is used without reading the spec; if only the mtime changed the
+    content hash decides. Otherwise the file is parsed and the cache entry rewritten.
+    Pass cache_dir=None to always parse.
+    """
+    if cache_dir is None:
+        return parse_spec_file(file_path)
+
+    file_path = Path(file_path).resolve()
+    cache_dir = Path(cache_dir)
+    cache_file = cache_dir / (hashlib.sha256(str(file_path).encode('utf-8')).hexdigest() + '.pickle')
+    stat = file_path.stat()
+
+    entry = None
+    try:
+        with open(cache_file, 'rb') as f:
+            entry = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError, AttributeError):
+        entry = None
+
+    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        logger.info(f"Loaded parsed spec from cache: {file_path.name}")
+        return entry['spec']
+
+    content = file_path.read_bytes()
+    content_hash = hashlib.sha256(content).hexdigest()
+    if entry and entry['hash'] == content_hash:
+        spec = entry['spec']
+        logger.info(f"Loaded parsed spec from cache (contents unchanged): {file_path.name}")
+    else:
+        if file_path.suffix == '.json':
+            spec = json.loads(content)
+        else:
+            spec = yaml.load(content, Loader=SpecLoader)
+
+    entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': content_hash, 'spec': spec}
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write spec cache for {file_path.name}: {e}")
+
+    return spec
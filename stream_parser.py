@@ -0,0 +1,281 @@
+import re
+import json
+import logging
+from utils import attempt_json_repair, find_last_complete_item
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = ' \t\r\n'
+# Characters that can appear in numbers and the literals true, false and null
+_SCALAR_CHARS = set('0123456789-+.eEtruefalsn')
+_CLOSING = {'}': '{', ']': '['}
+
+
+class MalformedStreamError(ValueError):
+    """Raised when streamed model output can no longer become a valid Postman collection"""
+
+
+class IncrementalCollectionParser:
+    """
+    Parses a Postman collection as it streams from the model.
+
+    Chunks are lexed as they arrive, tracking only string/escape state and the bracket stack.
+    Each element of the root "item" array is parsed as soon as its closing bracket arrives and
+    its text is then dropped. Every request (an object with a "request" key in an "item" array,
+    at any folder depth) is passed to on_request together with the names of the folders it is
+    in as soon as it closes, without waiting for its folders to close. A folder's name is only
+    known if it comes before the folder's "item" array, as the model writes it. Everything else
+    (info, variable, ...) is kept as a small skeleton with an empty "item" array, so the full
+    response text is never held in memory. A leading/trailing markdown code fence is tolerated.
+    Anything that can't be part of a valid document (prose instead of JSON, mismatched
+    brackets, text after the root object) raises MalformedStreamError so the caller can stop
+    the stream early.
+    """
+
+    def __init__(self, on_request=None):
+        self.on_request = on_request
+        self.items = []
+        self.char_count = 0
+        self.complete = False
+        self.unparsed_items = 0
+
+        self._state = 'preamble'  # preamble, fence, root or trailer
+        self._stack = []
+        # Per open bracket: None for an array, or [key, reading value, name, start, is request]
+        # for an object, where start is the object's offset in the root item being recorded
+        self._frames = []
+        self._in_string = False
+        self._escape = False
+        self._string_parts = None  # Pieces of the key or name string being read, if any
+        self._in_items = False    # Inside the root "item" array
+        self._recording = None    # 'skeleton', 'item' or None while skipping item separators
+        self._skeleton = []
+        self._items_offset = None  # Position of the item array's contents in the skeleton
+        self._item_parts = []
+        self._item_start = 0      # Stream position of the root item being recorded
+
+    def feed(self, chunk):
+        """Consume the next chunk of streamed text"""
+        self.char_count += len(chunk)
+        seg = 0
+        i = 0
+        n = len(chunk)
+        base = self.char_count - n
+        while i < n:
+            if self._state != 'root':
+                i = self._outside_root(chunk, i)
+                seg = i
+                continue
+
+            if self._escape:
+                self._escape = False
+                i += 1
+                continue
+
+            if self._in_string:
+                match = _STRING_SPECIAL.search(chunk, i)
+                if match is None:
+                    i = n
+                    break
+                j = match.start()
+                if chunk[j] == '\\':
+                    self._escape = True
+                    i = j + 1
+                    continue
+                self._in_string = False
+                if self._string_parts is not None:
+                    self._string_parts.append(chunk[self._string_start:j])
+                    frame = self._frames[-1]
+                    if frame[1]:
+                        frame[2] = ''.join(self._string_parts)
+                    else:
+                        frame[0] = ''.join(self._string_parts)
+                    self._string_parts = None
+                i = j + 1
+                continue
+
+            c = chunk[i]
+            depth = len(self._stack)
+            between_items = self._in_items and depth == 2 and self._recording is None
+
+            if c == '"':
+                if between_items:
+                    raise MalformedStreamError("Collection item is not an object")
+                self._in_string = True
+                frame = self._frames[-1]
+                # Keep the root object's keys, and the keys and names of objects inside items
+                if frame is not None and (depth == 1 or self._recording == 'item') \
+                        and (not frame[1] or frame[0] == 'name'):
+                    self._string_parts = []
+                    self._string_start = i + 1
+            elif c == '{' or c == '[':
+                if between_items:
+                    self._recording = 'item'
+                    self._item_parts = []
+                    self._item_start = base + i
+                    seg = i
+                self._stack.append(c)
+                self._frames.append([None, False, None, base + i - self._item_start, False] if c == '{' else None)
+                if depth == 1 and c == '[' and self._frames[0][0] == 'item':
+                    # Keep the opening bracket in the skeleton, then skip the array's contents
+                    self._in_items = True
+                    self._skeleton.append(chunk[seg:i + 1])
+                    self._items_offset = sum(len(part) for part in self._skeleton)
+                    self._recording = None
+                    seg = i + 1
+            elif c == '}' or c == ']':
+                if not self._stack or self._stack[-1] != _CLOSING[c]:
+                    raise MalformedStreamError(f"Unexpected '{c}' at character {base + i}")
+                self._stack.pop()
+                frame = self._frames.pop()
+                depth -= 1
+                if self._in_items and depth == 2 and self._recording == 'item':
+                    self._item_parts.append(chunk[seg:i + 1])
+                    self._emit_item(''.join(self._item_parts))
+                    self._item_parts = []
+                    self._recording = None
+                    seg = i + 1
+                elif self._in_items and depth == 1:
+                    self._in_items = False
+                    self._recording = 'skeleton'
+                    seg = i
+                elif frame is not None and frame[4] and self._recording == 'item':
+                    # A request inside a folder, emit it without waiting for the root item to close
+                    self._item_parts = [''.join(self._item_parts) + chunk[seg:i + 1]]
+                    seg = i + 1
+                    self._emit_request(self._item_parts[0][frame[3]:])
+                if depth == 0:
+                    self._skeleton.append(chunk[seg:i + 1])
+                    self._recording = None
+                    self._state = 'trailer'
+                    self.complete = True
+                    seg = i + 1
+            elif c == ':':
+                frame = self._frames[-1]
+                if frame is not None:
+                    frame[1] = True
+                    # Only an object in an "item" array is a Postman item that can be a request
+                    if frame[0] == 'request' and depth > 2 and self._frames[-2] is None \
+                            and self._frames[-3] is not None and self._frames[-3][0] == 'item':
+                        frame[4] = True
+            elif c == ',':
+                frame = self._frames[-1]
+                if frame is not None:
+                    frame[1] = False
+            elif c in _WHITESPACE:
+                pass
+            elif c in _SCALAR_CHARS:
+                if between_items:
+                    raise MalformedStreamError("Collection item is not an object")
+            else:
+                raise MalformedStreamError(f"Unexpected '{c}' at character {base + i}")
+            i += 1
+
+        if self._string_parts is not None and self._in_string:
+            self._string_parts.append(chunk[self._string_start:])
+            self._string_start = 0
+        if self._recording == 'skeleton':
+            self._skeleton.append(chunk[seg:])
+        elif self._recording == 'item':
+            self._item_parts.append(chunk[seg:])
+
+    def _outside_root(self, chunk, i):
+        """Handle text before and after the root object, returning the next index to read"""
+        c = chunk[i]
+        if self._state == 'fence':
+            newline = chunk.find('\n', i)
+            if newline == -1:
+                return len(chunk)
+            self._state = 'preamble'
+            return newline + 1
+        if c in _WHITESPACE:
+            return i + 1
+        if c == '`':
+            if self._state == 'preamble':
+                self._state = 'fence'
+            return i + 1
+        if self._state == 'preamble' and c == '{':
+            self._state = 'root'
+            self._recording = 'skeleton'
+            return i
+        raise MalformedStreamError(
+            f"Unexpected text {'before' if self._state == 'preamble' else 'after'} the collection JSON: {chunk[i:i + 40]!r}"
+        )
+
+    def _emit_item(self, text):
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            item = attempt_json_repair(text)
+            if item is None:
+                # Keep the raw text so the problem is reported when the collection is finished
+                self.unparsed_items += 1
+                self.items.append(text)
+                return
+        self.items.append(item)
+        if self.on_request is not None and isinstance(item, dict) and 'request' in item:
+            self.on_request(item, [])
+
+    def _emit_request(self, text):
+        if self.on_request is None:
+            return
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            # Reported when the root item it belongs to closes
+            return
+        folders = [frame[2] for frame in self._frames[2:] if frame is not None and frame[2] is not None]
+        self.on_request(item, folders)
+
+    def received_text(self):
+        """
+        Equivalent JSON text of everything received so far, with completed items re-serialised
+        compactly and the item currently being streamed included as raw text.
+        """
+        skeleton = ''.join(self._skeleton)
+        if self._items_offset is None:
+            return skeleton
+        items = [item if isinstance(item, str) else json.dumps(item, separators=(',', ':'))
+                 for item in self.items]
+        if self._recording == 'item':
+            items.append(''.join(self._item_parts))
+        return skeleton[:self._items_offset] + ','.join(items) + skeleton[self._items_offset:]
+
+    def continuation_prefix(self):
+        """
+        The received document cut back to its last complete item (at any nesting level), for
+        use as the start of a continuation request. Falls back to everything received when no
+        item has completed yet.
+        """
+        text = self.received_text()
+        boundary, _ = find_last_complete_item(text)
+        if boundary is None:
+            return text.rstrip()
+        return text[:boundary]
+
+    def finish(self):
+        """
+        Returns the complete collection, or None if the stream ended before the root object
+        closed or some item could not be parsed.
+        """
+        if not self.complete:
+            logger.error(f"Streamed collection is incomplete after {self.char_count} characters")
+            return None
+        if self.unparsed_items:
+            logger.error(f"{self.unparsed_items} collection items could not be parsed")
+            return None
+
+        skeleton = ''.join(self._skeleton)
+        try:
+            collection = json.loads(skeleton)
+        except json.JSONDecodeError:
+            collection = attempt_json_repair(skeleton)
+            if collection is None:
+                return None
+        if isinstance(collection, dict) and 'item' in collection:
+            collection['item'] = self.items
+        logger.info(f"JSON validation successful ({len(self.items)} items)")
+        return collection
@@ -0,0 +1,212 @@
+import os
+import math
+import json
+import time
+import uuid
+import logging
+from pathlib import Path
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# One JSON record per generated endpoint is appended here every run
+TELEMETRY_FILE = os.environ.get("TELEMETRY_FILE", "./output_data/telemetry.jsonl")
+
+# USD per million tokens, used to estimate the cost of a run
+MODEL_PRICING = {
+    "claude-sonnet-4-20250514": {
+        "input_tokens": 3.00,
+        "output_tokens": 15.00,
+        "cache_creation_input_tokens": 3.75,
+        "cache_read_input_tokens": 0.30
+    },
+    "gpt-4o": {
+        "input_tokens": 2.50,
+        "output_tokens": 10.00,
+        "cache_creation_input_tokens": 2.50,
+        "cache_read_input_tokens": 1.25
+    }
+}
+# Message Batches requests are billed at half price
+BATCH_DISCOUNT = 0.5
+
+
+def start_endpoint_telemetry(filename, mode="stream", elapsed=0.0):
+    """
+    New telemetry record for an endpoint, timed from now, or from elapsed seconds ago for
+    work that started before the record was created (e.g. a batch submitted earlier).
+    """
+    return {
+        "endpoint": Path(filename).stem,
+        "mode": mode,
+        "started": time.perf_counter() - elapsed,
+        "ttft_seconds": None,
+        "parse_seconds": 0.0,
+        "requests": 0,
+        "continuations": 0,
+        "retries": 0,
+        "backend": None,
+        "model": None
+    }
+
+
+def mark_first_token(telemetry):
+    """Record the time to first token the first time streamed text arrives"""
+    if telemetry["ttft_seconds"] is None:
+        telemetry["ttft_seconds"] = time.perf_counter() - telemetry["started"]
+
+
+def count_requests(collection):
+    """Number of requests in a Postman collection, including those nested in folders"""
+    count = 0
+    stack = list(collection.get("item", [])) if isinstance(collection, dict) else []
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, dict):
+            continue
+        if "request" in item:
+            count += 1
+        stack.extend(item.get("item", []))
+    return count
+
+
+def estimate_cost(usage, model, batch=False):
+    """Estimated USD cost of the token counts in usage"""
+    pricing = MODEL_PRICING.get(model)
+    if pricing is None or not usage:
+        return 0.0
+    cost = sum(usage.get(key, 0) * price for key, price in pricing.items()) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def finish_endpoint_telemetry(telemetry, result, model):
+    """
+    Completes an endpoint's telemetry record from its status dict and attaches it to the
+    result under "telemetry". model is used for the cost unless the record names the model
+    that served it. Returns the result.
+    """
+    record = {key: value for key, value in telemetry.items() if key != "started"}
+    latency = time.perf_counter() - telemetry["started"]
+    usage = result.get("usage") or {}
+    output_tokens = usage.get("output_tokens", 0)
+    generation_seconds = latency - (record["ttft_seconds"] or 0)
+    record.update({
+        "status": result["status"],
+        "cached": result.get("cached", False),
+        "truncated": result.get("truncated", False),
+        "latency_seconds": round(latency, 4),
+        "ttft_seconds": round(record["ttft_seconds"], 4) if record["ttft_seconds"] is not None else None,
+        "parse_seconds": round(record["parse_seconds"], 4),
+        "output_tokens_per_second": (round(output_tokens / generation_seconds, 1)
+                                     if output_tokens and generation_seconds > 0 else None),
+        "item_count": result.get("item_count", 0),
+        "usage": usage,
+        "model": record["model"] or model,
+        "cost_usd": round(estimate_cost(usage, record["model"] or model, record["mode"] == "batch"), 6)
+    })
+    result["telemetry"] = record
+    return result
+
+
+def add_earlier_attempts(result, earlier, started):
+    """
+    Folds the telemetry record of an endpoint's earlier attempts into the record of its latest
+    attempt, so requests, tokens and cost cover every attempt and latency counts from started,
+    the time of the first attempt. Returns the result.
+    """
+    record = result.get("telemetry")
+    if record is None:
+        return result
+    record["latency_seconds"] = round(time.perf_counter() - started, 4)
+    if earlier is None:
+        return result
+    for key in ("requests", "continuations"):
+        record[key] += earlier[key]
+    record["parse_seconds"] = round(record["parse_seconds"] + earlier["parse_seconds"], 4)
+    record["usage"] = {key: record["usage"].get(key, 0) + earlier["usage"].get(key, 0)
+                       for key in record["usage"].keys() | earlier["usage"].keys()}
+    record["cost_usd"] = round(record["cost_usd"] + earlier["cost_usd"], 6)
+    result["usage"] = record["usage"]
+    return result
+
+
+def write_telemetry(records, telemetry_file=TELEMETRY_FILE):
+    """Append one JSON line per endpoint record, tagged with a shared run ID and timestamp"""
+    run_id = uuid.uuid4().hex[:12]
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+    Path(telemetry_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(telemetry_file, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(dict(record, run_id=run_id, timestamp=timestamp)) + "\n")
+    return run_id
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values, or None if there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarise_telemetry(records, slowest=5):
+    """
+    Summary of a run's endpoint records: latency and time to first token percentiles over the
+    endpoints that called the LLM, the slowest endpoints, token totals and estimated cost.
+    """
+    generated = [r for r in records if not r.get("cached")]
+    latencies = [r["latency_seconds"] for r in generated]
+    ttfts = [r["ttft_seconds"] for r in generated if r.get("ttft_seconds") is not None]
+    totals = {}
+    backends = {}
+    for record in records:
+        for key, value in (record.get("usage") or {}).items():
+            totals[key] = totals.get(key, 0) + value
+        if record.get("backend"):
+            backends[record["backend"]] = backends.get(record["backend"], 0) + 1
+    return {
+        "endpoints": len(records),
+        "cached": len(records) - len(generated),
+        "failed": sum(1 for r in records if r["status"] != "success"),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "ttft_p50": percentile(ttfts, 0.5),
+        "ttft_p95": percentile(ttfts, 0.95),
+        "parse_seconds": round(sum(r.get("parse_seconds", 0) for r in records), 4),
+        "continuations": sum(r.get("continuations", 0) for r in records),
+        "retries": sum(r.get("retries", 0) for r in records),
+        "items": sum(r.get("item_count", 0) for r in records),
+        "tokens": totals,
+        "cost_usd": round(sum(r.get("cost_usd", 0) for r in records), 4),
+        "backends": backends,
+        "slowest": [(r["endpoint"], r["latency_seconds"])
+                    for r in sorted(generated, key=lambda r: r["latency_seconds"], reverse=True)[:slowest]]
+    }
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def print_run_report(summary):
+    """Print a run summary produced by summarise_telemetry"""
+    print(f"Endpoints: {summary['endpoints']} ({summary['cached']} from cache, {summary['failed']} failed, "
+          f"{summary.get('retries', 0)} retries), {summary['items']} requests generated")
+    print(f"Latency p50 {format_seconds(summary['latency_p50'])}, p95 {format_seconds(summary['latency_p95'])}; "
+          f"time to first token p50 {format_seconds(summary['ttft_p50'])}, p95 {format_seconds(summary['ttft_p95'])}")
+    print(f"Parsing: {summary['parse_seconds']:.2f}s total, {summary['continuations']} continuation requests")
+    tokens = summary['tokens']
+    print(f"Tokens: {tokens.get('input_tokens', 0)} input, {tokens.get('cache_read_input_tokens', 0)} cache read, "
+          f"{tokens.get('cache_creation_input_tokens', 0)} cache write, {tokens.get('output_tokens', 0)} output; "
+          f"estimated cost ${summary['cost_usd']:.4f}")
+    if summary['endpoints'] - summary['cached'] > 1 and tokens.get('input_tokens') \
+            and not tokens.get('cache_read_input_tokens') and not tokens.get('cache_creation_input_tokens'):
+        print("Warning: no prompt cache reads or writes, the shared system prompt may be shorter than the "
+              "model's minimum cacheable length (MIN_CACHEABLE_TOKENS)")
+    if summary.get('backends'):
+        print("Endpoints per backend: " + ", ".join(f"{name} {count}" for name, count in sorted(summary['backends'].items())))
+    if summary['slowest']:
+        print("Slowest endpoints:")
+        for endpoint, latency in summary['slowest']:
+            print(f"  {endpoint}: {latency:.2f}s")
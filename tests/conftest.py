@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# The pipeline's modules live at the top level of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Some modules create API clients on import; no test makes an API call
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
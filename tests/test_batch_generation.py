@@ -0,0 +1,79 @@
+import io
+import asyncio
+import contextlib
+from pathlib import Path
+import anthropic
+import pytest
+from fake_llm_server import start_fake_llm_server
+from reference_resolver import process_all_endpoints
+from spec_loader import load_spec
+from postman_generation_agent import generate_postman_collection_async
+from batch_generation import submit_batch, generate_postman_collections_batch, load_batch_state
+
+SPEC_FILE = Path(__file__).resolve().parent.parent / "input_data" / "tfl_original.yaml"
+ENDPOINTS = ["get_BikePoint_Search.json", "get_Journey_JourneyResults_from_to_to.json", "get_Line_Meta_Modes.json"]
+
+
+@pytest.fixture
+def endpoint_files(tmp_path, monkeypatch):
+    # The LLM cache, batch state and collections are all written under the working directory
+    monkeypatch.chdir(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_all_endpoints(load_spec(SPEC_FILE, None), SPEC_FILE.parent, "endpoint_specs", workers=1,
+                              spec_file=SPEC_FILE)
+    return [f"endpoint_specs/{name}" for name in ENDPOINTS]
+
+
+@pytest.fixture
+def server():
+    server = start_fake_llm_server()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(server):
+    return anthropic.Anthropic(api_key="test", base_url=server.base_url, max_retries=0)
+
+
+def run_batch(client, files, cache_mode="use"):
+    return generate_postman_collections_batch(client, files, cache_mode, poll_interval=0)
+
+
+def test_submits_polls_and_collects(client, server, endpoint_files):
+    results = run_batch(client, endpoint_files)
+
+    assert set(results) == set(endpoint_files)
+    assert all(result["status"] == "success" and not result.get("cached") for result in results.values())
+    assert len(server.batches) == 1
+    assert load_batch_state() is None
+
+    # Collections are cached, so the same run again submits nothing
+    results = run_batch(client, endpoint_files)
+    assert all(result.get("cached") for result in results.values())
+    assert len(server.batches) == 1
+
+
+def test_resumes_a_submitted_batch(client, server, endpoint_files):
+    state, cached = submit_batch(client, endpoint_files)
+    assert cached == {} and load_batch_state()["batch_id"] == state["batch_id"]
+
+    results = run_batch(client, endpoint_files)
+
+    assert len(server.batches) == 1
+    assert all(result["status"] == "success" for result in results.values())
+    assert load_batch_state() is None
+
+
+def test_resume_honours_the_cache_mode(client, server, endpoint_files):
+    cached_file = endpoint_files[0]
+    async_client = anthropic.AsyncAnthropic(api_key="test", base_url=server.base_url, max_retries=0)
+    assert asyncio.run(generate_postman_collection_async(async_client, cached_file, "use"))["status"] == "success"
+    state, cached = submit_batch(client, endpoint_files)
+    assert list(cached) == [cached_file]
+
+    # The resumed run refreshes the cache, so the endpoint served from it is submitted again
+    results = run_batch(client, endpoint_files, cache_mode="refresh")
+
+    assert len(server.batches) == 2
+    assert all(result["status"] == "success" and not result.get("cached") for result in results.values())
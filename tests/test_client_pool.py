@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+import anthropic
+import httpx
+import pytest
+import client_pool
+from client_pool import Backend, ClientPool
+from rate_limiter import RateLimiter
+
+REQUEST = {"max_tokens": 100, "system": [{"type": "text", "text": "system prompt"}],
+           "messages": [{"role": "user", "content": "generate a collection"}]}
+
+
+def api_error(error_class, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "http://llm"))
+    return error_class("failed", response=response, body=None)
+
+
+class FakeStream:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        self.text_stream = None
+
+    async def get_final_message(self):
+        return SimpleNamespace(usage=SimpleNamespace(input_tokens=10, output_tokens=50,
+                                                     cache_creation_input_tokens=0, cache_read_input_tokens=0))
+
+
+class FakeManager:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    async def __aenter__(self):
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return self.outcome
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def backend(name, *outcomes, limiter=None):
+    """A backend whose successive streams open with the given outcomes (a FakeStream or an error)"""
+    outcomes = list(outcomes)
+    client = SimpleNamespace(messages=SimpleNamespace(stream=lambda **request: FakeManager(outcomes.pop(0))))
+    return Backend(name, "anthropic", client, "model", limiter or RateLimiter(600, 100000, 100000))
+
+
+def open_stream(pool):
+    async def run():
+        async with pool.messages.stream(**REQUEST) as stream:
+            await stream.get_final_message()
+            return stream.backend_name
+    return asyncio.run(run())
+
+
+def test_fails_over_to_the_next_backend_and_cools_the_busy_one_down():
+    busy = backend("busy", api_error(anthropic.RateLimitError, 429, {"retry-after": "30"}))
+    spare = backend("spare", FakeStream())
+    # The busy backend has the most headroom, so it is tried first
+    spare.limiter.admit(spare.limiter.cost(5000))
+    pool = ClientPool([busy, spare])
+
+    assert open_stream(pool) == "spare"
+    assert busy.failures == 1 and busy.cooldown_until > 0
+    assert (busy.served, spare.served) == (0, 1)
+
+
+def test_a_request_fails_once_every_backend_has_failed_twice(monkeypatch):
+    monkeypatch.setattr(client_pool, "RETRY_BASE_SECONDS", 0)
+    errors = [api_error(anthropic.InternalServerError, 529) for _ in range(4)]
+    pool = ClientPool([backend("a", *errors[:2]), backend("b", *errors[2:])])
+
+    with pytest.raises(anthropic.InternalServerError):
+        open_stream(pool)
+    assert [b.failures for b in pool.backends] == [2, 2]
+
+
+@pytest.mark.parametrize("error", [
+    api_error(anthropic.BadRequestError, 400),
+    api_error(anthropic.RateLimitError, 429),
+    asyncio.CancelledError(),
+])
+def test_a_stream_that_fails_to_open_gives_its_reservation_back(error):
+    failing = backend("failing", error, error)
+    pool = ClientPool([failing])
+    pool.cool_down = lambda b, e: None
+    buckets = failing.limiter.buckets
+    before = {name: bucket.available() for name, bucket in buckets.items()}
+
+    async def run():
+        try:
+            async with pool.messages.stream(**REQUEST):
+                pass
+        except BaseException:
+            pass
+    asyncio.run(run())
+
+    # Only the request counts; the tokens reserved for the failed attempt are back
+    assert buckets["input_tokens"].available() == pytest.approx(before["input_tokens"], abs=1)
+    assert buckets["output_tokens"].available() == pytest.approx(before["output_tokens"], abs=1)
+
+
+def test_settles_the_reservation_against_actual_usage():
+    served = backend("served", FakeStream())
+    pool = ClientPool([served])
+    output = served.limiter.buckets["output_tokens"]
+
+    open_stream(pool)
+
+    assert output.capacity - output.available() == pytest.approx(50, abs=1)
+
+
+def test_acquire_picks_the_backend_with_most_headroom():
+    backends = [backend(name) for name in ("a", "b", "c")]
+    backends[0].limiter.admit(backends[0].limiter.cost(50000))
+    backends[2].limiter.admit(backends[2].limiter.cost(20000))
+    pool = ClientPool(backends)
+
+    chosen, cost = asyncio.run(pool.acquire(1000))
+
+    assert chosen.name == "b" and cost["input_tokens"] == 1000
+    assert backends[1].limiter.buckets["input_tokens"].available() == pytest.approx(99000, abs=1)
+
+
+def test_acquire_skips_backends_cooling_down_and_waits_for_room():
+    cooling, full = backend("cooling"), backend("full", limiter=RateLimiter(600, None, None))
+    cooling.cooldown_until = float("inf")
+    # No requests left; one refills every 0.1s
+    full.limiter.buckets["requests"].consume(600)
+    pool = ClientPool([cooling, full])
+
+    async def timed():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        chosen, _ = await pool.acquire(1000)
+        return chosen, loop.time() - started
+    chosen, waited = asyncio.run(timed())
+
+    assert chosen is full and 0.05 <= waited < 1
+
+
+def test_limits_are_not_enforced_until_headers_report_them():
+    limiter = RateLimiter()
+    for _ in range(1000):
+        assert limiter.seconds_until(limiter.cost(100000)) == 0
+        limiter.admit(limiter.cost(100000))
+    assert limiter.limits() == {"requests": None, "input_tokens": None, "output_tokens": None}
+
+    limiter.update_from_headers({"anthropic-ratelimit-requests-limit": "50", "anthropic-ratelimit-requests-remaining": "0"})
+    assert limiter.limits()["requests"] == 50
+    assert limiter.seconds_until(limiter.cost(1)) > 0
@@ -0,0 +1,131 @@
+import json
+import pytest
+from collection_merger import (
+    merge_postman_collections, upsert_collection_folder, folder_name, index_filename, load_merge_index,
+    splice_file, recover_spliced_file, journal_filename
+)
+import collection_merger
+from incremental import collection_filename
+
+# get_BikePoint_Search sorts before get_BikePoint_collection but after get_BikePoint
+NAMES = ["get_BikePoint", "get_BikePoint_Search", "get_Line_Status"]
+
+
+@pytest.fixture
+def collections(tmp_path):
+    for i, name in enumerate(NAMES):
+        collection = {"info": {"name": name},
+                      "item": [{"name": f"test {i}", "request": {"method": "GET", "url": f"{{{{base_url}}}}/{i}"}}]}
+        with open(collection_filename(name, tmp_path), 'w', encoding='utf-8') as f:
+            json.dump(collection, f)
+    return tmp_path
+
+
+def merged_in_order(directory, names, output_file):
+    files = sorted((collection_filename(name, directory) for name in names), key=folder_name)
+    merge_postman_collections(files, output_file, dedupe="off")
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("added", NAMES)
+def test_upsert_of_a_new_folder_matches_a_full_merge(collections, added):
+    full, upserted = collections / "full.json", collections / "upserted.json"
+    merged_in_order(collections, NAMES, full)
+    merged_in_order(collections, [name for name in NAMES if name != added], upserted)
+
+    assert upsert_collection_folder(collection_filename(added, collections), upserted, dedupe="off")
+    assert read_bytes(upserted) == read_bytes(full)
+    assert load_merge_index(upserted)["folders"] == load_merge_index(full)["folders"]
+    assert not (collections / "upserted.json.tmp").exists()
+    assert not (collections / "upserted.json.journal").exists()
+
+
+def test_upsert_replaces_a_folder_in_place(collections):
+    output_file = collections / "merged.json"
+    merged_in_order(collections, NAMES, output_file)
+    replaced = {"item": [{"name": "new test", "request": {"method": "GET", "url": "x"}}] * 3}
+
+    path = collection_filename("get_BikePoint_Search", collections)
+    assert upsert_collection_folder((path, replaced), output_file, dedupe="off")
+
+    merged = json.loads(read_bytes(output_file))
+    assert [folder["name"] for folder in merged["item"]] == sorted(folder_name(collection_filename(name))
+                                                                   for name in NAMES)
+    assert merged["item"][0]["item"] == replaced["item"]
+    # The index still points at every folder after the one that grew
+    for name, start, end in load_merge_index(output_file)["folders"]:
+        assert json.loads(read_bytes(output_file)[start:end])["name"] == name
+
+
+def test_upsert_without_an_index_rewrites_in_the_same_order(collections):
+    full, upserted = collections / "full.json", collections / "upserted.json"
+    merged_in_order(collections, NAMES, full)
+    merged_in_order(collections, NAMES[1:], upserted)
+    (collections / index_filename("upserted.json")).unlink()
+
+    assert upsert_collection_folder(collection_filename(NAMES[0], collections), upserted, dedupe="off")
+    assert read_bytes(upserted) == read_bytes(full)
+
+
+@pytest.mark.parametrize("start, end, replacement", [
+    (0, 0, b"head "), (4, 9, b""), (4, 9, b"a much longer middle"), (20, 26, b"!"), (26, 26, b" tail"),
+])
+def test_splice_file(tmp_path, start, end, replacement):
+    path = tmp_path / "file"
+    original = b"0123456789abcdefghijklmnop"
+    path.write_bytes(original)
+
+    splice_file(path, start, end, replacement)
+
+    assert path.read_bytes() == original[:start] + replacement + original[end:]
+    assert not (tmp_path / "file.journal").exists()
+
+
+def test_interrupted_splice_is_rolled_back(tmp_path, monkeypatch):
+    path = tmp_path / "file"
+    original = b"0123456789" * 1000
+    path.write_bytes(original)
+
+    # Fail once the file has been partly rewritten, after the journal is on disk
+    real_fsync = collection_merger.os.fsync
+    calls = []
+
+    def failing_fsync(fd):
+        calls.append(fd)
+        if len(calls) == 2:
+            with open(path, 'r+b') as f:
+                f.truncate(5000)
+            raise OSError("disk went away")
+        real_fsync(fd)
+
+    monkeypatch.setattr(collection_merger.os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        splice_file(path, 4000, 4010, b"x" * 50)
+    monkeypatch.setattr(collection_merger.os, "fsync", real_fsync)
+
+    assert path.read_bytes() != original
+    assert recover_spliced_file(path)
+    assert path.read_bytes() == original
+    assert not recover_spliced_file(path)
+
+
+def test_upsert_after_an_interrupted_splice_matches_a_full_merge(collections):
+    full, upserted = collections / "full.json", collections / "upserted.json"
+    merged_in_order(collections, NAMES, full)
+    merged_in_order(collections, NAMES[:-1], upserted)
+    original = read_bytes(upserted)
+    # A journal as left by a splice that crashed after rewriting the file from byte 100
+    with open(journal_filename(upserted), 'wb') as f:
+        f.write(json.dumps({"start": 100, "size": len(original)}).encode() + b"\n" + original[100:])
+    with open(upserted, 'r+b') as f:
+        f.seek(100)
+        f.write(b"garbage")
+        f.truncate()
+
+    assert upsert_collection_folder(collection_filename(NAMES[-1], collections), upserted, dedupe="off")
+    assert read_bytes(upserted) == read_bytes(full)
+    assert not (collections / "upserted.json.journal").exists()
@@ -0,0 +1,92 @@
+import json
+import asyncio
+import xml.etree.ElementTree as ET
+import pytest
+from collection_runner import run_collection, summarise_results, write_json_results, write_junit_results
+from edge_case_generator import generate_edge_case_items, status_test_event
+from mock_api_server import start_mock_api_server
+from reference_resolver import extract_endpoint_info, iter_operations
+
+SPEC = {
+    "openapi": "3.0.1",
+    "info": {"title": "StopPoint", "version": "1"},
+    "paths": {
+        "/StopPoint/Search/{query}": {"get": {
+            "parameters": [
+                {"name": "query", "in": "path", "required": True, "schema": {"type": "string"},
+                 "description": "A place name, which may need disambiguation."},
+                {"name": "maxResults", "in": "query", "schema": {"type": "integer", "minimum": 1, "maximum": 50}},
+                {"name": "modes", "in": "query", "schema": {"type": "array", "items": {"type": "string",
+                                                                                       "enum": ["bus", "tube"]}}},
+            ],
+            "responses": {"200": {"description": "OK"}},
+        }},
+        "/StopPoint/{id}/Arrivals": {"get": {
+            "parameters": [
+                {"name": "id", "in": "path", "required": True, "schema": {"type": "string"}, "example": "940GZZLUWLO"},
+                {"name": "date", "in": "query", "schema": {"type": "string", "format": "date"}},
+                {"name": "live", "in": "query", "schema": {"type": "boolean"}},
+            ],
+            "responses": {"200": {"description": "OK"}},
+        }},
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = start_mock_api_server(SPEC)
+    yield server
+    server.shutdown()
+
+
+def generated_collection():
+    """The locally generated tests of every operation, one folder per operation"""
+    folders = []
+    for endpoint_path, method in iter_operations(SPEC):
+        positive, edge = generate_edge_case_items(extract_endpoint_info(SPEC, endpoint_path, method))
+        folders.append({"name": endpoint_path, "item": [{"name": "Positive Tests", "item": positive},
+                                                        {"name": "Edge Tests", "item": edge}]})
+    return {"item": folders, "variable": [{"key": "base_url", "value": "http://unused"}, {"key": "app_key", "value": ""}]}
+
+
+def test_generated_tests_pass_against_the_mock(server):
+    collection = generated_collection()
+    results = asyncio.run(run_collection(collection, {"base_url": server.base_url}, concurrency=8))
+
+    summary = summarise_results(results, 1.0)
+    assert summary["requests"] > 20 and summary["errors"] == 0
+    assert summary["assertions_failed"] == 0, [r for r in results if r["assertions"][0]["passed"] is False]
+    assert summary["assertions_passed"] == summary["requests"]
+    # The free-text search term needs disambiguation, so its valid requests accept 300
+    assert {r["status"] for r in results if r["folder"].startswith("/StopPoint/Search")} >= {300, 400}
+    assert all(r["url"].startswith(server.base_url) for r in results)
+
+
+def test_failures_skips_and_errors_are_reported(server, tmp_path):
+    items = [
+        {"name": "wrong status", "request": {"method": "GET", "url": "{{base_url}}/StopPoint/x/Arrivals"},
+         "event": status_test_event(404)},
+        {"name": "no status check", "request": "{{base_url}}/StopPoint/x/Arrivals",
+         "event": [{"listen": "test", "script": {"exec": ["pm.test('has body', () => {});"]}}]},
+        {"name": "unreachable", "request": {"method": "GET", "url": "http://127.0.0.1:1/x"},
+         "event": status_test_event(200)},
+    ]
+    collection = {"item": [{"name": "Checks", "item": items}], "variable": [{"key": "base_url", "value": server.base_url}]}
+    results = asyncio.run(run_collection(collection, rate_limit=100, timeout=5))
+
+    assert [r["status"] for r in results] == [200, 200, None]
+    assert results[0]["assertions"] == [{"name": "Status code is 404", "passed": False,
+                                         "message": "Expected status 404, got 200"}]
+    assert results[1]["assertions"][0]["passed"] is None
+    assert results[2]["error"] and results[2]["assertions"][0]["message"] == "No response"
+
+    summary = summarise_results(results, 1.0)
+    assert (summary["failed_requests"], summary["errors"], summary["assertions_skipped"]) == (2, 1, 1)
+
+    write_json_results(results, summary, tmp_path / "results.json")
+    assert json.loads((tmp_path / "results.json").read_text())["summary"] == summary
+    write_junit_results(results, tmp_path / "results.xml")
+    suite = ET.parse(tmp_path / "results.xml").getroot().find("testsuite")
+    assert suite.get("name") == "Checks"
+    assert (suite.get("tests"), suite.get("failures"), suite.get("errors"), suite.get("skipped")) == ("3", "1", "1", "1")
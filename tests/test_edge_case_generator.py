@@ -0,0 +1,139 @@
+import pytest
+from edge_case_generator import (
+    parameter_edge_cases, is_valid_value, build_request_item, merge_generated_items, generate_edge_case_items,
+    SPECIAL_CHARACTERS_VALUE, WHITESPACE_VALUE, INVALID_VALUE, INVALID_FORMAT_VALUES, FAILURE_STATUSES
+)
+
+
+def param(schema, name="p", location="query", **extra):
+    return {"name": name, "in": location, "schema": schema, **extra}
+
+
+def case_values(parameter):
+    return dict((value, name) for name, value in parameter_edge_cases(parameter))
+
+
+def test_string_edge_cases():
+    cases = case_values(param({"type": "string"}))
+
+    assert set(cases) == {'', 'null', SPECIAL_CHARACTERS_VALUE, WHITESPACE_VALUE}
+    assert cases[''] == "Empty p parameter"
+
+
+def test_enum_string_gets_invalid_value_instead_of_free_text_cases():
+    cases = case_values(param({"type": "string", "enum": ["a", "b"]}))
+
+    assert set(cases) == {'', 'null', INVALID_VALUE}
+
+
+def test_integer_edge_cases_use_minimum_and_maximum():
+    cases = case_values(param({"type": "integer", "minimum": 1, "maximum": 10}))
+
+    assert set(cases) == {'', 'null', '-1', '1.5', '11', '0'}
+    assert cases['11'] == "p above maximum" and cases['0'] == "p below minimum"
+
+
+def test_integer_bounds_fall_back_to_the_format_and_respect_exclusive_limits():
+    int32 = case_values(param({"type": "integer", "format": "int32"}))
+    assert str(2**31) in int32 and str(-2**31 - 1) in int32
+
+    exclusive = case_values(param({"type": "integer", "minimum": 0, "maximum": 5,
+                                   "exclusiveMinimum": True, "exclusiveMaximum": True}))
+    assert '5' in exclusive and '0' in exclusive
+
+
+def test_number_edge_cases_have_no_decimal_case():
+    cases = case_values(param({"type": "number"}))
+
+    assert set(cases) == {'', 'null', '-1'}
+
+
+def test_boolean_and_array_edge_cases():
+    assert set(case_values(param({"type": "boolean"}))) == {'', 'null', INVALID_VALUE}
+
+    cases = case_values(param({"type": "array", "items": {"type": "string", "enum": ["x"]}}))
+    assert cases[''] == "Empty p array"
+    assert set(cases) == {'', 'null', INVALID_VALUE}
+
+
+@pytest.mark.parametrize("value_format", sorted(INVALID_FORMAT_VALUES))
+def test_invalid_format_case_for_each_format(value_format):
+    cases = case_values(param({"type": "string", "format": value_format}))
+
+    assert cases[INVALID_FORMAT_VALUES[value_format]] == f"Invalid {value_format} format for p"
+
+
+@pytest.mark.parametrize("schema, valid, invalid", [
+    ({"type": "string"}, ["abc", "null"], ["", "   "]),
+    ({"type": "string", "enum": ["a", 1, True]}, ["a", "1", "true"], ["b", "True"]),
+    ({"type": "integer", "minimum": 1, "maximum": 10}, ["1", "10"], ["0", "11", "1.5", "abc", "null"]),
+    ({"type": "integer", "format": "int32"}, [str(2**31 - 1), "-1"], [str(2**31)]),
+    ({"type": "integer", "minimum": 0, "exclusiveMinimum": True}, ["1"], ["0"]),
+    ({"type": "number", "maximum": 1.5}, ["1.5", "-3", "1e0"], ["1.6", "x"]),
+    ({"type": "boolean"}, ["true", "False"], ["yes", "1"]),
+    ({"type": "string", "minLength": 2, "maxLength": 3}, ["ab", "abc"], ["a", "abcd"]),
+    ({"type": "string", "pattern": "^[A-Z]+$"}, ["ABC"], ["abc"]),
+    ({"type": "string", "format": "email"}, ["a@b.co"], ["not-an-email"]),
+    ({"type": "string", "format": "date"}, ["2024-01-31"], ["not-a-date", "2024-01-31T00:00"]),
+    ({"type": "string", "format": "date-time"}, ["2024-01-01T00:00:00Z", "2024-01-01T10:00+01:00"], ["2024-01-01"]),
+    ({"type": "string", "format": "uri"}, ["https://example.com/x"], ["not a url"]),
+    ({"type": "string", "format": "uuid"}, ["123e4567-e89b-12d3-a456-426614174000"], ["not-a-uuid"]),
+    ({"type": "array", "items": {"type": "integer"}}, ["1,2,3"], ["1,x", ""]),
+    ({"type": "array", "items": {"type": "string", "enum": ["a", "b"]}}, ["a,b"], ["a,c"]),
+])
+def test_is_valid_value(schema, valid, invalid):
+    parameter = param(schema)
+
+    assert all(is_valid_value(parameter, value) for value in valid)
+    assert not any(is_valid_value(parameter, value) for value in invalid)
+
+
+def test_build_request_item_fills_path_query_and_headers():
+    parameters = [param({"type": "string"}, "id", "path"), param({"type": "string"}, "q"),
+                  param({"type": "string"}, "X-Trace", "header")]
+    item = build_request_item("Search", "get", "/Line/{id}/Search", {"id": "a b", "q": "x&y,z", "X-Trace": "1"},
+                              parameters, 200)
+
+    request = item["request"]
+    assert item["name"] == "Search" and request["method"] == "GET"
+    assert request["url"]["path"] == ["Line", "a b", "Search"]
+    assert request["url"]["raw"] == "{{base_url}}/Line/a%20b/Search?app_key={{app_key}}&q=x%26y,z"
+    assert request["url"]["query"] == [{"key": "app_key", "value": "{{app_key}}"}, {"key": "q", "value": "x&y,z"}]
+    assert request["header"] == [{"key": "X-Trace", "value": "1"}]
+    assert "    pm.response.to.have.status(200);" in item["event"][0]["script"]["exec"]
+
+
+def test_build_request_item_leaves_out_unset_parameters_and_accepts_several_statuses():
+    parameters = [param({"type": "string"}, "id", "path"), param({"type": "string"}, "q")]
+    item = build_request_item("Empty id", "post", "/Line/{id}", {"id": ""}, parameters, FAILURE_STATUSES)
+
+    assert item["request"]["url"]["raw"] == "{{base_url}}/Line/?app_key={{app_key}}"
+    assert "    pm.expect(pm.response.code).to.be.oneOf([400, 404]);" in item["event"][0]["script"]["exec"]
+
+
+def test_generate_edge_case_items_expects_status_by_validity():
+    spec = {"paths": {"/Line/{id}": {"get": {"parameters": [
+        param({"type": "string"}, "id", "path", required=True),
+        param({"type": "string", "enum": ["bus", "tube"]}, "mode"),
+    ]}}}}
+    positive, edge = generate_edge_case_items(spec)
+
+    assert [item["name"] for item in positive] == ["mode - bus", "mode - tube"]
+    statuses = {item["name"]: item["event"][0]["script"]["exec"][1] for item in edge}
+    assert "status(200)" in statuses["Null id parameter"]
+    assert "oneOf([400, 404])" in statuses["Invalid enum value for mode"]
+
+
+def test_merge_generated_items_uses_existing_folders_and_skips_duplicate_names():
+    collection = {"item": [{"name": "Positive Tests", "item": [{"name": "mode - bus"}]}]}
+    merged = merge_generated_items(collection, [{"name": "mode - bus"}, {"name": "mode - tube"}],
+                                   [{"name": "Empty id parameter"}])
+
+    assert merged["item"] == [
+        {"name": "Positive Tests", "item": [{"name": "mode - bus"}, {"name": "mode - tube"}]},
+        {"name": "Edge Tests", "item": [{"name": "Empty id parameter"}]},
+    ]
+
+
+def test_merge_generated_items_adds_nothing_when_there_is_nothing_generated():
+    assert merge_generated_items({}, [], []) == {"item": []}
@@ -0,0 +1,48 @@
+from incremental import collection_filename, plan_incremental_run
+
+PREVIOUS = {"get_BikePoint": "a", "get_BikePoint_Search": "b", "get_Line_Status": "c", "get_Removed": "d"}
+CURRENT = {"get_BikePoint": "a", "get_BikePoint_Search": "b2", "get_Line_Status": "c", "get_Added": "e"}
+
+
+def write_collections(directory, names):
+    for name in names:
+        with open(collection_filename(name, directory), 'w', encoding='utf-8') as f:
+            f.write('{"item": []}')
+
+
+def test_reuses_unchanged_endpoints_with_a_collection(tmp_path):
+    write_collections(tmp_path, PREVIOUS)
+
+    regenerate, reused, diff = plan_incremental_run(PREVIOUS, CURRENT, False, tmp_path)
+
+    assert regenerate == ["get_Added", "get_BikePoint_Search"]
+    assert reused == ["get_BikePoint", "get_Line_Status"]
+    assert diff == {"added": ["get_Added"], "removed": ["get_Removed"],
+                    "changed": ["get_BikePoint_Search"], "unchanged": ["get_BikePoint", "get_Line_Status"]}
+
+
+def test_regenerates_an_unchanged_endpoint_whose_collection_is_missing(tmp_path):
+    write_collections(tmp_path, ["get_BikePoint"])
+
+    regenerate, reused, _ = plan_incremental_run(PREVIOUS, CURRENT, False, tmp_path)
+
+    assert reused == ["get_BikePoint"]
+    assert "get_Line_Status" in regenerate
+
+
+def test_changed_requirements_document_regenerates_everything(tmp_path):
+    write_collections(tmp_path, PREVIOUS)
+
+    regenerate, reused, _ = plan_incremental_run(PREVIOUS, CURRENT, True, tmp_path)
+
+    assert regenerate == sorted(CURRENT)
+    assert reused == []
+
+
+def test_changed_requirements_sections_regenerate_only_their_endpoints(tmp_path):
+    write_collections(tmp_path, PREVIOUS)
+
+    regenerate, reused, _ = plan_incremental_run(PREVIOUS, CURRENT, {"get_Line_Status"}, tmp_path)
+
+    assert regenerate == ["get_Added", "get_BikePoint_Search", "get_Line_Status"]
+    assert reused == ["get_BikePoint"]
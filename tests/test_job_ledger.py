@@ -0,0 +1,90 @@
+import json
+import pytest
+from job_ledger import (
+    open_ledger, job_key, start_job, mark_in_flight, record_result, record_existing_collection,
+    completed_endpoints, ledger_summary, DONE, PENDING
+)
+
+FINGERPRINTS = {name: f"fp-{name}" for name in ("a", "b", "c", "d", "e", "f")}
+KEY = job_key(FINGERPRINTS, "requirements")
+
+
+@pytest.fixture
+def ledger_file(tmp_path):
+    return tmp_path / "ledger.sqlite"
+
+
+def save_collection(tmp_path, name):
+    """Writes a collection the way save_postman_collection_to_file does, returning its status dict"""
+    collection = {"info": {"name": name}, "item": []}
+    path = tmp_path / f"{name}_collection.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(collection, f, indent=2)
+    return {"status": "success", "output_file": str(path), "collection": collection, "message": "ok"}
+
+
+def states(conn):
+    return {r["name"]: r["state"] for r in conn.execute("SELECT name, state FROM endpoints")}
+
+
+def interrupted_run(tmp_path, ledger_file):
+    """A run that recorded a few results and died, returning the status dicts of the done ones"""
+    conn = open_ledger(ledger_file)
+    assert start_job(conn, KEY, FINGERPRINTS) == set()
+    results = {name: save_collection(tmp_path, name) for name in ("a", "b", "c")}
+    for name, result in results.items():
+        mark_in_flight(conn, name)
+        record_result(conn, name, result)
+    mark_in_flight(conn, "d")
+    mark_in_flight(conn, "e")
+    record_result(conn, "e", {"status": "error", "message": "overloaded"})
+    # Generated but only kept in memory, so a resumed run can't reuse it
+    record_result(conn, "f", {"status": "success", "output_file": None, "collection": {}, "message": "ok"})
+    conn.close()
+    return results
+
+
+def test_resume_keeps_done_endpoints_whose_file_is_unchanged(tmp_path, ledger_file):
+    results = interrupted_run(tmp_path, ledger_file)
+    with open(results["b"]["output_file"], 'a', encoding='utf-8') as f:
+        f.write("\n")
+    (tmp_path / "c_collection.json").unlink()
+
+    conn = open_ledger(ledger_file)
+    assert start_job(conn, KEY, FINGERPRINTS) == {"a"}
+    assert states(conn) == {"a": DONE, "b": PENDING, "c": PENDING, "d": PENDING, "e": PENDING, "f": PENDING}
+    assert completed_endpoints(conn) == {"a": results["a"]["output_file"]}
+    # Attempts made before the crash are still counted
+    assert ledger_summary(conn)["attempts"] == 5
+
+
+def test_a_different_job_starts_from_scratch(tmp_path, ledger_file):
+    interrupted_run(tmp_path, ledger_file)
+
+    conn = open_ledger(ledger_file)
+    changed = dict(FINGERPRINTS, a="fp-a2")
+    assert start_job(conn, job_key(changed, "requirements"), changed) == set()
+    assert set(states(conn).values()) == {PENDING}
+    assert ledger_summary(conn)["attempts"] == 0
+
+
+def test_a_finished_job_is_not_resumed(tmp_path, ledger_file):
+    conn = open_ledger(ledger_file)
+    start_job(conn, KEY, FINGERPRINTS)
+    for name in FINGERPRINTS:
+        record_existing_collection(conn, name, save_collection(tmp_path, name)["output_file"])
+    assert ledger_summary(conn)["done"] == len(FINGERPRINTS)
+    conn.close()
+
+    conn = open_ledger(ledger_file)
+    assert start_job(conn, KEY, FINGERPRINTS) == set()
+    assert set(states(conn).values()) == {PENDING}
+
+
+def test_new_endpoints_are_added_as_pending_when_resuming(tmp_path, ledger_file):
+    interrupted_run(tmp_path, ledger_file)
+    conn = open_ledger(ledger_file)
+    conn.execute("DELETE FROM endpoints WHERE name = 'f'")
+
+    assert start_job(conn, KEY, FINGERPRINTS) == {"a", "b", "c"}
+    assert states(conn)["f"] == PENDING
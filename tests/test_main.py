@@ -0,0 +1,45 @@
+import queue
+import threading
+import main
+from main import collection_sources, merge_generated_collections
+from incremental import collection_filename
+
+
+def success(name):
+    return {"status": "success", "collection": {"info": {"name": name}, "item": []}}
+
+
+def test_collection_sources_follow_the_merge_order_as_results_arrive():
+    arrivals = queue.Queue()
+    sources = collection_sources(["a", "b", "c", "d"], {"b"}, arrivals)
+
+    # c finishes before a; a is yielded as soon as it arrives, while d is still generating
+    arrivals.put(("c", success("c")))
+    arrivals.put(("a", success("a")))
+    assert next(sources) == (collection_filename("a"), {"info": {"name": "a"}, "item": []})
+    assert next(sources) == collection_filename("b")
+    assert next(sources)[0] == collection_filename("c")
+
+    arrivals.put(("d", {"status": "error", "message": "failed"}))
+    arrivals.put(None)
+    assert list(sources) == []
+
+
+def test_generated_collections_are_merged_while_generation_runs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "MERGED_COLLECTION_FILE", str(tmp_path / "merged.json"))
+    monkeypatch.setattr(main, "INCREMENTAL", False)
+    arrivals = queue.Queue()
+    merger = threading.Thread(target=merge_generated_collections, args=(["get_a", "get_b"], set(), arrivals))
+    merger.start()
+
+    results = {"get_b": success("b"), "get_a": success("a")}
+    for name, result in results.items():
+        arrivals.put((name, result))
+    arrivals.put(None)
+    merger.join(timeout=10)
+
+    assert not merger.is_alive()
+    # Each collection is handed to the merger rather than kept in its result
+    assert all("collection" not in result for result in results.values())
+    assert (tmp_path / "merged.json").exists()
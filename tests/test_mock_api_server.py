@@ -0,0 +1,81 @@
+import httpx
+import pytest
+from mock_api_server import start_mock_api_server, build_routes
+
+SPEC = {
+    "openapi": "3.0.1",
+    "info": {"title": "Places", "version": "1"},
+    "paths": {
+        "/Place/Search": {"get": {
+            "parameters": [{"name": "name", "in": "query", "required": True, "schema": {"type": "string"},
+                            "description": "Free text, may return multiple matches requiring disambiguation."}],
+            "responses": {"200": {"description": "OK", "content": {"application/json": {
+                "schema": {"type": "array", "items": {"$ref": "#/components/schemas/Place"}}}}}},
+        }},
+        "/Place/Meta": {"get": {"responses": {"200": {"description": "OK"}}}},
+        "/Place/{id}": {
+            "parameters": [{"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}],
+            "get": {
+                "parameters": [{"name": "radius", "in": "query", "schema": {"type": "integer", "minimum": 1}},
+                               {"name": "type", "in": "query", "schema": {"type": "string", "enum": ["bus", "tube"]}},
+                               {"name": "X-Key", "in": "header", "required": True, "schema": {"type": "string"}}],
+                "responses": {"200": {"description": "OK", "content": {"application/json": {
+                    "schema": {"$ref": "#/components/schemas/Place"}}}}},
+            },
+        },
+    },
+    "components": {"schemas": {"Place": {"type": "object", "properties": {
+        "id": {"type": "string", "example": "HUBWAT"}, "lat": {"type": "number"},
+        "children": {"type": "array", "items": {"$ref": "#/components/schemas/Place"}},
+    }}}},
+}
+
+
+@pytest.fixture(scope="module")
+def client():
+    server = start_mock_api_server(SPEC)
+    with httpx.Client(base_url=server.base_url) as client:
+        yield client
+    server.shutdown()
+
+
+def test_literal_routes_are_matched_before_templates():
+    assert [route["path"] for route in build_routes(SPEC)][-1] == "/Place/{id}"
+
+
+@pytest.mark.parametrize("url, headers, status", [
+    ("/Place/Meta", {}, 200),
+    ("/Place/Meta/", {}, 200),
+    ("/Place/HUBWAT", {"X-Key": "k"}, 200),
+    ("/Place/HUBWAT?radius=5&type=tube", {"X-Key": "k"}, 200),
+    ("/Place/HUBWAT?type=tram", {"X-Key": "k"}, 400),
+    ("/Place/HUBWAT?radius=0", {"X-Key": "k"}, 400),
+    ("/Place/HUBWAT", {}, 400),
+    ("/Place/Search?name=Waterloo", {}, 300),
+    ("/Place/Search?name=51.50%2C-0.11", {}, 200),
+    ("/Place/Search?name=940GZZLUWLO", {}, 200),
+    ("/Place/Search", {}, 400),
+    ("/Place/Search?name=%20%20", {}, 400),
+    ("/Nowhere", {}, 404),
+])
+def test_routing_and_parameter_checks(client, url, headers, status):
+    assert client.get(url, headers=headers).status_code == status
+
+
+def test_disambiguation_response_says_which_parameter(client):
+    response = client.get("/Place/Search", params={"name": "Oxford Circus"})
+
+    assert response.status_code == 300
+    assert response.json() == {"message": "Multiple matches for name, disambiguation required"}
+
+
+def test_success_body_is_shaped_like_the_response_schema(client):
+    body = client.get("/Place/HUBWAT", headers={"X-Key": "k"}).json()
+
+    assert body["id"] == "HUBWAT" and body["lat"] == 0
+    assert body["children"][0]["id"] == "HUBWAT"
+    assert client.get("/Place/Search", params={"name": "1"}).json()[0]["id"] == "HUBWAT"
+
+
+def test_unsupported_method_gets_405(client):
+    assert client.post("/Place/Meta").status_code == 405
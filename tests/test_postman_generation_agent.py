@@ -0,0 +1,55 @@
+import json
+import pytest
+import postman_generation_agent
+from postman_generation_agent import start_collection_parser, finalise_streamed_collection, partial_items_filename
+
+COLLECTION = {
+    "info": {"name": "BikePoint"},
+    "item": [
+        {"name": "ok", "request": {"method": "GET", "url": "{{baseUrl}}/BikePoint"}},
+        {"name": "missing", "request": {"method": "GET", "url": "{{baseUrl}}/BikePoint/x"}},
+    ],
+}
+TEXT = json.dumps(COLLECTION)
+TRUNCATED = TEXT[:TEXT.index('"missing"') + 10]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(postman_generation_agent, "LOCAL_EDGE_CASES", False)
+    monkeypatch.setattr(postman_generation_agent, "WRITE_INTERMEDIATE_FILES", False)
+
+
+def streamed(text, filename="endpoint_specs/get_BikePoint.json"):
+    parser, partial_file = start_collection_parser(filename)
+    parser.feed(text)
+    return parser, partial_file, filename
+
+
+def test_complete_collection_is_saved():
+    result = finalise_streamed_collection(*streamed(TEXT), stop_reason="end_turn")
+
+    assert result["status"] == "success" and not result.get("truncated")
+    assert result["collection"] == COLLECTION
+
+
+def test_truncated_at_max_tokens_is_saved_up_to_the_last_complete_item():
+    parser, partial_file, filename = streamed(TRUNCATED)
+    result = finalise_streamed_collection(parser, partial_file, filename, stop_reason="max_tokens")
+
+    assert result["status"] == "success" and result["truncated"]
+    assert [item["name"] for item in result["collection"]["item"]] == ["ok"]
+
+
+@pytest.mark.parametrize("stop_reason", ["end_turn", "stop_sequence", None])
+def test_incomplete_for_any_other_reason_is_a_retryable_error(stop_reason):
+    parser, partial_file, filename = streamed(TRUNCATED)
+    result = finalise_streamed_collection(parser, partial_file, filename, cache_key="key", stop_reason=stop_reason)
+
+    assert result["status"] == "error" and result["retryable"]
+    assert "collection" not in result
+    # The items that did complete are kept for inspection
+    with open(partial_items_filename(filename), encoding="utf-8") as f:
+        assert [json.loads(line)["item"]["name"] for line in f] == ["ok"]
+
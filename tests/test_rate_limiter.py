@@ -0,0 +1,200 @@
+import random
+from types import SimpleNamespace
+import anthropic
+import httpx
+import openai
+import pytest
+import rate_limiter
+from rate_limiter import (
+    TokenBucket, RateLimiter, backoff_delay, is_retryable_error, retry_after_seconds, EXPECTED_OUTPUT_TOKENS
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def api_error(error_class, status, headers=None, body=None):
+    response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "http://llm"))
+    return error_class("failed", response=response, body=body)
+
+
+def test_bucket_refills_continuously_up_to_its_capacity(clock):
+    bucket = TokenBucket(600)
+    bucket.consume(600)
+    assert bucket.available() == 0
+
+    clock.now += 6
+    assert bucket.available() == pytest.approx(60)
+    clock.now += 600
+    assert bucket.available() == 600
+
+
+def test_bucket_can_be_overdrawn_and_waits_to_recover(clock):
+    bucket = TokenBucket(60)
+    bucket.consume(90)
+
+    assert bucket.available() == -30
+    assert bucket.seconds_until(10) == pytest.approx(40)
+    clock.now += 40
+    assert bucket.seconds_until(10) == 0
+
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket(clock):
+    bucket = TokenBucket(60)
+    bucket.consume(30)
+
+    assert bucket.seconds_until(1000) == pytest.approx(30)
+
+
+def test_release_gives_tokens_back_up_to_capacity(clock):
+    bucket = TokenBucket(100)
+    bucket.consume(80)
+    bucket.release(50)
+    assert bucket.available() == 70
+    bucket.release(500)
+    assert bucket.available() == 100
+
+
+def test_bucket_without_a_limit_never_waits(clock):
+    bucket = TokenBucket()
+    bucket.consume(10 ** 9)
+
+    assert bucket.available() == float('inf')
+    assert bucket.seconds_until(10 ** 9) == 0
+
+
+def test_set_limit_adopts_the_limit_and_only_lowers_remaining(clock):
+    bucket = TokenBucket(1000)
+    bucket.set_limit(600, 300)
+    assert (bucket.capacity, bucket.available()) == (600, 300)
+    assert bucket.seconds_until(400) == pytest.approx(10)
+
+    # Requests admitted since the response aren't in its remaining count, so a higher one is ignored
+    bucket.consume(200)
+    bucket.set_limit(600, 500)
+    assert bucket.available() == 100
+
+
+def test_set_limit_on_an_unknown_bucket_starts_from_remaining(clock):
+    bucket = TokenBucket()
+    bucket.set_limit(None, 50)
+    assert bucket.capacity is None
+
+    bucket.set_limit(1000, 400)
+    assert (bucket.capacity, bucket.available()) == (1000, 400)
+
+
+def test_update_from_anthropic_headers(clock):
+    limiter = RateLimiter()
+    limiter.update_from_headers({
+        "anthropic-ratelimit-requests-limit": "50", "anthropic-ratelimit-requests-remaining": "49",
+        "anthropic-ratelimit-input-tokens-limit": "30000", "anthropic-ratelimit-input-tokens-remaining": "20000",
+        "anthropic-ratelimit-output-tokens-limit": "8000", "anthropic-ratelimit-output-tokens-remaining": "8000",
+    })
+
+    assert limiter.limits() == {"requests": 50, "input_tokens": 30000, "output_tokens": 8000}
+    assert limiter.buckets["input_tokens"].available() == 20000
+    assert limiter.buckets["requests"].available() == 49
+
+
+def test_update_from_openai_headers_leaves_output_tokens_unknown(clock):
+    limiter = RateLimiter()
+    limiter.update_from_headers({
+        "x-ratelimit-limit-requests": "500", "x-ratelimit-remaining-requests": "499",
+        "x-ratelimit-limit-tokens": "30000", "x-ratelimit-remaining-tokens": "29000",
+    })
+
+    assert limiter.limits() == {"requests": 500, "input_tokens": 30000, "output_tokens": None}
+
+
+def test_update_from_missing_or_unparseable_headers_changes_nothing(clock):
+    limiter = RateLimiter(60, 1000, 1000)
+    limiter.update_from_headers(None)
+    limiter.update_from_headers({"anthropic-ratelimit-input-tokens-remaining": "soon"})
+
+    assert limiter.limits() == {"requests": 60, "input_tokens": 1000, "output_tokens": 1000}
+    assert limiter.buckets["input_tokens"].available() == 1000
+
+
+def test_settle_charges_the_difference_and_updates_the_output_estimate(clock):
+    limiter = RateLimiter(60, 10000, 10000)
+    cost = limiter.cost(1000)
+    assert cost == {"requests": 1, "input_tokens": 1000, "output_tokens": EXPECTED_OUTPUT_TOKENS}
+    limiter.admit(cost)
+
+    limiter.settle(cost, 1200, 1000)
+
+    assert limiter.buckets["input_tokens"].available() == 10000 - 1200
+    assert limiter.buckets["output_tokens"].available() == 10000 - 1000
+    assert limiter.output_estimate == pytest.approx(0.8 * EXPECTED_OUTPUT_TOKENS + 0.2 * 1000)
+
+
+def test_release_keeps_the_request_counted(clock):
+    limiter = RateLimiter(60, 10000, 10000)
+    cost = limiter.cost(1000)
+    limiter.admit(cost)
+    limiter.release(cost)
+
+    assert limiter.buckets["requests"].available() == 59
+    assert limiter.buckets["input_tokens"].available() == 10000
+    assert limiter.buckets["output_tokens"].available() == 10000
+
+
+def test_headroom_is_the_free_share_of_the_fullest_bucket(clock):
+    limiter = RateLimiter(100, 1000, None)
+    assert limiter.headroom() == 1.0
+
+    limiter.admit({"requests": 10, "input_tokens": 500, "output_tokens": 10 ** 6})
+    assert limiter.headroom() == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize("attempt", range(6))
+def test_backoff_is_jittered_below_the_exponential_cap(attempt):
+    rng = random.Random(attempt)
+    delays = [backoff_delay(attempt, base=2, cap=20, rng=rng) for _ in range(200)]
+
+    assert all(0 <= delay <= min(20, 2 * 2 ** attempt) for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_backoff_never_undercuts_retry_after():
+    rng = random.Random(0)
+    assert all(backoff_delay(0, retry_after=45, base=2, cap=20, rng=rng) >= 45 for _ in range(100))
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(api_error(anthropic.RateLimitError, 429, {"retry-after": "12"})) == 12
+    assert retry_after_seconds(api_error(anthropic.RateLimitError, 429)) is None
+    assert retry_after_seconds(api_error(anthropic.RateLimitError, 429, {"retry-after": "Wed, 21 Oct"})) is None
+    assert retry_after_seconds(ValueError("no response")) is None
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (api_error(anthropic.RateLimitError, 429), True),
+    (api_error(anthropic.InternalServerError, 529), True),
+    (api_error(anthropic.InternalServerError, 500), True),
+    (api_error(openai.RateLimitError, 429), True),
+    (api_error(anthropic.BadRequestError, 400), False),
+    (api_error(anthropic.AuthenticationError, 401), False),
+    (anthropic.APIConnectionError(request=httpx.Request("POST", "http://llm")), True),
+    (openai.APIConnectionError(request=httpx.Request("POST", "http://llm")), True),
+    # Errors sent as an event in the middle of a stream arrive on a 200 response
+    (api_error(anthropic.APIStatusError, 200, body={"type": "error", "error": {"type": "overloaded_error"}}), True),
+    (api_error(anthropic.APIStatusError, 200, body={"type": "error", "error": {"type": "invalid_request_error"}}),
+     False),
+    (ValueError("not an API error"), False),
+])
+def test_is_retryable_error(error, retryable):
+    assert is_retryable_error(error) is retryable
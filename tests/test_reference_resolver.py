@@ -0,0 +1,203 @@
+import random
+from pathlib import Path
+import pytest
+import reference_resolver
+from reference_resolver import (
+    build_component_dependency_index, bundle_external_refs, find_external_refs, process_all_endpoints
+)
+from spec_loader import load_spec
+
+
+def ref(name):
+    return {"$ref": f"#/components/schemas/{name}"}
+
+
+def spec_with(schemas):
+    return {"components": {"schemas": schemas}}
+
+
+def schema(*targets):
+    return {"type": "object", "properties": {f"p{i}": ref(target) for i, target in enumerate(targets)}}
+
+
+def naive_closure(edges, start):
+    seen, stack = set(), [start]
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        stack.extend(edges.get(node, ()))
+    return seen
+
+
+def keys(*names):
+    return frozenset(("schemas", name) for name in names)
+
+
+def test_closure_follows_chains_and_keeps_missing_targets():
+    index = build_component_dependency_index(spec_with({"A": schema("B"), "B": schema("C", "Missing"), "C": schema()}))
+
+    assert index[("schemas", "A")] == keys("A", "B", "C", "Missing")
+    assert index[("schemas", "C")] == keys("C")
+    assert ("schemas", "Missing") not in index
+
+
+def test_cycle_members_share_a_closure():
+    index = build_component_dependency_index(spec_with({
+        "A": schema("B"), "B": schema("C"), "C": schema("A", "D"), "D": schema(), "E": schema("B")
+    }))
+
+    for name in "ABC":
+        assert index[("schemas", name)] == keys("A", "B", "C", "D")
+    assert index[("schemas", "E")] == keys("A", "B", "C", "D", "E")
+
+
+def test_self_reference():
+    index = build_component_dependency_index(spec_with({"Node": schema("Node", "Leaf"), "Leaf": schema()}))
+
+    assert index[("schemas", "Node")] == keys("Node", "Leaf")
+
+
+def test_deep_chain_beyond_the_recursion_limit():
+    depth = 5000
+    index = build_component_dependency_index(spec_with(
+        {f"S{i}": schema(f"S{i + 1}") if i + 1 < depth else schema() for i in range(depth)}
+    ))
+
+    assert len(index[("schemas", "S0")]) == depth
+    assert index[("schemas", f"S{depth - 1}")] == keys(f"S{depth - 1}")
+
+
+def test_other_component_sections_are_followed():
+    spec = {"components": {
+        "parameters": {"Page": {"name": "page", "in": "query", "schema": ref("PageNumber")}},
+        "schemas": {"PageNumber": {"type": "integer"}},
+    }}
+
+    assert build_component_dependency_index(spec)[("parameters", "Page")] == \
+        frozenset({("parameters", "Page"), ("schemas", "PageNumber")})
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_naive_closure_on_random_graphs(seed):
+    rng = random.Random(seed)
+    names = [f"N{i}" for i in range(rng.randint(1, 40))]
+    edges = {name: rng.sample(names, rng.randint(0, min(4, len(names)))) for name in names}
+
+    index = build_component_dependency_index(spec_with({name: schema(*targets) for name, targets in edges.items()}))
+
+    for name in names:
+        assert index[("schemas", name)] == keys(*naive_closure(edges, name))
+
+
+def write_yaml(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    return path
+
+
+@pytest.fixture
+def spec_dir(tmp_path, monkeypatch):
+    # load_ref_file caches parsed files in .spec_cache under the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_bundles_external_components_with_relative_paths(spec_dir):
+    root = write_yaml(spec_dir / "api" / "openapi.yaml", "")
+    write_yaml(spec_dir / "api" / "paths" / "items.yaml", """
+components:
+  schemas:
+    Item:
+      type: object
+      properties:
+        error: {$ref: '../../shared/common.yaml#/components/schemas/Error'}
+""")
+    write_yaml(spec_dir / "shared" / "common.yaml", """
+components:
+  schemas:
+    Error: {type: string}
+""")
+    spec = {"paths": {"/items": {"get": {"responses": {"200": {"content": {"application/json": {
+        "schema": {"$ref": "paths/items.yaml#/components/schemas/Item"}}}}}}}}}
+
+    bundled = bundle_external_refs(spec, root.parent, root)
+
+    schemas = bundled["components"]["schemas"]
+    assert set(schemas) == {"Item", "Error"}
+    assert schemas["Item"]["properties"]["error"] == {"$ref": "#/components/schemas/Error"}
+    assert not find_external_refs(bundled)
+
+
+def test_name_clashes_get_a_file_suffix(spec_dir):
+    root = write_yaml(spec_dir / "openapi.yaml", "")
+    write_yaml(spec_dir / "a.yaml", "components: {schemas: {Error: {type: string}}}")
+    write_yaml(spec_dir / "b.yaml", "components: {schemas: {Error: {type: integer}}}")
+    spec = {
+        "paths": {"/x": {"get": {"parameters": [
+            {"name": "a", "in": "query", "schema": {"$ref": "a.yaml#/components/schemas/Error"}},
+            {"name": "b", "in": "query", "schema": {"$ref": "b.yaml#/components/schemas/Error"}},
+        ]}}},
+        "components": {"schemas": {"Error": {"type": "boolean"}}},
+    }
+
+    bundled = bundle_external_refs(spec, spec_dir, root)
+
+    schemas = bundled["components"]["schemas"]
+    assert schemas["Error"] == {"type": "boolean"}
+    assert {schemas["Error_a"]["type"], schemas["Error_b"]["type"]} == {"string", "integer"}
+    parameters = bundled["paths"]["/x"]["get"]["parameters"]
+    assert [p["schema"]["$ref"] for p in parameters] == ["#/components/schemas/Error_a", "#/components/schemas/Error_b"]
+
+
+def test_cycles_between_files_terminate(spec_dir):
+    root = write_yaml(spec_dir / "openapi.yaml", "")
+    write_yaml(spec_dir / "a.yaml", "components: {schemas: {A: {properties: {b: {$ref: 'b.yaml#/components/schemas/B'}}}}}")
+    write_yaml(spec_dir / "b.yaml", "components: {schemas: {B: {properties: {a: {$ref: 'a.yaml#/components/schemas/A'}}}}}")
+    spec = {"paths": {"/x": {"get": {"responses": {"200": {"content": {"application/json": {
+        "schema": {"$ref": "a.yaml#/components/schemas/A"}}}}}}}}}
+
+    schemas = bundle_external_refs(spec, spec_dir, root)["components"]["schemas"]
+
+    assert schemas["A"]["properties"]["b"] == {"$ref": "#/components/schemas/B"}
+    assert schemas["B"]["properties"]["a"] == {"$ref": "#/components/schemas/A"}
+
+
+def test_refs_back_into_the_spec_file_stay_local(spec_dir):
+    root = write_yaml(spec_dir / "api" / "openapi.yaml", """
+components:
+  schemas:
+    Limit: {type: integer}
+""")
+    write_yaml(spec_dir / "api" / "common" / "page.yaml", """
+components:
+  schemas:
+    Page:
+      properties:
+        limit: {$ref: '../openapi.yaml#/components/schemas/Limit'}
+""")
+    spec = {"paths": {"/x": {"get": {"responses": {"200": {"content": {"application/json": {
+        "schema": {"$ref": "common/page.yaml#/components/schemas/Page"}}}}}}}},
+        "components": {"schemas": {"Limit": {"type": "integer"}}}}
+
+    schemas = bundle_external_refs(spec, root.parent, root)["components"]["schemas"]
+
+    assert set(schemas) == {"Limit", "Page"}
+    assert schemas["Page"]["properties"]["limit"] == {"$ref": "#/components/schemas/Limit"}
+
+
+def test_split_in_processes_matches_the_serial_split(tmp_path, monkeypatch, capsys):
+    spec_file = Path(__file__).resolve().parent.parent / "input_data" / "tfl_original.yaml"
+    spec = load_spec(spec_file, None)
+    monkeypatch.setattr(reference_resolver, "PARALLEL_SPLIT_MIN_OPERATIONS", 1)
+    serial = process_all_endpoints(spec, spec_file.parent, tmp_path / "serial", workers=1, spec_file=spec_file)
+    parallel = process_all_endpoints(spec, spec_file.parent, tmp_path / "parallel", workers=3, spec_file=spec_file)
+
+    assert "(3 processes)" in capsys.readouterr().out
+    assert parallel == serial
+    serial_files = sorted(path.name for path in (tmp_path / "serial").iterdir())
+    assert serial_files == sorted(path.name for path in (tmp_path / "parallel").iterdir())
+    assert len(serial_files) == len(serial)
+    for name in serial_files:
+        assert (tmp_path / "parallel" / name).read_bytes() == (tmp_path / "serial" / name).read_bytes()
@@ -0,0 +1,84 @@
+import copy
+import pytest
+from request_dedup import canonical_request_key, dedupe_items, new_dedup_report
+
+
+def item(url, method="GET", headers=(), body=None, status=200, name="test"):
+    request = {"method": method, "url": url, "header": [{"key": k, "value": v} for k, v in headers]}
+    if body is not None:
+        request["body"] = body
+    return {"name": name, "request": request,
+            "event": [{"listen": "test", "script": {"exec": [f"pm.response.to.have.status({status});"]}}]}
+
+
+def raw(text):
+    return {"mode": "raw", "raw": text}
+
+
+@pytest.mark.parametrize("a, b", [
+    # Query parameter order and percent-encoding
+    (item("{{base_url}}/Line/Search?a=1&b=2"), item("{{base_url}}/Line/Search?b=2&a=1")),
+    (item("{{base_url}}/Line/a%20b?q=x%26y"), item("{{base_url}}/Line/a b?q=x%26y")),
+    (item("{{base_url}}/Line/"), item("{{base_url}}/Line")),
+    # A raw url and the same url as a Postman url object
+    (item("{{base_url}}/Line?mode=bus"),
+     item({"host": ["{{base_url}}"], "path": ["Line"], "query": [{"key": "mode", "value": "bus"},
+                                                                 {"key": "x", "value": "1", "disabled": True}]})),
+    # Header name case and order
+    (item("u", headers=[("Accept", "json"), ("X-Id", "1")]), item("u", headers=[("x-id", "1"), ("ACCEPT", "json")])),
+    # JSON body whitespace and key order
+    (item("u", "POST", body=raw('{"a": 1, "b": [1, 2]}')), item("u", "POST", body=raw('{\n  "b":[1,2],\n  "a":1\n}'))),
+    (item("u", "POST", body=raw("  plain text \n")), item("u", "POST", body=raw("plain text"))),
+    (item("u", "POST", body={"mode": "urlencoded", "urlencoded": [{"key": "a", "value": "1"}, {"key": "b", "value": "2"}]}),
+     item("u", "POST", body={"mode": "urlencoded", "urlencoded": [{"key": "b", "value": "2"}, {"key": "a", "value": "1"}]})),
+    (item("u", "post", body=raw("")), item("u", "POST")),
+    # Test names and the way the status is asserted are ignored
+    (item("u", name="one"), {**item("u", name="two"), "event": [{"listen": "test", "script": {
+        "exec": "pm.expect(pm.response.code).to.equal(200)"}}]}),
+])
+def test_equivalent_requests_have_the_same_key(a, b):
+    assert canonical_request_key(a) == canonical_request_key(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    (item("{{base_url}}/Line?a=1"), item("{{base_url}}/Line?a=2")),
+    (item("{{base_url}}/Line?a=1"), item("{{base_url}}/Line?a=1&a=1")),
+    (item("u", headers=[("X-Id", "1")]), item("u", headers=[("X-Id", "A")])),
+    (item("u", "POST", body=raw('{"a": 1}')), item("u", "POST", body=raw('{"a": "1"}'))),
+    (item("u"), item("u", "DELETE")),
+    (item("u", status=200), item("u", status=404)),
+])
+def test_different_requests_have_different_keys(a, b):
+    assert canonical_request_key(a) != canonical_request_key(b)
+
+
+def folder_items():
+    return [
+        item("{{base_url}}/Line?a=1&b=2", name="first"),
+        {"name": "Edge", "item": [item("{{base_url}}/Line?b=2&a=1", name="again"), item("{{base_url}}/Line?a=3")]},
+    ]
+
+
+@pytest.mark.parametrize("mode, kept_in_folder, description", [
+    ("report", 2, None), ("flag", 2, "Duplicate of first in get_Line"), ("remove", 1, None),
+])
+def test_dedupe_modes(mode, kept_in_folder, description):
+    items = folder_items()
+    report = new_dedup_report()
+    kept = dedupe_items(copy.deepcopy(items), "get_Line", {}, report, mode)
+
+    assert len(kept[1]["item"]) == kept_in_folder
+    assert kept[1]["item"][0].get("description") == description
+    assert report["total"] == 3 and report["within_endpoint"] == 1
+    assert report["duplicates"] == [{"endpoint": "get_Line", "name": "Edge/again",
+                                     "duplicate_of": {"endpoint": "get_Line", "name": "first"}}]
+    if mode == "report":
+        assert kept == items
+
+
+def test_duplicates_across_endpoints_share_the_seen_keys():
+    seen, report = {}, new_dedup_report()
+    dedupe_items(folder_items(), "get_Line", seen, report, "remove")
+    kept = dedupe_items([item("{{base_url}}/Line?b=2&a=1")], "get_Line_Search", seen, report, "remove")
+
+    assert kept == [] and report["across_endpoints"] == 1
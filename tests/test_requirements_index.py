@@ -0,0 +1,73 @@
+from requirements_index import build_requirements_index, split_change_sections
+
+
+def endpoint(path, method, operation_id, summary, parameters=(), schemas=()):
+    operation = {"operationId": operation_id, "summary": summary, "tags": [path.split('/')[1]],
+                 "parameters": [{"name": name, "in": "query", "schema": {"type": "string"}} for name in parameters]}
+    return {"path": path, "method": method,
+            "spec": {"paths": {path: {method: operation}},
+                     "components": {"schemas": {name: {"type": "object"} for name in schemas}}}}
+
+
+ENDPOINTS = [
+    endpoint("/BikePoint", "get", "BikePoint_GetAll", "Gets all bike point locations"),
+    endpoint("/BikePoint/Search", "get", "BikePoint_Search", "Search for bike stations by their name", ["query"]),
+    endpoint("/Line/{ids}/Status", "get", "Line_Status", "Gets the line status of given line ids",
+             ["detail"], ["Tfl.Api.Presentation.Entities.LineStatus"]),
+    endpoint("/Journey/JourneyResults/{from}/to/{to}", "get", "Journey_JourneyResults",
+             "Perform a journey planner search", ["accessibilityPreference", "walkingSpeed"]),
+]
+
+DOC = """
+# Bike point search
+
+GET /BikePoint/Search gets a new parameter, radius, limiting results to a distance in metres.
+
+# Journey planner
+
+The `walkingSpeed` parameter accepts a new value, "fast".
+
+# Line status
+
+LineStatus gains a reason field.
+
+# Rate limiting
+
+Every endpoint now returns an X-RateLimit-Remaining header.
+
+# Journey planning
+
+Journey planner searches return an accessible step-free route first.
+"""
+
+
+def test_splits_at_headings():
+    sections = split_change_sections(DOC)
+
+    assert len(sections) == 5
+    assert sections[0].startswith("# Bike point search")
+    assert all(section == section.rstrip() for section in sections)
+
+
+def test_routes_each_section_to_the_endpoints_it_names():
+    sections, matches = build_requirements_index(ENDPOINTS, DOC)
+
+    assert matches == {
+        "get_BikePoint": [3],
+        "get_BikePoint_Search": [0, 3],
+        "get_Line_ids_Status": [2, 3],
+        "get_Journey_JourneyResults_from_to_to": [1, 3, 4],
+    }
+
+
+def test_section_that_matches_nothing_applies_to_every_endpoint():
+    sections, matches = build_requirements_index(ENDPOINTS, "# Misc\n\nResponses are now gzipped.\n")
+
+    assert sections == ["# Misc\n\nResponses are now gzipped."]
+    assert all(indices == [0] for indices in matches.values())
+
+
+def test_path_parameter_names_are_ignored():
+    _, matches = build_requirements_index(ENDPOINTS, "GET /Line/{lineIds}/Status is cached for a minute.")
+
+    assert [name for name, indices in matches.items() if indices] == ["get_Line_ids_Status"]
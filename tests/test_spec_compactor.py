@@ -0,0 +1,144 @@
+import pytest
+from spec_compactor import (
+    estimate_tokens, compact_json, compact_mini_spec, minimal_spec, map_schema_keywords, drop_unused_keys,
+    drop_descriptions, shorten_description, PRUNING_STAGES, MAX_PARAMETER_DESCRIPTION
+)
+
+LONG_DESCRIPTION = "A station identifier. " + "It is used to look up arrivals. " * 10
+
+
+def spec():
+    """A mini-spec with one of everything the compactor removes or prunes"""
+    return {
+        "openapi": "3.0.1",
+        "info": {"title": "Line", "version": "v1", "description": "Lines"},
+        "servers": [{"url": "https://api.tfl.gov.uk"}],
+        "paths": {"/Line/{id}": {"get": {
+            "tags": ["Line"],
+            "x-internal": True,
+            "parameters": [
+                {"name": "id", "in": "path", "required": True, "description": LONG_DESCRIPTION,
+                 "example": "victoria", "schema": {"type": "string"}},
+                {"$ref": "#/components/parameters/mode"},
+            ],
+            "responses": {"200": {"description": "OK", "content": {
+                "application/json": {"schema": {"$ref": "#/components/schemas/Line"}},
+                "text/xml": {"schema": {"$ref": "#/components/schemas/Line"}},
+            }}},
+        }}},
+        "components": {
+            "parameters": {"mode": {"name": "mode", "in": "query", "description": LONG_DESCRIPTION,
+                                    "schema": {"type": "string", "enum": ["bus", "tube"]}}},
+            "schemas": {
+                "Line": {"type": "object", "description": "A line", "xml": {"name": "Line"}, "example": {"id": "x"},
+                         "properties": {
+                             "description": {"type": "string", "description": "Free text"},
+                             "tags": {"type": "array", "items": {"$ref": "#/components/schemas/tags"}},
+                             "example": {"type": "string", "example": "x"},
+                         }},
+                "tags": {"type": "string", "default": {"description": "literal", "xml": 1}},
+                "Unused": {"type": "string"},
+            },
+        },
+    }
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("word") == 1
+    assert estimate_tokens("words") == 2
+    assert estimate_tokens("123456 7") == 3
+    assert estimate_tokens('{"a":1}') == 7
+    assert estimate_tokens("   \n\t ") == 0
+
+
+def test_estimate_tokens_is_close_for_compact_json():
+    text = compact_json(spec())
+    # Compact JSON is roughly 3-4 characters per token
+    assert len(text) / 5 < estimate_tokens(text) < len(text) / 2
+
+
+def test_minimal_spec_drops_unused_keys_media_types_and_components():
+    compacted = minimal_spec(spec())
+
+    assert compacted["info"] == {"title": "Line"} and "servers" not in compacted
+    operation = compacted["paths"]["/Line/{id}"]["get"]
+    assert "tags" not in operation and "x-internal" not in operation
+    assert list(operation["responses"]["200"]["content"]) == ["application/json"]
+    assert set(compacted["components"]["schemas"]) == {"Line", "tags"}
+    assert "xml" not in compacted["components"]["schemas"]["Line"]
+
+
+def test_keyword_transforms_leave_names_and_literals_alone():
+    compacted = map_schema_keywords(spec(), lambda obj: drop_descriptions(drop_unused_keys(obj)))
+    schemas = compacted["components"]["schemas"]
+
+    # A schema called "tags" and properties called "description", "tags" and "example" are kept
+    assert set(schemas) == {"Line", "tags", "Unused"}
+    assert set(schemas["Line"]["properties"]) == {"description", "tags", "example"}
+    assert "description" not in schemas["Line"]["properties"]["description"]
+    assert schemas["tags"]["default"] == {"description": "literal", "xml": 1}
+
+
+def test_schema_named_like_a_keyword_survives_every_stage():
+    stages = minimal_spec(spec())
+    for _, prune in PRUNING_STAGES[:2]:
+        stages = prune(stages)
+        assert set(stages["components"]["schemas"]) == {"Line", "tags"}
+        assert set(stages["components"]["schemas"]["Line"]["properties"]) == {"description", "tags", "example"}
+
+
+def stage(name):
+    return dict(PRUNING_STAGES)[name]
+
+
+def test_examples_stage_keeps_parameter_examples():
+    pruned = stage("examples")(minimal_spec(spec()))
+
+    assert pruned["paths"]["/Line/{id}"]["get"]["parameters"][0]["example"] == "victoria"
+    line = pruned["components"]["schemas"]["Line"]
+    assert "example" not in line and "example" not in line["properties"]["example"]
+
+
+def test_schema_descriptions_stage_keeps_parameter_and_response_descriptions():
+    pruned = stage("schema descriptions")(minimal_spec(spec()))
+
+    assert "description" not in pruned["components"]["schemas"]["Line"]
+    assert "description" not in pruned["components"]["schemas"]["Line"]["properties"]["description"]
+    operation = pruned["paths"]["/Line/{id}"]["get"]
+    assert operation["parameters"][0]["description"] == LONG_DESCRIPTION
+    assert operation["responses"]["200"]["description"] == "OK"
+
+
+def test_response_bodies_stage_drops_schemas_no_longer_referenced():
+    pruned = stage("response bodies")(minimal_spec(spec()))
+
+    assert pruned["paths"]["/Line/{id}"]["get"]["responses"] == {"200": {"description": "OK"}}
+    assert pruned["components"]["schemas"] == {}
+    assert "mode" in pruned["components"]["parameters"]
+
+
+def test_parameter_descriptions_stage_shortens_inline_and_component_parameters():
+    pruned = stage("parameter descriptions")(minimal_spec(spec()))
+
+    assert pruned["paths"]["/Line/{id}"]["get"]["parameters"][0]["description"] == "A station identifier."
+    assert pruned["components"]["parameters"]["mode"]["description"] == "A station identifier."
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("Short.", "Short."),
+    ("First. " + "x" * 200 + ". Can cause disambiguation.", "First. Can cause disambiguation."),
+    ("y" * 300, "y" * MAX_PARAMETER_DESCRIPTION + "..."),
+])
+def test_shorten_description(description, expected):
+    assert shorten_description(description) == expected
+
+
+def test_compact_mini_spec_stops_pruning_once_within_budget():
+    minimal = minimal_spec(spec())
+    without_examples = stage("examples")(minimal)
+    budget = estimate_tokens(compact_json(without_examples))
+
+    assert compact_mini_spec(spec()) == minimal
+    assert compact_mini_spec(spec(), token_budget=budget) == without_examples
+    assert estimate_tokens(compact_json(compact_mini_spec(spec(), token_budget=1))) < budget
@@ -0,0 +1,110 @@
+import json
+import pytest
+from stream_parser import IncrementalCollectionParser, MalformedStreamError
+
+COLLECTION = {
+    "info": {"name": "BikePoint", "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"},
+    "item": [
+        {"name": "Positive", "item": [{"name": "ok", "request": {"method": "GET", "url": "{{baseUrl}}/BikePoint"}}]},
+        {"name": "Negative", "request": {"method": "GET", "url": "{{baseUrl}}/BikePoint/\"x\"}"}},
+    ],
+    "variable": [{"key": "baseUrl", "value": "https://api.tfl.gov.uk"}],
+}
+
+
+def requests_with_folders(items, folders=()):
+    """The (request, folder names) pairs the parser should emit for a list of items, in order"""
+    pairs = []
+    for item in items:
+        if "request" in item:
+            pairs.append((item, list(folders)))
+        else:
+            pairs.extend(requests_with_folders(item["item"], [*folders, item["name"]]))
+    return pairs
+
+
+def feed_in_chunks(parser, text, size):
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+
+
+@pytest.mark.parametrize("size", [1, 7, 10000])
+def test_parses_collection_in_any_chunk_size(size):
+    emitted = []
+    parser = IncrementalCollectionParser(on_request=lambda item, folders: emitted.append((item, folders)))
+    feed_in_chunks(parser, json.dumps(COLLECTION, indent=2), size)
+
+    assert parser.complete
+    assert parser.finish() == COLLECTION
+    assert emitted == requests_with_folders(COLLECTION["item"])
+
+
+def test_tolerates_markdown_fence():
+    parser = IncrementalCollectionParser()
+    feed_in_chunks(parser, "```json\n" + json.dumps(COLLECTION) + "\n```", 5)
+
+    assert parser.finish() == COLLECTION
+
+
+def test_emits_items_before_the_collection_closes():
+    emitted = []
+    parser = IncrementalCollectionParser(on_request=lambda item, folders: emitted.append((item, folders)))
+    text = json.dumps(COLLECTION)
+    parser.feed(text[:text.index('"variable"')])
+
+    assert not parser.complete
+    assert emitted == requests_with_folders(COLLECTION["item"])
+    assert parser.finish() is None
+
+
+@pytest.mark.parametrize("size", [1, 9, 10000])
+def test_emits_nested_requests_before_their_folders_close(size):
+    leaf = {"name": "deep", "request": {"method": "GET", "url": "{{baseUrl}}/Line/{\"id\"}", "body": {"raw": "{]"}},
+            "event": [{"listen": "test", "script": {"exec": ["pm.test('ok')"]}}]}
+    folder = {"name": "Edge cases", "item": [
+        {"name": "Strings", "item": [leaf, {**leaf, "name": "deeper"}]},
+        {"name": "empty", "item": []},
+        {"name": "flat", "request": {"method": "GET"}},
+    ]}
+    collection = {"info": {"name": "Line"}, "item": [folder, {"name": "top", "request": {"method": "POST"}}]}
+    text = json.dumps(collection, indent=1)
+    emitted = []
+    parser = IncrementalCollectionParser(on_request=lambda item, folders: emitted.append((item, folders)))
+
+    # Everything up to where the inner folder closes, so neither folder has closed yet
+    feed_in_chunks(parser, text[:text.index('"name": "empty"')], size)
+    assert emitted == [(leaf, ["Edge cases", "Strings"]), ({**leaf, "name": "deeper"}, ["Edge cases", "Strings"])]
+    assert parser.items == []
+
+    feed_in_chunks(parser, text[text.index('"name": "empty"'):], size)
+    assert emitted == requests_with_folders(collection["item"])
+    assert parser.finish() == collection
+
+
+@pytest.mark.parametrize("text", [
+    "Here is your collection: {}",
+    '{"item": [1, 2]}',
+    '{"item": []]}',
+    '{"item": []} and some more text',
+])
+def test_rejects_text_that_cannot_become_a_collection(text):
+    parser = IncrementalCollectionParser()
+    with pytest.raises(MalformedStreamError):
+        parser.feed(text)
+
+
+def test_continuation_prefix_stops_at_last_complete_item():
+    parser = IncrementalCollectionParser()
+    text = json.dumps(COLLECTION)
+    cut = text.index('"Negative"') + 20
+    parser.feed(text[:cut])
+
+    prefix = parser.continuation_prefix()
+    assert '"Negative"' not in prefix
+    assert prefix.endswith('}')
+
+    # A continuation written after the prefix is parsed as part of the same document
+    resumed = IncrementalCollectionParser()
+    resumed.feed(prefix)
+    resumed.feed(", " + json.dumps(COLLECTION["item"][1]) + '], "variable": ' + json.dumps(COLLECTION["variable"]) + "}")
+    assert resumed.finish() == COLLECTION
@@ -0,0 +1,50 @@
+import json
+from utils import attempt_json_repair, repair_truncated_json, validate_and_clean_json
+
+COLLECTION = {
+    "info": {"name": "BikePoint"},
+    "item": [
+        {"name": "Positive", "item": [{"name": "first", "request": {"url": "a"}},
+                                      {"name": "second", "request": {"url": "b"}}]},
+        {"name": "Negative", "item": [{"name": "third", "request": {"url": "c"}}]},
+    ],
+}
+
+
+def test_repair_keeps_items_up_to_the_last_complete_one():
+    text = json.dumps(COLLECTION)
+    truncated = text[:text.index('"second"') + 15]
+
+    assert repair_truncated_json(truncated) == {
+        "info": {"name": "BikePoint"},
+        "item": [{"name": "Positive", "item": [{"name": "first", "request": {"url": "a"}}]}],
+    }
+
+
+def test_repair_handles_a_cut_inside_a_string_with_brackets():
+    text = json.dumps({"item": [{"name": "a", "request": {"url": "x"}}, {"name": "b [{"}]})
+    repaired = repair_truncated_json(text[:-8])
+
+    assert repaired == {"item": [{"name": "a", "request": {"url": "x"}}]}
+
+
+def test_repair_strips_a_code_fence():
+    text = "```json\n" + json.dumps(COLLECTION)
+    assert repair_truncated_json(text[:text.index('"Negative"')]) == {"info": COLLECTION["info"],
+                                                                      "item": COLLECTION["item"][:1]}
+
+
+def test_repair_needs_a_complete_item():
+    assert repair_truncated_json('{"info": {"name": "BikePoint"}, "item": [{"name": "Pos') is None
+
+
+def test_generic_repair_does_not_cut_truncated_json():
+    text = json.dumps(COLLECTION)
+    truncated = text[:text.index('"Negative"')]
+
+    assert attempt_json_repair(truncated) is None
+    assert validate_and_clean_json(truncated) is None
+
+
+def test_generic_repair_fixes_trailing_commas():
+    assert validate_and_clean_json('```json\n{"item": [1, 2,]}\n```') == {"item": [1, 2]}
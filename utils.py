@@ -61,4 +61,73 @@ def attempt_json_repair(text):
         
     except Exception as e:
         logger.error(f"JSON repair failed: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def find_last_complete_item(text):
+    """
+    Scan a (possibly truncated) Postman collection and return the offset just after the last
+    element of any "item" array that was fully closed, or None if no item has closed yet.
+    Also returns the stack of brackets still open at that offset.
+    """
+    stack = []          # (bracket, is_item_array)
+    last_key = None
+    last_string = None
+    current_string_start = None
+    in_string = False
+    escape = False
+    boundary = None
+    boundary_stack = None
+
+    for i, c in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                in_string = False
+                last_string = text[current_string_start:i]
+            continue
+        if c == '"':
+            in_string = True
+            current_string_start = i + 1
+        elif c == ':':
+            last_key = last_string
+        elif c == '{':
+            stack.append(('{', False))
+        elif c == '[':
+            stack.append(('[', last_key == 'item' and stack and stack[-1][0] == '{'))
+        elif c in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if c == '}' and stack and stack[-1] == ('[', True):
+                boundary = i + 1
+                boundary_stack = list(stack)
+        elif c == ',':
+            last_key = None
+
+    if boundary is None:
+        return None, None
+    return boundary, [bracket for bracket, _ in boundary_stack]
+
+
+def repair_truncated_json(text):
+    """
+    Repair a collection that was cut off mid-stream (e.g. at max_tokens) by dropping everything
+    after its last complete item and closing the brackets that are still open
+    """
+    cleaned_text = text.strip()
+    if cleaned_text.startswith('```json'):
+        cleaned_text = cleaned_text[7:]
+    if cleaned_text.startswith('```'):
+        cleaned_text = cleaned_text[3:]
+    boundary, open_brackets = find_last_complete_item(cleaned_text)
+    if boundary is None:
+        return None
+    closers = ''.join('}' if bracket == '{' else ']' for bracket in reversed(open_brackets))
+    try:
+        return json.loads(cleaned_text[:boundary] + closers)
+    except json.JSONDecodeError as e:
+        logger.error(f"Truncated JSON repair failed: {e}")
+        return None